@@ -0,0 +1,161 @@
+# admission.py
+"""Admission control for the expensive computations of concurrent page runs.
+
+Every session's page run is a thread of the one server process. When many of
+them miss the caches at once, their VLE aggregations would all run side by
+side: memory peaks add up and the threads contend for the GIL. Instead a
+computation takes one of ADMISSION_SLOTS slots, and runs that find them all
+taken queue in arrival order, showing their place in the line. Cache hits
+never queue.
+
+When ADMISSION_QUEUE_LIMIT runs are already queued, sections that have an
+approximate result (the sample estimates of 2.1-2.3) keep it instead of
+joining the line for the exact one.
+
+Besides the section builders, the background precompute, the student index,
+the engagement matrix and the risk scorer and its models all compute under
+the gate.
+"""
+import functools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import metrics
+
+# Computations running at once (0: no limit)
+ADMISSION_SLOTS = int(os.environ.get("ADMISSION_SLOTS", "2"))
+# Queued runs from which optional exact results are skipped (0: never)
+ADMISSION_QUEUE_LIMIT = int(os.environ.get("ADMISSION_QUEUE_LIMIT", "4"))
+
+
+class Busy(Exception):
+    """No slot is free (or runs are already waiting for one)"""
+
+
+class Gate:
+    """Bounded semaphore with a first-come, first-served queue.
+
+    Reentrant per thread: a computation holding a slot runs nested ones
+    (e.g. a section builder calling another) in the same slot.
+    """
+
+    def __init__(self, slots):
+        self.slots = slots
+        self.running = 0
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.held = threading.local()
+
+    def queued(self):
+        return len(self.queue)
+
+    def overloaded(self):
+        """Whether enough runs are waiting that optional work should be skipped"""
+        return 0 < ADMISSION_QUEUE_LIMIT <= self.queued()
+
+    def _free(self):
+        return self.slots <= 0 or self.running < self.slots
+
+    @contextmanager
+    def admit(self, wait=True, on_wait=None):
+        """Hold a slot for the block.
+
+        Without a free slot this waits in line, calling `on_wait(position)`
+        whenever the position changes, or raises Busy with wait=False.
+        """
+        if getattr(self.held, 'depth', 0):
+            self.held.depth += 1
+            try:
+                yield
+            finally:
+                self.held.depth -= 1
+            return
+
+        started = time.perf_counter()
+        with self.condition:
+            if self._free() and not self.queue:
+                self.running += 1
+                self._report()
+                ticket = None
+            elif not wait:
+                raise Busy()
+            else:
+                ticket = object()
+                self.queue.append(ticket)
+                self._report()
+        if ticket is not None:
+            self._wait_turn(ticket, on_wait)
+            metrics.observe('admission_wait_seconds', time.perf_counter() - started)
+
+        self.held.depth = 1
+        try:
+            yield
+        finally:
+            self.held.depth = 0
+            with self.condition:
+                self.running -= 1
+                self._report()
+                self.condition.notify_all()
+
+    def _wait_turn(self, ticket, on_wait):
+        """Wait until `ticket` is first in line and a slot is free, then take the slot"""
+        shown = None
+        try:
+            while True:
+                with self.condition:
+                    position = self.queue.index(ticket) + 1
+                    if position == 1 and self._free():
+                        self.running += 1
+                        return
+                    if on_wait is None or position == shown:
+                        self.condition.wait()
+                        continue
+                # Without the lock: showing the position never holds up the other runs
+                on_wait(position)
+                shown = position
+        finally:
+            # Also when the run is stopped while waiting: the line moves up
+            with self.condition:
+                self.queue.remove(ticket)
+                self._report()
+                self.condition.notify_all()
+
+    def _report(self):
+        metrics.set_gauges('admission_runs', 'state', {'running': self.running, 'queued': len(self.queue)})
+
+
+gate = Gate(ADMISSION_SLOTS)
+
+
+@contextmanager
+def waiting_turn():
+    """gate.admit for a page run: its place in the line is shown where the result will go"""
+    import streamlit as st
+    placeholder = st.empty()
+
+    def show(position):
+        placeholder.info(f"⏳ The server is busy: this section is number {position} in line to be computed.")
+
+    with gate.admit(on_wait=show):
+        placeholder.empty()
+        yield
+
+
+def gated(cached):
+    """Wrap a cached function whose misses compute under gate.admit(wait=False).
+
+    Without a free slot, the miss waits in line outside the cached call, where
+    its place in the line can be shown (page output inside it would be replayed
+    on every hit), then calls it again in the slot it got.
+    """
+    @functools.wraps(cached)
+    def call(*args):
+        try:
+            return cached(*args)
+        except Busy:
+            with waiting_turn():
+                return cached(*args)
+    return call
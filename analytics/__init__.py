@@ -0,0 +1,36 @@
+# analytics/__init__.py
+"""Chart computations behind interchangeable query backends.
+
+Pick the backend per deployment with the ANALYTICS_BACKEND environment
+variable: 'pandas' (default), 'arrow' (pyarrow.compute), 'sql' (DuckDB) or 'scan'
+(streams the large tables from disk, used by the out-of-core mode).
+"""
+import os
+
+from analytics.engine import Engine, CHECKPOINT_LABELS
+
+BACKENDS = ['pandas', 'arrow', 'sql', 'scan']
+DEFAULT_BACKEND = os.environ.get("ANALYTICS_BACKEND", "pandas")
+
+
+def create_engine(data, backend=None, previous=None, appended=None):
+    """Build the analytics engine for the loaded tables.
+
+    On a refresh that left the small tables unchanged, `previous` is the prior
+    snapshot's engine (of the same backend) and `appended` maps each large table
+    to its new rows (None: reloaded in full); derived structures are carried over.
+    """
+    backend = backend or DEFAULT_BACKEND
+    if backend == 'pandas':
+        from analytics.pandas_backend import PandasEngine
+        return PandasEngine(data, previous, appended)
+    if backend == 'arrow':
+        from analytics.arrow_backend import ArrowEngine
+        return ArrowEngine(data, previous)
+    if backend == 'sql':
+        from analytics.sql_backend import SqlEngine
+        return SqlEngine(data, previous)
+    if backend == 'scan':
+        from analytics.scan_backend import ScanEngine
+        return ScanEngine(data, previous)
+    raise ValueError(f"Unknown analytics backend '{backend}' (expected one of {', '.join(BACKENDS)})")
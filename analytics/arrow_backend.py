@@ -0,0 +1,188 @@
+# analytics/arrow_backend.py
+from functools import lru_cache
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from analytics.engine import Engine, PASSING_RESULTS, CHECKPOINT_LABELS, box_summary, to_strings
+
+
+# Join keys must have identical types on both sides in Arrow
+KEY_TYPES = {'id_student': pa.int32(), 'id_assessment': pa.int32()}
+
+
+def _table(df):
+    table = pa.Table.from_pandas(to_strings(df), preserve_index=False)
+    for name, key_type in KEY_TYPES.items():
+        if name in table.column_names and table.schema.field(name).type != key_type:
+            index = table.column_names.index(name)
+            table = table.set_column(index, name, pc.cast(table[name], key_type))
+    return table
+
+
+class ArrowEngine(Engine):
+    """Backend running joins and aggregations with pyarrow.compute"""
+
+    name = 'arrow'
+
+    def __init__(self, data, previous=None):
+        super().__init__(data, previous)
+        self.courses = _table(data['courses'])
+        self.assessments = _table(data['assessments'])
+        self.student_info = _table(data['student_info'])
+        self.student_vle = _table(data['student_vle'])
+        self.student_assessment = _table(data['student_assessment'])
+        self._filter = lru_cache(maxsize=16)(self._filter_tables)
+
+    def _filter_tables(self, presentations):
+        student_info, assessments = self.student_info, self.assessments
+        if presentations is not None:
+            value_set = pa.array(presentations, pa.string())
+            student_info = student_info.take(self.demographics.rows({'code_presentation': presentations}))
+            assessments = assessments.filter(pc.is_in(assessments['code_presentation'], value_set=value_set))
+        # One score row per matching enrollment, as in the pandas merge
+        student_assessment = self.student_assessment.join(
+            student_info.select(['id_student']), keys='id_student', join_type='inner'
+        )
+        return student_info, assessments, student_assessment
+
+    def _student_vle(self, presentations):
+        if presentations is None:
+            return self.student_vle
+        value_set = pa.array(presentations, pa.string())
+        return self.student_vle.filter(pc.is_in(self.student_vle['code_presentation'], value_set=value_set))
+
+    def enrollments(self, presentations, columns):
+        student_info, _, _ = self._filter(presentations)
+        return student_info.select(list(columns)).to_pandas()
+
+    def enrollment_counts(self, presentations, by, where=None):
+        student_info, _, _ = self._filter(presentations)
+        for column, value in (where or {}).items():
+            student_info = student_info.filter(pc.equal(student_info[column], value))
+        counts = student_info.group_by(list(by)).aggregate([([], 'count_all')])
+        counts = counts.rename_columns(list(by) + ['count']).sort_by([(col, 'ascending') for col in by])
+        return counts.to_pandas()
+
+    def imd_score_means(self, presentations):
+        student_info, _, student_assessment = self._filter(presentations)
+        known_imd = student_info.filter(pc.not_equal(student_info['imd_band'], 'nan'))
+        merged = student_assessment.select(['id_student', 'score']).join(
+            known_imd.select(['id_student', 'gender', 'age_band', 'imd_band']),
+            keys='id_student', join_type='inner'
+        )
+        means = merged.group_by(['gender', 'age_band', 'imd_band']).aggregate([('score', 'mean')])
+        return means.rename_columns(['gender', 'age_band', 'imd_band', 'score']).to_pandas()
+
+    def score_stats(self, presentations, by):
+        student_info, assessments, student_assessment = self._filter(presentations)
+        merged = student_assessment.select(['id_assessment', 'id_student', 'score']).join(
+            assessments.select(['id_assessment'] + [col for col in by if col in assessments.column_names]),
+            keys='id_assessment', join_type='inner'
+        )
+        if 'gender' in by:
+            merged = merged.join(student_info.select(['id_student', 'gender']), keys='id_student', join_type='inner')
+        return box_summary(merged.select(list(by) + ['score']).to_pandas(), list(by), 'score')
+
+    def engagement_stats(self, presentations):
+        student_info, _, _ = self._filter(presentations)
+        merged = self.student_vle.select(['id_student', 'sum_click']).join(
+            student_info.select(['id_student', 'final_result']), keys='id_student', join_type='inner'
+        )
+        totals = merged.group_by(['id_student', 'final_result']).aggregate([('sum_click', 'sum')])
+        totals = totals.rename_columns(['id_student', 'final_result', 'sum_click'])
+        return box_summary(totals.to_pandas(), ['final_result'], 'sum_click')
+
+    def weekly_clicks(self, presentations):
+        student_info, _, _ = self._filter(presentations)
+        merged = self.student_vle.select(['id_student', 'date', 'sum_click']).join(
+            student_info.select(['id_student', 'final_result']), keys='id_student', join_type='inner'
+        )
+        week = pc.add(pc.cast(pc.floor(pc.divide(pc.cast(merged['date'], pa.float64()), 7)), pa.int64()), 1)
+        merged = merged.append_column('week', week)
+        means = merged.group_by(['week', 'final_result']).aggregate([('sum_click', 'mean')])
+        means = means.rename_columns(['week', 'final_result', 'sum_click'])
+        return means.sort_by([('week', 'ascending'), ('final_result', 'ascending')]).to_pandas()
+
+    def withdrawal_checkpoints(self, presentations):
+        student_info, _, _ = self._filter(presentations)
+        enrollments = student_info.select(
+            ['id_student', 'code_module', 'code_presentation', 'final_result', 'date_registration']
+        ).join(
+            self.courses.select(['code_module', 'code_presentation', 'module_presentation_length']),
+            keys=['code_module', 'code_presentation'], join_type='inner'
+        )
+
+        # Only VLE rows of the selected presentations can match an enrollment
+        student_vle = self._student_vle(presentations)
+        student_vle = student_vle.select(['id_student', 'code_module', 'code_presentation', 'date']).append_column(
+            'row', pa.array(np.arange(len(student_vle), dtype=np.int64))
+        )
+        timeline = student_vle.join(
+            enrollments, keys=['id_student', 'code_module', 'code_presentation'], join_type='inner'
+        )
+        active_students = pc.count_distinct(timeline['id_student']).as_py()
+
+        progress = pc.divide(
+            pc.multiply(pc.cast(pc.subtract(timeline['date'], timeline['date_registration']), pa.float64()), 100),
+            pc.cast(timeline['module_presentation_length'], pa.float64())
+        )
+        in_course = pc.and_(pc.greater_equal(progress, 0), pc.less(progress, 100))
+        timeline = timeline.append_column(
+            'checkpoint', pc.cast(pc.floor(pc.divide(progress, 10)), pa.int64())
+        ).filter(in_course)
+
+        # Result of each student's first VLE row within a checkpoint
+        first_rows = timeline.group_by(['checkpoint', 'id_student']).aggregate([('row', 'min')])
+        first_results = pc.take(timeline['final_result'], pc.index_in(first_rows['row_min'], timeline['row']))
+        withdrawn = first_rows.select(['checkpoint']).append_column(
+            'withdrawn', pc.cast(pc.equal(first_results, 'Withdrawn'), pa.int64())
+        ).group_by('checkpoint').aggregate([('withdrawn', 'sum')]).to_pandas().set_index('checkpoint')
+
+        withdrawal_rates = withdrawn.reindex(range(len(CHECKPOINT_LABELS)), fill_value=0)
+        return withdrawal_rates.assign(
+            checkpoint=CHECKPOINT_LABELS,
+            withdrawal_prob=withdrawal_rates['withdrawn_sum'] / active_students if active_students else float('nan'),
+            students_at_risk=active_students
+        )[['checkpoint', 'withdrawal_prob', 'students_at_risk']].reset_index(drop=True)
+
+    def weekly_module_clicks(self, presentations):
+        student_info, _, _ = self._filter(presentations)
+        activity = self._student_vle(presentations).select(
+            ['id_student', 'code_module', 'code_presentation', 'date', 'sum_click']
+        ).join(
+            student_info.select(['id_student', 'code_module', 'code_presentation', 'final_result']),
+            keys=['id_student', 'code_module', 'code_presentation'], join_type='inner'
+        )
+        week = pc.add(pc.cast(pc.floor(pc.divide(pc.cast(activity['date'], pa.float64()), 7)), pa.int64()), 1)
+        totals = activity.append_column('week', week).group_by(['week', 'final_result', 'code_module']).aggregate([
+            ('sum_click', 'sum'),
+        ]).rename_columns(['week', 'final_result', 'code_module', 'sum_click'])
+        return totals.sort_by([(col, 'ascending') for col in ['week', 'final_result', 'code_module']]).to_pandas()
+
+    def course_benchmarks(self, presentations):
+        student_info, _, student_assessment = self._filter(presentations)
+        passed = pc.cast(pc.is_in(student_info['final_result'], value_set=pa.array(PASSING_RESULTS)), pa.float64())
+        modules = student_info.append_column('passed', passed).group_by('code_module').aggregate([
+            ('id_student', 'count_distinct'),
+            ('passed', 'mean'),
+        ])
+
+        # Scores of every student enrolled in the module
+        module_students = student_info.group_by(['code_module', 'id_student']).aggregate([])
+        scores = module_students.join(
+            student_assessment.select(['id_student', 'score']), keys='id_student', join_type='inner'
+        ).group_by('code_module').aggregate([('score', 'mean')])
+
+        course_metrics = modules.join(scores, keys='code_module', join_type='left outer').to_pandas()
+        return course_metrics.rename(columns={
+            'code_module': 'Course',
+            'id_student_count_distinct': 'Enrollment',
+            'score_mean': 'Avg_Score',
+        }).assign(
+            Pass_Rate=lambda x: x['passed_mean'] * 100
+        )[['Course', 'Enrollment', 'Pass_Rate', 'Avg_Score']].sort_values('Course').reset_index(drop=True)
+
+    def total_clicks(self):
+        return int(pc.sum(self.student_vle['sum_click']).as_py())
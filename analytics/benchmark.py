@@ -0,0 +1,91 @@
+# analytics/benchmark.py
+"""Time every analytics query on each backend and check results against pandas.
+
+    python -m analytics.benchmark [--backends pandas arrow sql] [--repeat 3]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from analytics import BACKENDS, create_engine
+
+# (label, callable) pairs covering every query used by the pages
+QUERIES = [
+    ("overview", lambda e, p: e.overview(p)),
+    ("imd_pass_rates", lambda e, p: e.imd_pass_rates(p)),
+    ("imd_avg_scores", lambda e, p: e.imd_avg_scores(p)),
+    ("result_breakdown", lambda e, p: e.result_breakdown(p)),
+    ("attempt_pathways", lambda e, p: e.attempt_pathways(p)[0]),
+    ("outcome_distribution", lambda e, p: e.outcome_distribution(p, {'disability': [True], 'gender': ['F']})),
+    ("score_stats[type,gender]", lambda e, p: e.score_stats(p, ['assessment_type', 'gender'])),
+    ("score_stats[module]", lambda e, p: e.score_stats(p, ['code_module'])),
+    ("engagement_stats", lambda e, p: e.engagement_stats(p)),
+    ("weekly_engagement", lambda e, p: e.weekly_engagement(p)[0]),
+    ("withdrawal_checkpoints", lambda e, p: e.withdrawal_checkpoints(p)),
+    ("engagement_timeline", lambda e, p: e.engagement_timeline(p)),
+    ("course_benchmarks", lambda e, p: e.course_benchmarks(p)),
+]
+
+
+def _same(expected, actual):
+    """Loose equality for result frames/series/dicts across backends"""
+    if isinstance(expected, dict):
+        return all(_same(expected[key], actual[key]) for key in expected)
+    if isinstance(expected, pd.Series):
+        expected, actual = expected.sort_index(), actual.sort_index()
+        return expected.index.equals(actual.index) and np.allclose(expected.astype(float), actual.astype(float), equal_nan=True)
+    if isinstance(expected, pd.DataFrame):
+        if list(expected.columns) != list(actual.columns) or len(expected) != len(actual):
+            return False
+        for col in expected.columns:
+            left, right = expected[col].reset_index(drop=True), actual[col].reset_index(drop=True)
+            if pd.api.types.is_numeric_dtype(left) and pd.api.types.is_numeric_dtype(right):
+                if not np.allclose(left.astype(float), right.astype(float), rtol=1e-4, equal_nan=True):
+                    return False
+            elif not left.astype(str).equals(right.astype(str)):
+                return False
+        return expected.index.astype(str).equals(actual.index.astype(str))
+    return np.isclose(expected, actual)
+
+
+def run(data, backends, presentations, repeat):
+    reference = {}
+    rows = []
+    for backend in backends:
+        start = time.perf_counter()
+        engine = create_engine(data, backend)
+        rows.append((backend, "(setup)", time.perf_counter() - start, ""))
+        for label, query in QUERIES:
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                result = query(engine, presentations)
+                timings.append(time.perf_counter() - start)
+            if backend == backends[0]:
+                reference[label] = result
+                check = "reference"
+            else:
+                check = "ok" if _same(reference[label], result) else "MISMATCH"
+            rows.append((backend, label, min(timings), check))
+    return pd.DataFrame(rows, columns=['backend', 'query', 'seconds', 'check'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS)
+    parser.add_argument("--presentations", nargs="*", help="presentation filter (default: all)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    from loader import load_data
+    data = load_data()
+    report = run(data, args.backends, tuple(sorted(args.presentations)) if args.presentations else None, args.repeat)
+    print(report.to_string(index=False, float_format=lambda x: f"{x:.4f}"))
+    print()
+    print(report[report['query'] != '(setup)'].groupby('backend', sort=False)['seconds'].sum().rename('total seconds').to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# analytics/bitmap.py
+"""Bit-packed bitmap index over the enrollment demographics.
+
+Every (dimension, value) pair owns a bitmap with one bit per `student_info`
+row, packed into 64-bit words. A filter ORs the bitmaps of the selected values
+within a dimension and ANDs across dimensions; counts are popcounts, so
+cross-filtering never touches the table itself.
+
+The index also keeps each dimension as small integer codes into its sorted
+values. Contingency tables over several dimensions combine the codes of the
+matching rows into one flat cell index and count them with a single bincount,
+so an N-way count tensor costs one pass whatever the number of dimensions.
+"""
+import numpy as np
+import pandas as pd
+
+INDEX_DIMENSIONS = [
+    'code_presentation', 'code_module', 'gender', 'disability', 'age_band',
+    'imd_band', 'region', 'highest_education', 'final_result'
+]
+
+
+def _pack(mask):
+    """Boolean row mask as little-endian 64-bit words"""
+    packed = np.packbits(mask, bitorder='little')
+    return np.pad(packed, (0, -len(packed) % 8)).view(np.uint64)
+
+
+def contingency(codes, shape):
+    """Count tensor of `shape` over rows given by their code along every axis"""
+    cells = np.ravel_multi_index(codes, shape)
+    return np.bincount(cells, minlength=int(np.prod(shape))).reshape(shape)
+
+
+class BitmapIndex:
+    """Row bitmaps of `student_info` per value of each indexed dimension.
+
+    Values follow the engines' conventions: categoricals as strings (missing
+    values as 'nan'), other columns as they are. Filters map a dimension to the
+    accepted values; dimensions that are absent or None are not filtered.
+    """
+
+    def __init__(self, student_info, dimensions=INDEX_DIMENSIONS):
+        self.size = len(student_info)
+        self.all = _pack(np.ones(self.size, dtype=bool))
+        self.bitmaps = {}
+        self.codes = {}
+        for dimension in dimensions:
+            if dimension not in student_info.columns:
+                continue
+            column = student_info[dimension]
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                column = column.astype(str)
+            codes, values = pd.factorize(column, sort=True)
+            self.codes[dimension] = codes.astype(np.min_scalar_type(len(values)))
+            self.bitmaps[dimension] = {value: _pack(codes == code) for code, value in enumerate(values.tolist())}
+
+    def values(self, dimension):
+        """Indexed values of one dimension, sorted"""
+        return list(self.bitmaps[dimension])
+
+    def select(self, filters, skip=None):
+        """Bitmap of the rows matching every filter (except the one on `skip`)"""
+        selected = self.all
+        for dimension, accepted in filters.items():
+            if accepted is None or dimension == skip:
+                continue
+            bitmaps = self.bitmaps[dimension]
+            matches = np.zeros_like(self.all)
+            for value in accepted:
+                if value in bitmaps:
+                    matches = matches | bitmaps[value]
+            selected = selected & matches
+        return selected
+
+    def count(self, filters):
+        """Number of rows matching the filters"""
+        return int(np.bitwise_count(self.select(filters)).sum())
+
+    def rows(self, filters):
+        """Positions of the matching rows, ascending"""
+        bits = np.unpackbits(self.select(filters).view(np.uint8), count=self.size, bitorder='little')
+        return np.flatnonzero(bits)
+
+    def value_counts(self, filters, dimension, skip=None):
+        """Matching rows per value of `dimension` (zeros included)"""
+        selected = self.select(filters, skip)
+        counts = {
+            value: int(np.bitwise_count(selected & bitmap).sum())
+            for value, bitmap in self.bitmaps[dimension].items()
+        }
+        return pd.Series(counts, name='count', dtype='int64').rename_axis(dimension)
+
+    def crosstab(self, filters, dimensions):
+        """Count tensor of the matching rows over `dimensions` and the values along each axis"""
+        values = [self.values(dimension) for dimension in dimensions]
+        codes = [self.codes[dimension] for dimension in dimensions]
+        if any(accepted is not None for accepted in filters.values()):
+            rows = self.rows(filters)
+            codes = [column[rows] for column in codes]
+        return contingency(codes, tuple(len(axis) for axis in values)), values
+
+    def cross_filter(self, filters, dimensions):
+        """Value counts of each dimension under all filters but its own"""
+        return {dimension: self.value_counts(filters, dimension, skip=dimension) for dimension in dimensions}
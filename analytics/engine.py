@@ -0,0 +1,329 @@
+# analytics/engine.py
+import copy
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+import disk_cache
+import metrics
+from analytics.bitmap import BitmapIndex
+
+# Shared constants for every backend
+PASSING_RESULTS = ['Pass', 'Distinction']
+CHECKPOINT_LABELS = [f"{i}-{i+10}%" for i in range(0, 100, 10)]
+BOX_COLUMNS = ['count', 'mean', 'min', 'q1', 'median', 'q3', 'max', 'lowerfence', 'upperfence']
+# Presentation filters whose precomputed results are kept
+RESULT_CACHE_ENTRIES = 8
+
+
+def to_strings(df):
+    """Categorical columns as plain strings (missing values become 'nan')"""
+    categorical = [col for col in df.columns if df[col].dtype == 'category']
+    if not categorical:
+        return df
+    return df.assign(**{col: df[col].astype(str) for col in categorical})
+
+
+def _private_copy(result):
+    """A query result callers may modify without touching the cached one"""
+    if not pd.get_option("mode.copy_on_write"):
+        return copy.deepcopy(result)
+    # Copy-on-write: new frame objects over the same data, copied on their first write
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return result.copy(deep=False)
+    if isinstance(result, tuple):
+        return tuple(_private_copy(item) for item in result)
+    return copy.deepcopy(result)
+
+
+def box_summary(frame, by, value):
+    """Box plot statistics (Tukey fences, linear quartiles) per group of `by`"""
+    frame = frame.dropna(subset=[value])
+    grouped = frame.groupby(by, observed=True, sort=True)[value]
+    stats = grouped.agg(['count', 'mean', 'min', 'max'])
+    quartiles = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    stats['q1'], stats['median'], stats['q3'] = quartiles[0.25], quartiles[0.5], quartiles[0.75]
+
+    # Whiskers end at the furthest points still inside 1.5 IQR
+    iqr = stats['q3'] - stats['q1']
+    bounds = frame.join(
+        pd.DataFrame({'low': stats['q1'] - 1.5 * iqr, 'high': stats['q3'] + 1.5 * iqr}),
+        on=by
+    )
+    stats['lowerfence'] = bounds[bounds[value] >= bounds['low']].groupby(by, observed=True)[value].min()
+    stats['upperfence'] = bounds[bounds[value] <= bounds['high']].groupby(by, observed=True)[value].max()
+    return stats[BOX_COLUMNS].reset_index()
+
+
+def weighted_box_summary(frame, by, value, weight):
+    """box_summary over distinct values with their counts (same linear quartiles)"""
+    rows = []
+    frame = frame.dropna(subset=[value])
+    for keys, group in frame.groupby(by, observed=True, sort=True):
+        group = group.groupby(value)[weight].sum().sort_index()
+        values, cumulative = group.index.to_numpy(dtype=float), np.cumsum(group.to_numpy())
+        n = cumulative[-1]
+
+        def at(position):
+            return values[np.searchsorted(cumulative, position, side='right')]
+
+        def quantile(q):
+            h = (n - 1) * q
+            low = int(np.floor(h))
+            return at(low) + (h - low) * (at(min(low + 1, n - 1)) - at(low))
+
+        q1, q3 = quantile(0.25), quantile(0.75)
+        iqr = q3 - q1
+        rows.append(list(keys) + [
+            n, (values * group.to_numpy()).sum() / n, values[0], q1, quantile(0.5), q3, values[-1],
+            values[values >= q1 - 1.5 * iqr].min(), values[values <= q3 + 1.5 * iqr].max()
+        ])
+    return pd.DataFrame(rows, columns=list(by) + BOX_COLUMNS)
+
+
+class Engine:
+    """Chart computations over the loaded tables.
+
+    Every query takes the selected presentations (None means all of them) and
+    returns a small result frame. Backends implement the primitive queries;
+    everything derivable from those lives here so all backends agree.
+    """
+
+    name = None
+    # Tables can be mapped by precompute's worker processes (see analytics/precompute.py)
+    process_safe = True
+
+    def __init__(self, data, previous=None):
+        """`previous`: the engine of the prior snapshot when only the large tables changed since"""
+        self.total_courses = data['courses']['code_module'].nunique()
+        # The tables queried, as loaded (shared with precompute's workers)
+        self.tables = data
+        # Demographic filters resolve on bitmaps, whatever the backend (unchanged student_info: the same index)
+        self.demographics = BitmapIndex(data['student_info']) if previous is None else previous.demographics
+        # presentations -> {query: Future} of precomputed results, least recently used first
+        self.results = OrderedDict()
+        self.results_lock = threading.Lock()
+        # Digest of the loaded data keying results in the on-disk cache (None: not stored)
+        self.fingerprint = None
+
+    # ---- Result cache ----
+
+    def claim_results(self, presentations, queries):
+        """Register placeholders for the queries not computed or in flight yet; returns those left to compute.
+
+        Results found in the on-disk cache are filled in at once; computed ones are stored there.
+        """
+        with self.results_lock:
+            results = self.results.setdefault(presentations, {})
+            self.results.move_to_end(presentations)
+            while len(self.results) > RESULT_CACHE_ENTRIES:
+                self.results.popitem(last=False)
+            claimed = {query: Future() for query in queries if query not in results}
+            results.update(claimed)
+        for query, future in list(claimed.items()):
+            stored = self._load_result(query, presentations)
+            if stored is not disk_cache.MISSING:
+                future.set_result(stored)
+                del claimed[query]
+            else:
+                future.add_done_callback(partial(self._store_result, query, presentations))
+        return claimed
+
+    def result(self, query, presentations):
+        """Query result, waiting for a precomputed one when it is being computed"""
+        with self.results_lock:
+            future = self.results.get(presentations, {}).get(query)
+            if future is not None and future.cancel():
+                # Still queued for an admission slot: computed here instead of waiting behind other runs
+                del self.results[presentations][query]
+                future = None
+        precomputed = future is not None and future.exception() is None
+        metrics.record_cache('engine_results', precomputed)
+        if precomputed:
+            return _private_copy(future.result())
+        value = self._load_result(query, presentations)
+        if value is disk_cache.MISSING:
+            value = getattr(self, query)(presentations)
+            self._store_result(query, presentations, value)
+        return value
+
+    def _result_key(self, query, presentations):
+        return disk_cache.entry_key(self.fingerprint, f"{self.name}.{query}", (presentations,))
+
+    def _load_result(self, query, presentations):
+        if self.fingerprint is None:
+            return disk_cache.MISSING
+        return disk_cache.load(self._result_key(query, presentations))
+
+    def _store_result(self, query, presentations, value):
+        """Save a result (or a settled Future's) to the on-disk cache"""
+        if isinstance(value, Future):
+            if value.cancelled() or value.exception() is not None:
+                return
+            value = value.result()
+        if self.fingerprint is not None:
+            disk_cache.save(self._result_key(query, presentations), value)
+
+    # ---- Primitive queries (implemented by each backend) ----
+
+    def enrollments(self, presentations, columns):
+        """Selected columns of the filtered `student_info` rows"""
+        raise NotImplementedError
+
+    def enrollment_counts(self, presentations, by, where=None):
+        """Enrollment counts per combination of `by` (equality filters in `where`)"""
+        raise NotImplementedError
+
+    def imd_score_means(self, presentations):
+        """Mean assessment score per gender, age band and (known) IMD band"""
+        raise NotImplementedError
+
+    def score_stats(self, presentations, by):
+        """Box statistics of assessment scores grouped by assessment/student columns"""
+        raise NotImplementedError
+
+    def engagement_stats(self, presentations):
+        """Box statistics of total VLE clicks per student by final result"""
+        raise NotImplementedError
+
+    def weekly_clicks(self, presentations):
+        """Mean clicks per VLE record by course week and final result"""
+        raise NotImplementedError
+
+    def withdrawal_checkpoints(self, presentations):
+        """Withdrawal share of VLE-active students at each 10% course checkpoint"""
+        raise NotImplementedError
+
+    def weekly_module_clicks(self, presentations):
+        """Total clicks per course week, final result and module (VLE rows of each enrollment)"""
+        raise NotImplementedError
+
+    def course_benchmarks(self, presentations):
+        """Enrollment, pass rate and average score per module"""
+        raise NotImplementedError
+
+    def total_clicks(self):
+        """Sum of all VLE clicks"""
+        raise NotImplementedError
+
+    # ---- Derived queries ----
+
+    def distribution(self, presentations, column, normalize=False):
+        """Value counts of one enrollment column, largest first"""
+        counts = self.enrollment_counts(presentations, [column])
+        dist = counts.set_index(column)['count'].sort_values(ascending=False, kind='stable')
+        dist.index.name = column
+        if normalize:
+            dist = dist / dist.sum()
+        return dist
+
+    def overview(self, presentations):
+        """Headline metrics for the dashboard header cards"""
+        result_counts = self.distribution(presentations, 'final_result')
+        return {
+            'total_students': int(result_counts.sum()),
+            'total_courses': self.total_courses,
+            'gender_dist': self.distribution(presentations, 'gender', normalize=True),
+            'disability_rate': self.distribution(presentations, 'disability', normalize=True).get(True, 0),
+            'age_dist': self.distribution(presentations, 'age_band').nlargest(3),
+            'presentation_dist': self.distribution(presentations, 'code_presentation'),
+            'result_dist': result_counts / result_counts.sum(),
+        }
+
+    def imd_pass_rates(self, presentations):
+        """Pass rate per Gender-Age group (rows) and IMD band (columns)"""
+        counts, (genders, ages, bands, results) = self.contingency(
+            presentations, ['gender', 'age_band', 'imd_band', 'final_result']
+        )
+        known = [i for i, band in enumerate(bands) if band != 'nan']
+        passing = [i for i, result in enumerate(results) if result in PASSING_RESULTS]
+        counts = counts[:, :, known, :].reshape(len(genders) * len(ages), len(known), len(results))
+        with np.errstate(invalid='ignore'):
+            rates = counts[..., passing].sum(axis=-1) / counts.sum(axis=-1)
+        rates = pd.DataFrame(
+            rates,
+            index=pd.Index([f"{gender} - {age}" for gender in genders for age in ages], name='gender_age'),
+            columns=pd.Index([bands[i] for i in known], name='imd_band')
+        )
+        # Only the groups and bands that have enrollments
+        return rates.dropna(how='all').dropna(axis=1, how='all')
+
+    def imd_avg_scores(self, presentations):
+        """Average score per Gender-Age group (rows) and IMD band (columns)"""
+        means = self.imd_score_means(presentations)
+        means = means.assign(gender_age=means['gender'] + ' - ' + means['age_band'])
+        return means.set_index(['gender_age', 'imd_band'])['score'].unstack()
+
+    def result_breakdown(self, presentations):
+        """Enrollment counts by final result, gender and age band"""
+        return self.enrollment_counts(presentations, ['final_result', 'gender', 'age_band'])
+
+    def attempt_pathways(self, presentations):
+        """Enrollment counts by attempt group and final result, plus group labels"""
+        counts = self.enrollment_counts(presentations, ['num_of_prev_attempts', 'final_result'])
+        attempts = counts['num_of_prev_attempts'].drop_duplicates().sort_values()
+
+        # Define logical groupings
+        if len(attempts) > 4:
+            bins = [0, 1, 2, 3, attempts.max()+1]
+            labels = ["First Attempt (0)", "Second Attempt (1)", "Third Attempt (2)", "4+ Attempts"]
+        else:
+            bins = attempts.tolist() + [attempts.max()+1]
+            labels = [f"{x} Attempts" for x in attempts]
+
+        counts['attempt_group'] = pd.cut(counts['num_of_prev_attempts'], bins=bins, labels=labels, right=False)
+        grouped = counts.groupby(['attempt_group', 'final_result'], observed=True)['count'].sum().reset_index()
+        return grouped, labels
+
+    def contingency(self, presentations, dimensions, filters=None):
+        """Enrollment count tensor over demographic dimensions and the values along each axis"""
+        return self.demographics.crosstab(dict(filters or {}, code_presentation=presentations), dimensions)
+
+    def outcome_distribution(self, presentations, filters=None):
+        """Final result counts for enrollments matching the demographic filters ({dimension: values})"""
+        counts, (results,) = self.demographics.crosstab(
+            dict(filters or {}, code_presentation=presentations), ['final_result']
+        )
+        counts = pd.Series(counts, index=pd.Index(results, name='final_result'), name='count')
+        return counts[counts > 0]
+
+    def demographic_counts(self, presentations, filters=None, dimensions=()):
+        """Matching enrollments and, per dimension, counts under every other filter"""
+        filters = dict(filters or {}, code_presentation=presentations)
+        return self.demographics.count(filters), self.demographics.cross_filter(filters, dimensions)
+
+    def engagement_timeline(self, presentations):
+        """Week x outcome x module cube of cumulative clicks and students still enrolled"""
+        keys = ['final_result', 'code_module']
+        clicks = self.weekly_module_clicks(presentations)
+        enrolled = self.enrollment_counts(presentations, keys).set_index(keys)['count']
+        if clicks.empty:
+            return pd.DataFrame(columns=['week'] + keys + ['cumulative_clicks', 'enrolled'])
+        weeks = pd.RangeIndex(int(clicks['week'].min()), int(clicks['week'].max()) + 1, name='week')
+
+        cumulative_clicks = clicks.pivot_table(
+            index='week', columns=keys, values='sum_click', aggfunc='sum'
+        ).reindex(index=weeks, columns=enrolled.index, fill_value=0).fillna(0).cumsum()
+
+        # Unregistrations count from their week on (earlier ones from the first week)
+        unregistered = self.enrollment_counts(presentations, keys + ['date_unregistration'])
+        unregistered = unregistered.dropna(subset=['date_unregistration'])
+        unregistered['week'] = (unregistered['date_unregistration'].astype(int) // 7 + 1).clip(weeks[0], weeks[-1])
+        left = unregistered.pivot_table(
+            index='week', columns=keys, values='count', aggfunc='sum'
+        ).reindex(index=weeks, columns=enrolled.index, fill_value=0).fillna(0).cumsum()
+
+        return pd.DataFrame({
+            'cumulative_clicks': cumulative_clicks.stack(keys, future_stack=True),
+            'enrolled': (enrolled - left).stack(keys, future_stack=True),
+        }).reset_index()
+
+    def weekly_engagement(self, presentations):
+        """Weekly mean clicks by result, the peak divergence week and last week"""
+        weekly_avg = self.weekly_clicks(presentations)
+        peak_week = weekly_avg.groupby('week')['sum_click'].std().idxmax()
+        return weekly_avg, peak_week, weekly_avg['week'].max()
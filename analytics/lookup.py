@@ -0,0 +1,257 @@
+# analytics/lookup.py
+"""Offset index over the per-enrollment rows of the large tables.
+
+Every VLE and score row is numbered with its enrollment (its `student_info`
+position). A stable argsort of those numbers groups the rows by enrollment, and
+offsets[e]:offsets[e + 1] is the slice of that permutation holding enrollment
+e's rows, so one student's history is a slice plus a gather of its own rows
+instead of a scan of the table. Stored tables are indexed from the student ids
+of each partition and gathered row group by row group.
+
+The engagement matrix builds on the same grouping: weekly clicks of every
+enrollment (log-scaled, float32), written once to a memory-mapped .npy file.
+Similar students are the rows with the highest cosine similarity, scored block
+by block so memory stays flat however many enrollments there are.
+
+Matrices are generations like the store's tables: a pointer names the current
+one, and a new one only retires those older than the one it replaces, which
+other instances may still have mapped.
+"""
+import glob
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+
+import store
+
+LOOKUP_TABLES = ['student_vle', 'student_assessment']
+WEEK_DAYS = 7
+# Enrollments per block when building or scanning the engagement matrix
+MATRIX_BLOCK = 64 * 1024
+# Names the current engagement matrix in its directory
+MATRIX_POINTER = "engagement-CURRENT"
+
+
+def _columns(table, names):
+    """Whole columns as arrays in storage order (stored tables read only these columns)"""
+    if isinstance(table, ds.Dataset):
+        columns = table.to_table(columns=names)
+        return [columns[name].to_numpy() for name in names]
+    return [table[name].to_numpy() for name in names]
+
+
+def _codes(values, categories):
+    """Positions of the values among `categories` (-1 when absent)"""
+    return pd.Categorical(values, categories=categories).codes.astype(np.int64)
+
+
+class EnrollmentIndex:
+    """Rows of `student_vle` and `student_assessment` per enrollment"""
+
+    def __init__(self, data):
+        student_info = data['student_info']
+        self.student_info = student_info
+        self.modules = pd.Index(student_info['code_module'].astype(str).unique())
+        self.presentations = pd.Index(student_info['code_presentation'].astype(str).unique())
+        # Enrollment keys (student, course) sorted, with their student_info positions
+        keys = self._keys(
+            student_info['id_student'],
+            _codes(student_info['code_module'].astype(str), self.modules),
+            _codes(student_info['code_presentation'].astype(str), self.presentations)
+        )
+        self.order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.order]
+
+        # Course of every assessment, for score rows kept in memory
+        assessments = data['assessments']
+        self.assessment_ids = pd.Index(assessments['id_assessment'])
+        self.assessment_courses = (
+            _codes(assessments['code_module'].astype(str), self.modules),
+            _codes(assessments['code_presentation'].astype(str), self.presentations)
+        )
+
+        self.tables, self.permutations, self.offsets = {}, {}, {}
+        for name in LOOKUP_TABLES:
+            table = data[name]
+            numbers = self._enrollment_numbers(name, table)
+            permutation = np.argsort(numbers, kind='stable')
+            # Rows without an enrollment (-1) sort first and fall outside every slice
+            self.offsets[name] = np.searchsorted(numbers[permutation], np.arange(len(student_info) + 1))
+            self.permutations[name] = permutation.astype(np.min_scalar_type(max(len(numbers) - 1, 0)))
+            self.tables[name] = table
+
+    def _keys(self, students, modules, presentations):
+        """Combined enrollment key; -1 where the course is unknown"""
+        courses = modules * len(self.presentations) + presentations
+        keys = np.asarray(students, dtype=np.int64) * (len(self.modules) * len(self.presentations)) + courses
+        return np.where((modules < 0) | (presentations < 0), -1, keys)
+
+    def _numbers(self, keys):
+        """student_info position of each enrollment key (-1 when it has none)"""
+        found = np.searchsorted(self.keys, keys).clip(max=max(len(self.keys) - 1, 0))
+        matched = (keys >= 0) & (self.keys[found] == keys) if len(self.keys) else np.zeros(len(keys), bool)
+        return np.where(matched, self.order[found], -1)
+
+    def _enrollment_numbers(self, name, table):
+        """Enrollment of every row, in storage order"""
+        if isinstance(table, ds.Dataset):
+            # Partitions hold one course each: only the student ids are read
+            numbers = []
+            for fragment in table.get_fragments():
+                course = ds.get_partition_keys(fragment.partition_expression)
+                students = fragment.to_table(columns=['id_student'], schema=table.schema)['id_student']
+                module = _codes([course['code_module']], self.modules)[0]
+                presentation = _codes([course['code_presentation']], self.presentations)[0]
+                numbers.append(self._numbers(self._keys(
+                    students.to_numpy(), np.full(len(students), module), np.full(len(students), presentation)
+                )))
+            return np.concatenate(numbers) if numbers else np.empty(0, np.int64)
+        if 'code_module' in table.columns:
+            modules = _codes(table['code_module'].astype(str), self.modules)
+            presentations = _codes(table['code_presentation'].astype(str), self.presentations)
+        else:
+            # Scores only name their assessment; the course comes from it
+            assessment = self.assessment_ids.get_indexer(table['id_assessment'])
+            modules = np.where(assessment < 0, -1, self.assessment_courses[0][assessment])
+            presentations = np.where(assessment < 0, -1, self.assessment_courses[1][assessment])
+        return self._numbers(self._keys(table['id_student'], modules, presentations))
+
+    def enrollments(self, id_student):
+        """student_info rows of one student (one per module presentation)"""
+        courses = len(self.modules) * len(self.presentations)
+        start, stop = np.searchsorted(self.keys, [id_student * courses, (id_student + 1) * courses])
+        return self.student_info.iloc[np.sort(self.order[start:stop])]
+
+    def grouped_columns(self, name, columns):
+        """Enrollment of every indexed row of table `name` and the given columns, grouped by enrollment"""
+        offsets = self.offsets[name]
+        rows = self.permutations[name][offsets[0]:offsets[-1]]
+        numbers = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+        return numbers, [values[rows] for values in _columns(self.tables[name], columns)]
+
+    def rows(self, name, enrollment):
+        """Rows of table `name` belonging to the enrollment at student_info position `enrollment`"""
+        offsets = self.offsets[name]
+        positions = self.permutations[name][offsets[enrollment]:offsets[enrollment + 1]]
+        return store.take_rows(self.tables[name], positions.astype(np.int64))
+
+
+def build_engagement_matrix(index, path):
+    """Write the enrollment x week matrix of log clicks to `path`, then its first week alongside.
+
+    The sidecar is written last: a matrix is complete once its .json exists.
+    """
+    dates, clicks = _columns(index.tables['student_vle'], ['date', 'sum_click'])
+    first_week = int(dates.min()) // WEEK_DAYS if len(dates) else 0
+    weeks = int(dates.max()) // WEEK_DAYS - first_week + 1 if len(dates) else 1
+    enrollments = len(index.student_info)
+    offsets, permutation = index.offsets['student_vle'], index.permutations['student_vle']
+
+    def write(tmp):
+        matrix = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.float32, shape=(enrollments, weeks))
+        # The permutation lists rows enrollment by enrollment: each block is one contiguous slice
+        for start in range(0, enrollments, MATRIX_BLOCK):
+            stop = min(start + MATRIX_BLOCK, enrollments)
+            rows = permutation[offsets[start]:offsets[stop]]
+            owners = np.repeat(np.arange(stop - start), np.diff(offsets[start:stop + 1]))
+            cells = owners * weeks + (dates[rows] // WEEK_DAYS - first_week)
+            weekly = np.bincount(cells, weights=clicks[rows], minlength=(stop - start) * weeks)
+            matrix[start:stop] = np.log1p(weekly).reshape(stop - start, weeks)
+        matrix.flush()
+        del matrix
+
+    store.replace_file(path, write)
+    store.write_text(f"{path}.json", json.dumps({'first_week': first_week}))
+
+
+def _retire_matrices(path):
+    """Make the matrix at `path` the current one and remove those older than the one it replaces.
+
+    The replaced matrix is kept, since instances that mapped it before the
+    swap still read it; files still being written (.tmp) are left alone.
+    """
+    directory = os.path.dirname(path)
+    pointer = os.path.join(directory, MATRIX_POINTER)
+    previous = None
+    if os.path.exists(pointer):
+        with open(pointer) as f:
+            previous = f.read().strip()
+    current = os.path.basename(path)
+    if previous == current:
+        return
+    store.write_text(pointer, current)
+    if previous is None:
+        # Any matrix already here may be the one in use
+        return
+    for stale in glob.glob(os.path.join(directory, "engagement-*.npy*")):
+        name = os.path.basename(stale)
+        if name.endswith(".tmp") or name.startswith((current, previous)):
+            continue
+        try:
+            os.remove(stale)
+        except FileNotFoundError:
+            # Retired by another instance at the same time
+            pass
+
+
+class EngagementMatrix:
+    """Memory-mapped weekly click profiles of all enrollments, with nearest-neighbour queries"""
+
+    def __init__(self, index, path):
+        if not os.path.exists(f"{path}.json"):
+            build_engagement_matrix(index, path)
+            # Matrices of earlier data are superseded
+            _retire_matrices(path)
+        self.matrix = np.load(path, mmap_mode='r')
+        with open(f"{path}.json") as f:
+            self.first_week = json.load(f)['first_week']
+        self.norms = np.concatenate([
+            np.sqrt(np.einsum('ij,ij->i', block, block))
+            for block in self._blocks()
+        ]) if len(self.matrix) else np.empty(0, np.float32)
+
+    def _blocks(self):
+        for start in range(0, len(self.matrix), MATRIX_BLOCK):
+            yield self.matrix[start:start + MATRIX_BLOCK]
+
+    @property
+    def weeks(self):
+        """Course week of every column"""
+        return np.arange(self.matrix.shape[1]) + self.first_week
+
+    def weekly_clicks(self, enrollments):
+        """Weekly clicks (undoing the log scale) of the given enrollments"""
+        return np.expm1(self.matrix[np.asarray(enrollments)].astype(np.float64))
+
+    def neighbours(self, enrollment, k=10, candidates=None):
+        """Positions and cosine similarities of the k enrollments with the closest weekly profile.
+
+        `candidates` (student_info positions) restricts the search, e.g. to one module.
+        """
+        query = np.asarray(self.matrix[enrollment], dtype=np.float32)
+        if not self.norms[enrollment]:
+            return np.empty(0, np.int64), np.empty(0, np.float32)
+        allowed = None
+        if candidates is not None:
+            allowed = np.zeros(len(self.matrix), dtype=bool)
+            allowed[candidates] = True
+        best, scores = [], []
+        for start, block in zip(range(0, len(self.matrix), MATRIX_BLOCK), self._blocks()):
+            norms = self.norms[start:start + len(block)]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                similarity = (block @ query) / (norms * self.norms[enrollment])
+            similarity[norms == 0] = -np.inf
+            if allowed is not None:
+                similarity[~allowed[start:start + len(block)]] = -np.inf
+            if start <= enrollment < start + len(block):
+                similarity[enrollment - start] = -np.inf
+            top = np.argpartition(-similarity, min(k, len(block) - 1))[:k]
+            best.append(top + start)
+            scores.append(similarity[top])
+        best, scores = np.concatenate(best), np.concatenate(scores)
+        order = np.argsort(-scores, kind='stable')[:k]
+        keep = np.isfinite(scores[order])
+        return best[order][keep], scores[order][keep]
@@ -0,0 +1,207 @@
+# analytics/pandas_backend.py
+from functools import lru_cache
+
+import pandas as pd
+
+from analytics.engine import Engine, PASSING_RESULTS, CHECKPOINT_LABELS, box_summary, to_strings
+from schema import concat, narrowest_integer
+
+DAY_KEYS = ['id_student', 'code_module', 'code_presentation', 'date']
+
+
+class PandasEngine(Engine):
+    """Reference backend: the original in-memory pandas logic"""
+
+    name = 'pandas'
+
+    def __init__(self, data, previous=None, appended=None):
+        super().__init__(data, previous)
+        self.courses = to_strings(data['courses'])
+        self.assessments = to_strings(data['assessments'])
+        self.student_info = to_strings(data['student_info'])
+        # The large tables keep their compact categorical keys, which only serve joins
+        self.student_vle = data['student_vle']
+        self.student_assessment = data['student_assessment']
+        new_rows = (appended or {}).get('student_vle')
+        if previous is None or new_rows is None or previous.daily_clicks is None:
+            self.daily_clicks = self._daily_clicks()
+        else:
+            # Only the appended VLE rows are summarized
+            self.daily_clicks = self._add_daily_clicks(previous.daily_clicks, new_rows)
+        self._filter = lru_cache(maxsize=16)(self._filter_tables)
+        self._scores = lru_cache(maxsize=4)(self._assessment_scores)
+
+    def _daily_clicks(self, student_vle=None):
+        """VLE clicks and rows per enrollment and day (shared, do not mutate).
+
+        The engagement queries join this instead of the raw table, so their joins
+        carry several times fewer rows and only the columns they use. Days keep the
+        order of their first row, so "first row in storage order" still holds.
+        """
+        student_vle = self.student_vle if student_vle is None else student_vle
+        daily = student_vle.groupby(DAY_KEYS, sort=False, observed=True)['sum_click'].agg(
+            sum_click='sum', rows='size'
+        ).reset_index()
+        return daily.assign(sum_click=narrowest_integer(daily['sum_click']), rows=narrowest_integer(daily['rows']))
+
+    def _add_daily_clicks(self, daily, new_rows):
+        """A daily summary with appended VLE rows added in, as if it was built from all rows"""
+        if not new_rows:
+            return daily
+        added = self._daily_clicks(concat(new_rows))
+        # Days already summarized can only be among the rows of the same students
+        candidates = daily[daily['id_student'].isin(added['id_student'].unique())]
+        matched = candidates[DAY_KEYS].astype({'code_module': str, 'code_presentation': str}).reset_index().merge(
+            added.astype({'code_module': str, 'code_presentation': str}).reset_index(names='added'), on=DAY_KEYS
+        )
+        totals = {}
+        for column in ['sum_click', 'rows']:
+            values = daily[column].to_numpy(dtype='int64', copy=True)
+            values[matched['index'].to_numpy()] += matched[column].to_numpy(dtype='int64')
+            totals[column] = narrowest_integer(pd.Series(values, index=daily.index))
+        # New days follow, in the order of their first appended row
+        fresh = added.drop(index=matched['added'])
+        return concat([daily.assign(**totals), fresh])
+
+    def _daily_rows(self, student_info, presentations=None):
+        """Daily clicks of the given students (and of the selected presentations, when given)"""
+        daily = self.daily_clicks
+        keep = daily['id_student'].isin(student_info['id_student'].unique())
+        if presentations is not None:
+            keep &= daily['code_presentation'].isin(presentations)
+        return daily[keep]
+
+    def _filter_tables(self, presentations):
+        """Tables restricted to the selected presentations (shared, do not mutate)"""
+        if presentations is None:
+            return self.student_info, self.assessments, self.student_assessment.merge(
+                self.student_info[['id_student']], on='id_student', how='inner'
+            )
+        student_info = self.student_info.iloc[self.demographics.rows({'code_presentation': presentations})]
+        assessments = self.assessments[self.assessments['code_presentation'].isin(presentations)]
+        student_assessment = self.student_assessment.merge(
+            student_info[['id_student']],
+            on='id_student',
+            how='inner'
+        )
+        return student_info, assessments, student_assessment
+
+    def enrollments(self, presentations, columns):
+        student_info, _, _ = self._filter(presentations)
+        return student_info[list(columns)]
+
+    def enrollment_counts(self, presentations, by, where=None):
+        student_info, _, _ = self._filter(presentations)
+        for column, value in (where or {}).items():
+            student_info = student_info[student_info[column] == value]
+        return student_info.groupby(list(by)).size().reset_index(name='count')
+
+    def imd_score_means(self, presentations):
+        student_info, _, student_assessment = self._filter(presentations)
+        merged_scores = pd.merge(
+            student_assessment,
+            student_info[student_info['imd_band'] != 'nan'][['id_student', 'gender', 'age_band', 'imd_band']],
+            on='id_student',
+            how='inner'
+        )
+        return merged_scores.groupby(['gender', 'age_band', 'imd_band'])['score'].mean().reset_index()
+
+    def _assessment_scores(self, presentations):
+        """Filtered scores joined with their assessments (shared by the score charts, do not mutate)"""
+        _, assessments, student_assessment = self._filter(presentations)
+        return pd.merge(student_assessment, assessments, on='id_assessment')
+
+    def score_stats(self, presentations, by):
+        student_info, _, _ = self._filter(presentations)
+        merged_scores = self._scores(presentations)
+        if 'gender' in by:
+            merged_scores = pd.merge(merged_scores, student_info[['id_student', 'gender']], on='id_student')
+        return box_summary(merged_scores, list(by), 'score')
+
+    def engagement_stats(self, presentations):
+        student_info, _, _ = self._filter(presentations)
+        # Totals per student first, so the join has one row per enrollment
+        totals = self._daily_rows(student_info).groupby('id_student')['sum_click'].sum().reset_index()
+        engagement = (
+            student_info[['id_student', 'final_result']]
+            .merge(totals, on='id_student')
+            .groupby(['id_student', 'final_result'])['sum_click']
+            .sum()
+            .reset_index()
+        )
+        return box_summary(engagement, ['final_result'], 'sum_click')
+
+    def weekly_clicks(self, presentations):
+        student_info, _, _ = self._filter(presentations)
+        # Mean clicks per VLE row: weekly sums and row counts per student, then their ratio
+        daily = self._daily_rows(student_info)
+        weekly = daily.assign(week=daily['date'] // 7 + 1).groupby(
+            ['id_student', 'week']
+        )[['sum_click', 'rows']].sum().reset_index()
+        totals = weekly.merge(
+            student_info[['id_student', 'final_result']],
+            on='id_student'
+        ).groupby(['week', 'final_result'])[['sum_click', 'rows']].sum()
+        return (totals['sum_click'] / totals['rows']).rename('sum_click').reset_index()
+
+    def withdrawal_checkpoints(self, presentations):
+        student_info, _, _ = self._filter(presentations)
+        timeline_data = self._daily_rows(student_info, presentations)[
+            ['id_student', 'code_module', 'code_presentation', 'date']
+        ].merge(
+            student_info[['id_student', 'code_module', 'code_presentation', 'final_result', 'date_registration']].merge(
+                self.courses[['code_module', 'code_presentation', 'module_presentation_length']],
+                on=['code_module', 'code_presentation']
+            ),
+            on=['id_student', 'code_module', 'code_presentation']
+        ).assign(
+            progress=lambda x: 100 * (x['date'].astype('int64') - x['date_registration']) / x['module_presentation_length']
+        )
+
+        # Bin into checkpoints (0-10%, 10-20%, etc.)
+        timeline_data['checkpoint'] = pd.cut(
+            timeline_data['progress'],
+            bins=range(0, 101, 10),
+            labels=CHECKPOINT_LABELS,
+            right=False
+        )
+
+        # Every active student counts at every checkpoint (unobserved pairs are "not withdrawn")
+        return (
+            timeline_data.groupby(['checkpoint', 'id_student'], observed=False)
+            ['final_result'].first()
+            .eq('Withdrawn')
+            .groupby('checkpoint', observed=False)
+            .agg(['mean', 'count'])
+            .rename(columns={'mean': 'withdrawal_prob', 'count': 'students_at_risk'})
+            .reset_index()
+        )
+
+    def weekly_module_clicks(self, presentations):
+        student_info, _, _ = self._filter(presentations)
+        activity = self._daily_rows(student_info, presentations)[
+            ['id_student', 'code_module', 'code_presentation', 'date', 'sum_click']
+        ].merge(
+            student_info[['id_student', 'code_module', 'code_presentation', 'final_result']],
+            on=['id_student', 'code_module', 'code_presentation']
+        )
+        activity['week'] = (activity['date'] // 7) + 1
+        return activity.groupby(['week', 'final_result', 'code_module'])['sum_click'].sum().reset_index()
+
+    def course_benchmarks(self, presentations):
+        student_info, _, student_assessment = self._filter(presentations)
+        return (
+            student_info.groupby('code_module')
+            .agg(
+                Enrollment=('id_student', 'nunique'),
+                Pass_Rate=('final_result', lambda x: (x.isin(PASSING_RESULTS)).mean() * 100),
+                Avg_Score=('id_student', lambda x: student_assessment[
+                    student_assessment['id_student'].isin(x)
+                ]['score'].mean())
+            )
+            .reset_index()
+            .rename(columns={'code_module': 'Course'})
+        )
+
+    def total_clicks(self):
+        return int(self.student_vle['sum_click'].sum())
@@ -0,0 +1,207 @@
+# analytics/precompute.py
+"""Parallel precomputation of the independent dashboard aggregates.
+
+The heavy section queries do not depend on each other, so they are fanned out
+over a persistent pool of worker processes: the default view's when a dataset
+is loaded, and those of the section group being viewed as soon as the page
+knows the filter. Results land in the engine's result cache (Engine.result),
+where the section builders pick them up.
+
+Workers are started with spawn, never forked from the threaded server. They
+read a snapshot's tables from Arrow files written once per snapshot and
+memory-mapped by every worker, so the data is shared read-only through the
+page cache instead of being copied into each of them; out-of-core tables are
+scanned from their store. Each worker builds its own engine over the mapped
+tables the first time it sees a snapshot, and only the small result frames
+travel back.
+
+Every query holds an admission slot (admission.py) while a worker computes
+it, like the page runs' own computations, so precomputing never adds to the
+number of heavy computations running at once. A query still waiting for a
+slot when a page run needs it is cancelled here and computed by that run
+instead. Engines whose tables cannot be shared with other processes (DuckDB)
+compute in this process.
+"""
+import atexit
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import types
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+import pyarrow as pa
+
+import admission
+from analytics import create_engine
+from store import replace_file
+
+# Set PRECOMPUTE=0 to compute every query on demand
+PRECOMPUTE = os.environ.get("PRECOMPUTE", "1") == "1"
+# Worker processes (each query still needs an admission slot to run)
+PRECOMPUTE_WORKERS = int(os.environ.get("PRECOMPUTE_WORKERS", os.cpu_count() or 1))
+# Snapshots whose engine a worker keeps
+WORKER_ENGINES = 2
+# Queries behind the IMD heatmaps, attempt Sankey, engagement box, weekly
+# engagement, withdrawal checkpoints and course benchmarks
+PRE_ENROLLMENT_QUERIES = ['imd_pass_rates', 'imd_avg_scores', 'attempt_pathways']
+POST_ENROLLMENT_QUERIES = ['engagement_stats', 'weekly_engagement', 'withdrawal_checkpoints', 'course_benchmarks']
+PRECOMPUTE_QUERIES = PRE_ENROLLMENT_QUERIES + POST_ENROLLMENT_QUERIES
+
+# Threads waiting on the workers, one per query being computed
+_dispatch = ThreadPoolExecutor(max_workers=max(PRECOMPUTE_WORKERS, 1), thread_name_prefix="precompute")
+_pool = None
+_pool_lock = threading.Lock()
+_shared_dir = None
+_share_lock = threading.Lock()
+# In a worker: (fingerprint, backend) -> engine, least recently used first
+_engines = OrderedDict()
+
+
+# ---- Server side ----
+
+def _workers():
+    """The worker pool, started on first use (and again after a worker died)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PRECOMPUTE_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_start_worker
+            )
+        return _pool
+
+
+def _submit(pool, *args):
+    """pool.submit, with the running script hidden from the workers it may start.
+
+    Spawn runs the __main__ module again in every new worker, and Streamlit
+    installs each page script as __main__: a stand-in without a file keeps
+    the workers from running the app.
+    """
+    with _pool_lock:
+        main, stand_in = sys.modules['__main__'], types.ModuleType('__main__')
+        sys.modules['__main__'] = stand_in
+        try:
+            return pool.submit(*args)
+        finally:
+            # Unless a script run has installed its own meanwhile
+            if sys.modules['__main__'] is stand_in:
+                sys.modules['__main__'] = main
+
+
+def _restart_workers(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _share_directory():
+    """This process's directory of shared tables, removed when it exits"""
+    global _shared_dir
+    if _shared_dir is None:
+        _shared_dir = tempfile.mkdtemp(prefix="precompute-")
+        atexit.register(shutil.rmtree, _shared_dir, True)
+    return _shared_dir
+
+
+def _write_arrow(frame, path):
+    table = pa.Table.from_pandas(frame)
+    with pa.ipc.new_file(path, table.schema) as writer:
+        writer.write_table(table)
+
+
+def _share(engine):
+    """How workers open the engine's tables: an Arrow file per in-memory table, stored tables as they are.
+
+    Written on the first query of a snapshot and removed once its engine is gone.
+    """
+    with _share_lock:
+        if getattr(engine, 'shared_tables', None) is None:
+            directory = _share_directory()
+            tables, paths = {}, []
+            for name, table in engine.tables.items():
+                if isinstance(table, pd.DataFrame):
+                    path = os.path.join(directory, f"{engine.fingerprint}-{engine.name}-{name}.arrow")
+                    replace_file(path, lambda tmp, table=table: _write_arrow(table, tmp))
+                    tables[name] = path
+                    paths.append(path)
+                else:
+                    tables[name] = table
+            # Workers that mapped a file keep reading it after it is removed
+            weakref.finalize(engine, _remove, paths)
+            engine.shared_tables = ((engine.fingerprint, engine.name), tables)
+        return engine.shared_tables
+
+
+def _remove(paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _compute(engine, query, presentations):
+    if not engine.process_safe or engine.fingerprint is None:
+        return getattr(engine, query)(presentations)
+    source = _share(engine)
+    pool = _workers()
+    try:
+        return _submit(pool, _run, source, query, presentations).result()
+    except BrokenProcessPool:
+        _restart_workers(pool)
+        raise
+
+
+def _dispatch_query(engine, query, presentations, placeholder):
+    with admission.gate.admit():
+        # A page run that needed the result before it started computes it itself
+        if not placeholder.set_running_or_notify_cancel():
+            return
+        try:
+            placeholder.set_result(_compute(engine, query, presentations))
+        except BaseException as e:
+            placeholder.set_exception(e)
+
+
+def precompute(engine, presentations, queries=PRECOMPUTE_QUERIES):
+    """Start computing the queries for `presentations` in the background; returns without waiting.
+
+    Queries already computed or in flight are skipped.
+    """
+    if not PRECOMPUTE or PRECOMPUTE_WORKERS < 1:
+        return
+    for query, placeholder in engine.claim_results(presentations, queries).items():
+        _dispatch.submit(_dispatch_query, engine, query, presentations, placeholder)
+
+
+# ---- Worker side ----
+
+def _start_worker():
+    # The mapped tables are read-only: under copy-on-write, frames derived from them copy before writing
+    pd.set_option("mode.copy_on_write", True)
+
+
+def _open(table):
+    if isinstance(table, str):
+        # Zero-copy: the frame's columns point into the mapped file
+        return pa.ipc.open_file(pa.memory_map(table)).read_all().to_pandas(split_blocks=True)
+    return table
+
+
+def _run(source, query, presentations):
+    key, tables = source
+    if key not in _engines:
+        _engines[key] = create_engine({name: _open(table) for name, table in tables.items()}, key[1])
+        while len(_engines) > WORKER_ENGINES:
+            _engines.popitem(last=False)
+    _engines.move_to_end(key)
+    return getattr(_engines[key], query)(presentations)
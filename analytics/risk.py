@@ -0,0 +1,221 @@
+# analytics/risk.py
+"""Batch at-risk scoring of the enrollments still active on a course day.
+
+Per-enrollment arrays are prepared once: cumulative weekly clicks (read from
+the memory-mapped engagement matrix block by block), assessment submissions grouped by enrollment (from the
+offset index), due dates per course and the static enrollment columns. The
+features as of day N are then a few whole-array operations (column picks,
+masks and bincounts), and scoring is one matrix-vector product for everyone.
+
+The model is an L2-regularized logistic regression of ending in a fail or
+withdrawal, fitted by Newton steps (IRLS) on the enrollments active on the same
+day. One model is fitted per cutoff day and cached to disk next to the
+engagement matrix. Every fifth student is held out to report its AUC.
+"""
+import glob
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+import admission
+from analytics.lookup import MATRIX_BLOCK, WEEK_DAYS
+from store import replace_file
+
+AT_RISK_RESULTS = ['Withdrawn', 'Fail']
+RECENT_WEEKS = 2
+L2_PENALTY = 1.0
+NEWTON_STEPS = 25
+# Students with id_student % HOLDOUT_MODULUS == 0 are kept out of training
+HOLDOUT_MODULUS = 5
+ACTIVITY_FEATURES = [
+    'log_clicks', 'log_recent_clicks', 'active_week_share', 'idle_weeks',
+    'submitted', 'missed', 'mean_score', 'no_scores',
+]
+
+
+def fit_logistic(X, y, penalty=L2_PENALTY, steps=NEWTON_STEPS):
+    """Weights (intercept first) of an L2-regularized logistic regression"""
+    X = np.column_stack([np.ones(len(X)), X])
+    ridge = np.full(X.shape[1], penalty)
+    ridge[0] = 0
+    weights = np.zeros(X.shape[1])
+    for _ in range(steps):
+        p = 1 / (1 + np.exp(-(X @ weights)))
+        gradient = X.T @ (p - y) + ridge * weights
+        hessian = (X * (p * (1 - p))[:, None]).T @ X + np.diag(ridge)
+        step = np.linalg.solve(hessian, gradient)
+        weights -= step
+        if np.abs(step).max() < 1e-6:
+            break
+    return weights
+
+
+def auc(scores, labels):
+    """Area under the ROC curve (Mann-Whitney rank statistic)"""
+    positives = int(labels.sum())
+    negatives = len(labels) - positives
+    if not positives or not negatives:
+        return float('nan')
+    ranks = pd.Series(scores).rank().to_numpy()
+    return float((ranks[labels].sum() - positives * (positives + 1) / 2) / (positives * negatives))
+
+
+def _one_hot(column):
+    """Indicator columns of a categorical (missing values get none) and their names"""
+    codes, values = pd.factorize(column.astype(str), sort=True)
+    return np.eye(len(values), dtype=np.float32)[codes], [f"{column.name}={value}" for value in values]
+
+
+class RiskScorer:
+    """Risk of failing or withdrawing for every enrollment, as of any course day"""
+
+    def __init__(self, index, matrix, assessments, path):
+        info = index.student_info
+        self.student_info = info
+        self.path = path
+        for stale in glob.glob(os.path.join(os.path.dirname(path), "risk-*.npz")):
+            if not stale.startswith(path):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    # Removed by another instance at the same time
+                    pass
+
+        # Clicks and active weeks up to the end of each week (column w: the first w weeks), from
+        # one block of matrix rows at a time so only that block is held as float64
+        rows, weeks = matrix.matrix.shape
+        self.first_week = matrix.first_week
+        self.cumulative_clicks = np.zeros((rows, weeks + 1), dtype=np.float32)
+        self.active_weeks = np.zeros((rows, weeks + 1), dtype=np.int16)
+        # Last week with clicks among the first w (-1: none yet)
+        self.last_active = np.full((rows, weeks + 1), -1, dtype=np.int16)
+        for start in range(0, rows, MATRIX_BLOCK):
+            weekly = np.expm1(matrix.matrix[start:start + MATRIX_BLOCK].astype(np.float64))
+            block = slice(start, start + len(weekly))
+            self.cumulative_clicks[block, 1:] = np.cumsum(weekly, axis=1)
+            self.active_weeks[block, 1:] = np.cumsum(weekly > 0, axis=1)
+            self.last_active[block, 1:] = np.maximum.accumulate(np.where(weekly > 0, np.arange(weeks), -1), axis=1)
+
+        # Submissions grouped by enrollment
+        self.numbers, (self.submitted, self.scores) = index.grouped_columns(
+            'student_assessment', ['date_submitted', 'score']
+        )
+        self.scores = self.scores.astype(np.float64)
+
+        # Course of every enrollment and assessment, for the assessments due so far
+        courses = pd.MultiIndex.from_frame(info[['code_module', 'code_presentation']].astype(str))
+        self.courses, course_values = courses.factorize()
+        self.assessment_courses = course_values.get_indexer(
+            pd.MultiIndex.from_frame(assessments[['code_module', 'code_presentation']].astype(str))
+        )
+        self.due_dates = assessments['date'].to_numpy(dtype=np.float64)
+
+        # Enrollment columns that do not change over the course
+        # Ordered IMD bands as their rank (-1: unknown)
+        imd = info['imd_band'].cat.codes.to_numpy()
+        columns = [
+            info['num_of_prev_attempts'].to_numpy(np.float32),
+            info['studied_credits'].to_numpy(np.float32),
+            info['date_registration'].astype('float64').fillna(0).to_numpy(np.float32),
+            info['disability'].to_numpy(np.float32),
+            np.where(imd >= 0, imd, 0).astype(np.float32),
+            (imd < 0).astype(np.float32),
+        ]
+        names = ['prev_attempts', 'studied_credits', 'registration_day', 'disability', 'imd_band', 'imd_unknown']
+        for column in ['gender', 'age_band', 'highest_education']:
+            indicators, labels = _one_hot(info[column])
+            columns.append(indicators)
+            names += labels
+        self.static = np.column_stack(columns).astype(np.float32)
+        self.feature_names = ACTIVITY_FEATURES + names
+
+        self.registered = info['date_registration'].astype('float64').fillna(-np.inf).to_numpy()
+        self.unregistered = info['date_unregistration'].astype('float64').fillna(np.inf).to_numpy()
+        self.labels = info['final_result'].astype(str).isin(AT_RISK_RESULTS).to_numpy()
+        self.holdout = info['id_student'].to_numpy() % HOLDOUT_MODULUS == 0
+        # The scorer is shared by every page run: a model is fitted and stored by one of them
+        self.models = {}
+        self.models_lock = threading.Lock()
+
+    def active(self, day):
+        """Enrollments registered by `day` and not unregistered before it"""
+        return (self.registered <= day) & (self.unregistered > day)
+
+    def features(self, day):
+        """Feature matrix (one row per enrollment) as of the end of course day `day`"""
+        enrollments = len(self.static)
+        # VLE activity of the weeks complete by `day`
+        weeks = int(np.clip((day + 1) // WEEK_DAYS - self.first_week, 0, self.cumulative_clicks.shape[1] - 1))
+        clicks = self.cumulative_clicks[:, weeks]
+        recent = clicks - self.cumulative_clicks[:, max(weeks - RECENT_WEEKS, 0)]
+        idle = weeks - 1 - self.last_active[:, weeks]
+
+        done = self.submitted <= day
+        submitted = np.bincount(self.numbers[done], minlength=enrollments)
+        scored = done & ~np.isnan(self.scores)
+        score_count = np.bincount(self.numbers[scored], minlength=enrollments)
+        score_sum = np.bincount(self.numbers[scored], weights=self.scores[scored], minlength=enrollments)
+        mean_score = np.divide(score_sum, score_count, out=np.zeros(enrollments), where=score_count > 0)
+        due_by_course = np.bincount(
+            self.assessment_courses[(self.due_dates <= day) & (self.assessment_courses >= 0)],
+            minlength=self.courses.max() + 1 if enrollments else 0
+        )
+        missed = np.maximum(due_by_course[self.courses] - submitted, 0)
+
+        activity = np.column_stack([
+            np.log1p(clicks), np.log1p(recent), self.active_weeks[:, weeks] / max(weeks, 1), idle,
+            submitted, missed, mean_score, score_count == 0,
+        ]).astype(np.float32)
+        return np.hstack([activity, self.static])
+
+    def model(self, day, X=None):
+        """Fitted model for cutoff `day`: {weights, mean, std, auc}, from disk when already fitted"""
+        with self.models_lock:
+            if day in self.models:
+                return self.models[day]
+        # Fitting takes an admission slot, always before the lock so runs never wait on each other crosswise.
+        # Without a free one this raises Busy: pages call through admission.gated to wait in line visibly
+        with admission.gate.admit(wait=False), self.models_lock:
+            if day in self.models:
+                return self.models[day]
+            path = f"{self.path}-day{day}.npz"
+            if os.path.exists(path):
+                with np.load(path) as saved:
+                    model = {name: saved[name] for name in saved.files}
+            else:
+                X = self.features(day) if X is None else X
+                active = self.active(day)
+                train, test = active & ~self.holdout, active & self.holdout
+                mean, std = X[train].mean(axis=0), X[train].std(axis=0)
+                std[std == 0] = 1
+                weights = fit_logistic((X[train] - mean) / std, self.labels[train])
+                model = {'weights': weights, 'mean': mean, 'std': std}
+                model['auc'] = np.float64(auc(self._predict(model, X[test]), self.labels[test]))
+
+                def write(tmp):
+                    # A file object, so np.savez does not add .npz to the temporary name
+                    with open(tmp, 'wb') as f:
+                        np.savez(f, **model)
+
+                # Other instances may store the same model at once: each under its own temporary name
+                replace_file(path, write)
+            self.models[day] = model
+            return model
+
+    @staticmethod
+    def _predict(model, X):
+        z = ((X - model['mean']) / model['std']) @ model['weights'][1:] + model['weights'][0]
+        return 1 / (1 + np.exp(-z))
+
+    def score(self, day):
+        """Active enrollments as of `day` with their risk and activity features, riskiest first"""
+        X = self.features(day)
+        model = self.model(day, X)
+        active = np.flatnonzero(self.active(day))
+        risk = self._predict(model, X[active])
+        scored = self.student_info.iloc[active][['id_student', 'code_module', 'code_presentation']].assign(
+            risk=risk, **{name: X[active, i] for i, name in enumerate(ACTIVITY_FEATURES)}
+        )
+        return scored.sort_values('risk', ascending=False, kind='stable')
@@ -0,0 +1,84 @@
+# analytics/sample.py
+"""Stratified enrollment samples for approximate (progressive) results.
+
+Enrollments are sampled at the same rate within every presentation and final
+result, and only the VLE and assessment rows of the sampled students are kept,
+so every query runs unchanged on the sample. The sampled enrollments are dealt
+into random groups, each a smaller stratified sample; the spread of a
+statistic across the groups estimates its standard error (random group
+variance estimation), which gives the confidence bands.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from analytics.pandas_backend import PandasEngine
+
+STRATA = ['code_presentation', 'final_result']
+SAMPLE_FRACTION = 0.05
+RANDOM_GROUPS = 5
+# Two-sided 95% normal quantile
+Z_95 = 1.96
+
+
+def stratified_sample(student_info, fraction=SAMPLE_FRACTION, groups=RANDOM_GROUPS, seed=0):
+    """Sorted row positions of the sample and the random group of each"""
+    rng = np.random.default_rng(seed)
+    positions, group_ids = [], []
+    for rows in student_info.groupby(STRATA, observed=True).indices.values():
+        chosen = rng.choice(rows, size=max(1, round(fraction * len(rows))), replace=False)
+        positions.append(chosen)
+        # Dealt round-robin after shuffling, so every group is stratified too
+        group_ids.append(np.arange(len(chosen)) % groups)
+    positions, group_ids = np.concatenate(positions), np.concatenate(group_ids)
+    order = np.argsort(positions)
+    return positions[order], group_ids[order]
+
+
+def _student_rows(table, ids):
+    """Rows of a large table belonging to the given students (pushed down on stored tables)"""
+    if isinstance(table, ds.Dataset):
+        return table.to_table(filter=ds.field('id_student').isin(pa.array(ids, pa.int32()))).to_pandas()
+    return table[table['id_student'].isin(ids)]
+
+
+def _sample_tables(data, student_info):
+    """Tables restricted to the enrollments in `student_info`"""
+    ids = student_info['id_student'].unique()
+    return dict(
+        data,
+        student_info=student_info,
+        student_vle=_student_rows(data['student_vle'], ids),
+        student_assessment=_student_rows(data['student_assessment'], ids),
+    )
+
+
+class EnrollmentSample:
+    """In-memory engines over a stratified enrollment sample and its random groups"""
+
+    def __init__(self, data, fraction=SAMPLE_FRACTION, groups=RANDOM_GROUPS, seed=0):
+        positions, group_ids = stratified_sample(data['student_info'], fraction, groups, seed)
+        sample = _sample_tables(data, data['student_info'].iloc[positions])
+        self.size = len(positions)
+        # Scales sample counts up to the population (allocation is proportional)
+        self.scale = len(data['student_info']) / self.size
+        self.engine = PandasEngine(sample)
+        self.groups = [
+            PandasEngine(_sample_tables(sample, sample['student_info'][group_ids == group]))
+            for group in range(groups)
+        ]
+
+    def estimate(self, query, presentations, *args):
+        """Result of an engine query on the whole sample and on every random group"""
+        return (
+            getattr(self.engine, query)(presentations, *args),
+            [getattr(engine, query)(presentations, *args) for engine in self.groups]
+        )
+
+
+def standard_error(group_results, keys, value):
+    """Standard error of `value` per `keys` from the random group results"""
+    stacked = pd.concat(group_results)
+    spread = stacked.groupby(keys, observed=True)[value].std(ddof=1)
+    return spread / np.sqrt(len(group_results))
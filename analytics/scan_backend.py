@@ -0,0 +1,192 @@
+# analytics/scan_backend.py
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+import store
+from analytics.engine import BOX_COLUMNS, CHECKPOINT_LABELS, PASSING_RESULTS, box_summary, to_strings, weighted_box_summary
+from analytics.pandas_backend import PandasEngine
+
+
+def _combine(parts, keys):
+    """Merge per-batch partial aggregates"""
+    if not parts:
+        return None
+    return pd.concat(parts).groupby(level=keys).sum()
+
+
+def _dataset(table):
+    """Scannable dataset for a stored table or an in-memory DataFrame"""
+    if isinstance(table, ds.Dataset):
+        return table
+    return store.as_dataset(to_strings(table))
+
+
+class ScanEngine(PandasEngine):
+    """Out-of-core backend: small tables in memory, large ones scanned from disk.
+
+    `student_vle` and `student_assessment` may be partitioned Parquet datasets
+    (see store.py). Each query streams batches with projection and predicate
+    pushdown and merges partial aggregates, so memory follows the result size.
+    """
+
+    name = 'scan'
+
+    def __init__(self, data, previous=None):
+        small = {name: data[name] for name in ['courses', 'assessments', 'student_info']}
+        super().__init__(dict(small, student_vle=pd.DataFrame(), student_assessment=pd.DataFrame()), previous)
+        self.tables = data
+        self.student_vle = _dataset(data['student_vle'])
+        self.student_assessment = _dataset(data['student_assessment'])
+
+    def _daily_clicks(self):
+        # The engagement queries scan the stored rows instead
+        return None
+
+    def _filter_tables(self, presentations):
+        student_info = self.student_info
+        assessments = self.assessments
+        if presentations is not None:
+            student_info = student_info.iloc[self.demographics.rows({'code_presentation': presentations})]
+            assessments = assessments[assessments['code_presentation'].isin(presentations)]
+        return student_info, assessments, None
+
+    @staticmethod
+    def _pushdown(table, student_info, presentations=None):
+        """Scan predicate: rows of the enrolled students, pruned to the selected partitions"""
+        predicate = ds.field('id_student').isin(pa.array(student_info['id_student'].unique(), pa.int32()))
+        if presentations is not None and 'code_presentation' in store.columns(table):
+            predicate = predicate & ds.field('code_presentation').isin(pa.array(presentations, pa.string()))
+        return predicate
+
+    def imd_score_means(self, presentations):
+        student_info, _, _ = self._filter(presentations)
+        keys = ['gender', 'age_band', 'imd_band']
+        known_imd = student_info[student_info['imd_band'] != 'nan'][['id_student'] + keys]
+        parts = []
+        for batch in store.scan(self.student_assessment, ['id_student', 'score'], self._pushdown(self.student_assessment, student_info)):
+            merged = batch.merge(student_info[['id_student']], on='id_student').merge(known_imd, on='id_student')
+            parts.append(merged.groupby(keys)['score'].agg(['sum', 'count']))
+        totals = _combine(parts, keys)
+        if totals is None:
+            return pd.DataFrame(columns=keys + ['score'])
+        return (totals['sum'] / totals['count']).rename('score').reset_index()
+
+    def score_stats(self, presentations, by):
+        student_info, assessments, _ = self._filter(presentations)
+        assessment_columns = ['id_assessment'] + [col for col in by if col in assessments.columns]
+        scan_filter = self._pushdown(self.student_assessment, student_info, presentations)
+
+        # Exact quartiles only need each distinct score with its count
+        parts = []
+        columns = ['id_assessment', 'id_student', 'score']
+        for batch in store.scan(self.student_assessment, columns, scan_filter):
+            merged = batch.merge(student_info[['id_student']], on='id_student').merge(
+                assessments[assessment_columns], on='id_assessment'
+            )
+            if 'gender' in by:
+                merged = merged.merge(student_info[['id_student', 'gender']], on='id_student')
+            parts.append(merged.groupby(list(by) + ['score'], observed=True).size())
+        counts = _combine(parts, list(by) + ['score'])
+        if counts is None:
+            return weighted_box_summary(pd.DataFrame(columns=list(by) + ['score', 'weight']), list(by), 'score', 'weight')
+        return weighted_box_summary(counts.rename('weight').reset_index(), list(by), 'score', 'weight')
+
+    def engagement_stats(self, presentations):
+        student_info, _, _ = self._filter(presentations)
+        parts = []
+        for batch in store.scan(self.student_vle, ['id_student', 'sum_click'], self._pushdown(self.student_vle, student_info)):
+            parts.append(batch.groupby('id_student')['sum_click'].sum())
+        totals = _combine(parts, 'id_student')
+        if totals is None:
+            return pd.DataFrame(columns=['final_result'] + BOX_COLUMNS)
+
+        # Each (student, result) enrollment pair repeats the student's clicks, as in the join
+        pairs = student_info.groupby(['id_student', 'final_result']).size().rename('pairs').reset_index()
+        engagement = pairs.merge(totals.rename('sum_click').reset_index(), on='id_student')
+        engagement['sum_click'] = engagement['sum_click'] * engagement['pairs']
+        return box_summary(engagement, ['final_result'], 'sum_click')
+
+    def weekly_clicks(self, presentations):
+        student_info, _, _ = self._filter(presentations)
+        parts = []
+        columns = ['id_student', 'date', 'sum_click']
+        for batch in store.scan(self.student_vle, columns, self._pushdown(self.student_vle, student_info)):
+            merged = batch.merge(student_info[['id_student', 'final_result']], on='id_student')
+            merged['week'] = (merged['date'].astype('int64') // 7) + 1
+            parts.append(merged.groupby(['week', 'final_result'])['sum_click'].agg(['sum', 'count']))
+        totals = _combine(parts, ['week', 'final_result'])
+        if totals is None:
+            return pd.DataFrame(columns=['week', 'final_result', 'sum_click'])
+        return (totals['sum'] / totals['count']).rename('sum_click').reset_index()
+
+    def withdrawal_checkpoints(self, presentations):
+        student_info, _, _ = self._filter(presentations)
+        enrollments = student_info[
+            ['id_student', 'code_module', 'code_presentation', 'final_result', 'date_registration']
+        ].merge(
+            self.courses[['code_module', 'code_presentation', 'module_presentation_length']],
+            on=['code_module', 'code_presentation']
+        )
+
+        scan_filter = self._pushdown(self.student_vle, student_info, presentations)
+
+        active, firsts = set(), []
+        columns = ['id_student', 'code_module', 'code_presentation', 'date']
+        for batch in store.scan(self.student_vle, columns, scan_filter):
+            timeline = batch.merge(enrollments, on=['id_student', 'code_module', 'code_presentation'])
+            active.update(timeline['id_student'].unique().tolist())
+            progress = 100 * (timeline['date'].astype('int64') - timeline['date_registration']) / timeline['module_presentation_length']
+            timeline['checkpoint'] = pd.cut(progress, bins=range(0, 101, 10), labels=False, right=False)
+            # Keep the result of each student's first row (in storage order) per checkpoint
+            first = timeline.dropna(subset=['checkpoint']).drop_duplicates(['checkpoint', 'id_student'])
+            firsts.append(first[['checkpoint', 'id_student', 'final_result']])
+            firsts = [pd.concat(firsts).drop_duplicates(['checkpoint', 'id_student'])]
+
+        withdrawn = pd.Series(0, index=range(len(CHECKPOINT_LABELS)))
+        if firsts:
+            first = firsts[0]
+            withdrawn = withdrawn.add(
+                first[first['final_result'] == 'Withdrawn'].groupby('checkpoint').size(), fill_value=0
+            )
+        return pd.DataFrame({
+            'checkpoint': CHECKPOINT_LABELS,
+            'withdrawal_prob': withdrawn.to_numpy() / len(active) if active else float('nan'),
+            'students_at_risk': len(active),
+        })
+
+    def weekly_module_clicks(self, presentations):
+        student_info, _, _ = self._filter(presentations)
+        keys = ['id_student', 'code_module', 'code_presentation']
+        parts = []
+        columns = keys + ['date', 'sum_click']
+        for batch in store.scan(self.student_vle, columns, self._pushdown(self.student_vle, student_info, presentations)):
+            activity = batch.merge(student_info[keys + ['final_result']], on=keys)
+            activity['week'] = (activity['date'].astype('int64') // 7) + 1
+            parts.append(activity.groupby(['week', 'final_result', 'code_module'])['sum_click'].sum())
+        totals = _combine(parts, ['week', 'final_result', 'code_module'])
+        if totals is None:
+            return pd.DataFrame(columns=['week', 'final_result', 'code_module', 'sum_click'])
+        return totals.reset_index()
+
+    def course_benchmarks(self, presentations):
+        student_info, _, _ = self._filter(presentations)
+        module_students = student_info[['code_module', 'id_student']].drop_duplicates()
+        parts = []
+        for batch in store.scan(self.student_assessment, ['id_student', 'score'], self._pushdown(self.student_assessment, student_info)):
+            merged = batch.merge(student_info[['id_student']], on='id_student').merge(module_students, on='id_student')
+            parts.append(merged.groupby('code_module')['score'].agg(['sum', 'count']))
+        scores = _combine(parts, 'code_module')
+
+        course_metrics = student_info.groupby('code_module').agg(
+            Enrollment=('id_student', 'nunique'),
+            Pass_Rate=('final_result', lambda x: (x.isin(PASSING_RESULTS)).mean() * 100),
+        )
+        if scores is not None:
+            course_metrics['Avg_Score'] = scores['sum'] / scores['count']
+        else:
+            course_metrics['Avg_Score'] = float('nan')
+        return course_metrics.reset_index().rename(columns={'code_module': 'Course'})
+
+    def total_clicks(self):
+        return int(sum(batch['sum_click'].sum() for batch in store.scan(self.student_vle, ['sum_click'])))
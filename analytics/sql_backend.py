@@ -0,0 +1,179 @@
+# analytics/sql_backend.py
+import threading
+
+from analytics.engine import Engine, CHECKPOINT_LABELS, BOX_COLUMNS, to_strings
+
+try:
+    import duckdb
+except ImportError:  # optional dependency, only needed for this backend
+    duckdb = None
+
+# Enrollments of the selected presentations and their (duplicated) score rows
+FILTERED = """
+    si AS (
+        SELECT * FROM student_info
+        WHERE $presentations IS NULL OR list_contains($presentations, code_presentation)
+    ),
+    sa AS (
+        SELECT student_assessment.* FROM student_assessment JOIN si USING (id_student)
+    ),
+    a AS (
+        SELECT * FROM assessments
+        WHERE $presentations IS NULL OR list_contains($presentations, code_presentation)
+    )
+"""
+
+BOX_STATS = """
+    stats AS (
+        SELECT {by}, count(*) AS count, avg(value) AS mean, min(value) AS min,
+               quantile_cont(value, 0.25) AS q1, quantile_cont(value, 0.5) AS median,
+               quantile_cont(value, 0.75) AS q3, max(value) AS max
+        FROM v WHERE value IS NOT NULL GROUP BY {by}
+    )
+    SELECT stats.*,
+           min(v.value) FILTER (WHERE v.value >= q1 - 1.5 * (q3 - q1)) AS lowerfence,
+           max(v.value) FILTER (WHERE v.value <= q3 + 1.5 * (q3 - q1)) AS upperfence
+    FROM stats JOIN v USING ({by})
+    GROUP BY ALL ORDER BY {by}
+"""
+
+
+class SqlEngine(Engine):
+    """Backend running every query in an embedded DuckDB database"""
+
+    name = 'sql'
+    # DuckDB loads its own copy of the tables, which worker processes could not share
+    process_safe = False
+
+    def __init__(self, data, previous=None):
+        if duckdb is None:
+            raise ImportError("The 'sql' analytics backend requires the duckdb package")
+        super().__init__(data, previous)
+        self._local = threading.local()
+        self._con = duckdb.connect()
+        for name in ['courses', 'assessments', 'student_info', 'student_vle', 'student_assessment']:
+            frame = to_strings(data[name])
+            self._con.register('frame', frame)
+            # Tables keep insertion order, so rowid follows the CSV row order
+            self._con.execute(f"CREATE TABLE {name} AS SELECT * FROM frame")
+            self._con.unregister('frame')
+
+    def _query(self, sql, presentations=None, **params):
+        # DuckDB connections are not thread-safe; each thread gets a cursor
+        cursor = getattr(self._local, 'cursor', None)
+        if cursor is None:
+            cursor = self._local.cursor = self._con.cursor()
+        params['presentations'] = list(presentations) if presentations is not None else None
+        used = {key: value for key, value in params.items() if f"${key}" in sql}
+        return cursor.execute(sql, used).df()
+
+    def enrollments(self, presentations, columns):
+        select = ', '.join(f'"{col}"' for col in columns)
+        return self._query(f"WITH {FILTERED} SELECT {select} FROM si", presentations)
+
+    def enrollment_counts(self, presentations, by, where=None):
+        group = ', '.join(f'"{col}"' for col in by)
+        conditions = ' '.join(f'AND "{col}" = ${col}' for col in (where or {}))
+        return self._query(
+            f"WITH {FILTERED} SELECT {group}, count(*) AS count FROM si WHERE TRUE {conditions} "
+            f"GROUP BY {group} ORDER BY {group}",
+            presentations, **(where or {})
+        )
+
+    def imd_score_means(self, presentations):
+        return self._query(f"""
+            WITH {FILTERED}
+            SELECT si.gender, si.age_band, si.imd_band, avg(sa.score) AS score
+            FROM sa JOIN si USING (id_student)
+            WHERE si.imd_band <> 'nan'
+            GROUP BY ALL ORDER BY ALL
+        """, presentations)
+
+    def score_stats(self, presentations, by):
+        join_info = "JOIN (SELECT id_student, gender FROM si) USING (id_student)" if 'gender' in by else ""
+        group = ', '.join(by)
+        frame = self._query(f"""
+            WITH {FILTERED},
+            v AS (
+                SELECT {group}, sa.score AS value
+                FROM sa JOIN a USING (id_assessment) {join_info}
+            ),
+            {BOX_STATS.format(by=group)}
+        """, presentations)
+        return frame[list(by) + BOX_COLUMNS]
+
+    def engagement_stats(self, presentations):
+        return self._query(f"""
+            WITH {FILTERED},
+            v AS (
+                SELECT si.final_result, sum(vle.sum_click) AS value
+                FROM student_vle vle JOIN si USING (id_student)
+                GROUP BY vle.id_student, si.final_result
+            ),
+            {BOX_STATS.format(by='final_result')}
+        """, presentations)[['final_result'] + BOX_COLUMNS]
+
+    def weekly_clicks(self, presentations):
+        return self._query(f"""
+            WITH {FILTERED}
+            SELECT CAST(floor(vle.date / 7) AS BIGINT) + 1 AS week, si.final_result, avg(vle.sum_click) AS sum_click
+            FROM student_vle vle JOIN si USING (id_student)
+            GROUP BY ALL ORDER BY ALL
+        """, presentations)
+
+    def withdrawal_checkpoints(self, presentations):
+        frame = self._query(f"""
+            WITH {FILTERED},
+            timeline AS (
+                SELECT vle.rowid AS row, vle.id_student, si.final_result,
+                       100 * (CAST(vle.date AS BIGINT) - si.date_registration) / c.module_presentation_length AS progress
+                FROM student_vle vle
+                JOIN si USING (id_student, code_module, code_presentation)
+                JOIN courses c USING (code_module, code_presentation)
+            ),
+            firsts AS (
+                SELECT CAST(floor(progress / 10) AS BIGINT) AS checkpoint, id_student,
+                       arg_min(final_result, row) AS final_result
+                FROM timeline WHERE progress >= 0 AND progress < 100
+                GROUP BY ALL
+            )
+            SELECT cp.checkpoint,
+                   count(firsts.id_student) FILTER (WHERE firsts.final_result = 'Withdrawn') AS withdrawn,
+                   (SELECT count(DISTINCT id_student) FROM timeline) AS students_at_risk
+            FROM range(10) cp(checkpoint) LEFT JOIN firsts USING (checkpoint)
+            GROUP BY ALL ORDER BY cp.checkpoint
+        """, presentations)
+        return frame.assign(
+            checkpoint=CHECKPOINT_LABELS,
+            withdrawal_prob=frame['withdrawn'] / frame['students_at_risk']
+        )[['checkpoint', 'withdrawal_prob', 'students_at_risk']]
+
+    def weekly_module_clicks(self, presentations):
+        return self._query(f"""
+            WITH {FILTERED}
+            SELECT CAST(floor(vle.date / 7) AS BIGINT) + 1 AS week, si.final_result, si.code_module,
+                   sum(vle.sum_click) AS sum_click
+            FROM student_vle vle JOIN si USING (id_student, code_module, code_presentation)
+            GROUP BY ALL ORDER BY ALL
+        """, presentations)
+
+    def course_benchmarks(self, presentations):
+        return self._query(f"""
+            WITH {FILTERED},
+            modules AS (
+                SELECT code_module, count(DISTINCT id_student) AS Enrollment,
+                       avg(CASE WHEN final_result IN ('Pass', 'Distinction') THEN 1.0 ELSE 0.0 END) * 100 AS Pass_Rate
+                FROM si GROUP BY code_module
+            ),
+            scores AS (
+                SELECT m.code_module, avg(sa.score) AS Avg_Score
+                FROM (SELECT DISTINCT code_module, id_student FROM si) m JOIN sa USING (id_student)
+                GROUP BY m.code_module
+            )
+            SELECT code_module AS Course, Enrollment, Pass_Rate, Avg_Score
+            FROM modules LEFT JOIN scores USING (code_module)
+            ORDER BY Course
+        """, presentations)
+
+    def total_clicks(self):
+        return int(self._query("SELECT sum(sum_click) AS total FROM student_vle")['total'].iloc[0])
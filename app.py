@@ -1,5 +1,20 @@
 # app.py
+import logging
+import os
+import pandas as pd
 import streamlit as st
+import metrics
+
+# Server-side messages (dataset loads, memory reports, cache problems) go to stderr from this level up
+logging.basicConfig(
+    level=os.environ.get("LOG_LEVEL", "INFO"),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+)
+
+# Every page runs under pandas copy-on-write, set once here for the whole app: frames derived from the
+# shared loaded tables reuse their columns until written to, and a write copies only what it changes.
+# The pages, section builders and cached results rely on it instead of defensive copies.
+pd.set_option("mode.copy_on_write", True)
 
 st.set_page_config(
     page_title="Student Analytics Dashboard",
@@ -23,15 +38,31 @@ dataset_page = st.Page(
     icon="🔍"
 )
 
+student_page = st.Page(
+    "pages/student.py",
+    title="Student Lookup",
+    icon="🎓"
+)
+
+risk_page = st.Page(
+    "pages/risk.py",
+    title="At-Risk Students",
+    icon="⚠️"
+)
+
 
 # Set up navigation with custom styling
 nav = st.navigation(
-    [home_page, dataset_page],
+    [home_page, dataset_page, student_page, risk_page],
     position="sidebar"
 )
 
+# Local /metrics endpoint (when METRICS_PORT is set), started by the first run
+metrics.serve()
+
 # Run the selected page
-nav.run()
+with metrics.timed('page_run_seconds', page=nav.title):
+    nav.run()
 
 # Optional footer
 # st.sidebar.markdown("---")
@@ -0,0 +1,170 @@
+# disk_cache.py
+"""On-disk cache of query results and section figures, shared across restarts and replicas.
+
+Streamlit's caches live in the process. Entries written here survive a
+restart, and every instance pointed at the same DISK_CACHE_DIR (e.g. a shared
+volume) reads them. Keys combine the dataset fingerprint (a digest of the
+ingested files' contents), a digest of the app's code, the entry's name and
+its normalized arguments, so new data or a new deploy never reads stale entries.
+
+Each entry is one pickle file. Writers write a temporary file and rename it
+into place, so readers only ever see complete entries and concurrent writers
+of the same key just replace one another. Reads refresh the file's mtime.
+When the directory grows past DISK_CACHE_MB, the entries used least recently
+are deleted. A reader whose entry was just evicted treats it as a miss.
+"""
+import functools
+import glob
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DISK_CACHE_DIR = os.environ.get("DISK_CACHE_DIR", "./data/cache")
+# Size cap of the cache directory (0 disables the cache)
+DISK_CACHE_MB = float(os.environ.get("DISK_CACHE_MB", "512"))
+# Temporary files older than this are left over from writers that died
+STALE_WRITE_SECONDS = 3600
+ROOT = os.path.dirname(os.path.abspath(__file__))
+MISSING = object()
+
+
+@functools.lru_cache(maxsize=None)
+def code_version():
+    """Digest of the modules that compute cached entries"""
+    digest = hashlib.blake2b(digest_size=8)
+    for path in sorted(glob.glob(os.path.join(ROOT, "*.py")) + glob.glob(os.path.join(ROOT, "analytics", "*.py"))):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _normalize(value):
+    """Arguments in a canonical form: sequences as tuples, mappings sorted by key"""
+    if isinstance(value, dict):
+        return tuple(sorted((key, _normalize(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(item) for item in value)
+    return value
+
+
+def entry_key(fingerprint, name, args):
+    """File name stem of an entry"""
+    parts = repr((code_version(), fingerprint, name, _normalize(args)))
+    return hashlib.blake2b(parts.encode(), digest_size=16).hexdigest()
+
+
+def _path(key):
+    return os.path.join(DISK_CACHE_DIR, f"{key}.pkl")
+
+
+def contains(key):
+    return DISK_CACHE_MB > 0 and os.path.exists(_path(key))
+
+
+def load(key):
+    """Stored value of an entry, or MISSING"""
+    if DISK_CACHE_MB <= 0:
+        return MISSING
+    path = _path(key)
+    try:
+        with open(path, 'rb') as f:
+            value = pickle.load(f)
+        os.utime(path)
+    except FileNotFoundError:
+        metrics.record_cache('disk', False)
+        return MISSING
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+        logger.warning("Dropping unreadable entry %s: %s", key, e)
+        metrics.record_cache('disk', False)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return MISSING
+    metrics.record_cache('disk', True)
+    return value
+
+
+def save(key, value):
+    """Store an entry (atomically), then evict down to the size cap"""
+    if DISK_CACHE_MB <= 0:
+        return
+    try:
+        os.makedirs(DISK_CACHE_DIR, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=DISK_CACHE_DIR, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary, _path(key))
+        except BaseException:
+            os.remove(temporary)
+            raise
+        evict()
+    except OSError as e:
+        # A full or read-only volume only costs the cache
+        logger.warning("Could not store entry %s: %s", key, e)
+
+
+def evict(limit_mb=None):
+    """Delete the least recently used entries until the directory fits the cap"""
+    limit = (DISK_CACHE_MB if limit_mb is None else limit_mb) * 2**20
+    entries, total = [], 0
+    for entry in os.scandir(DISK_CACHE_DIR):
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        if entry.name.endswith('.tmp'):
+            if time.time() - stat.st_mtime > STALE_WRITE_SECONDS:
+                _remove(entry.path)
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total += stat.st_size
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        _remove(path)
+        total -= size
+
+
+def _remove(path):
+    # Another instance may have evicted it first
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def cached_section(builder):
+    """Keep a section builder's output on disk, keyed by the engine's dataset fingerprint.
+
+    The builder takes (_engine, data_version, *args). data_version only tells
+    snapshots of one process apart, so the key uses the fingerprint and `args`.
+    `builder.stored(engine, *args)` tells whether the output is on disk already.
+    """
+    def key(_engine, args):
+        return entry_key(_engine.fingerprint, f"{builder.__module__}.{builder.__name__}", args)
+
+    @functools.wraps(builder)
+    def wrapper(_engine, data_version, *args):
+        if getattr(_engine, 'fingerprint', None) is None:
+            return builder(_engine, data_version, *args)
+        value = load(key(_engine, args))
+        if value is MISSING:
+            value = builder(_engine, data_version, *args)
+            save(key(_engine, args), value)
+        return value
+
+    wrapper.stored = lambda _engine, *args: (
+        getattr(_engine, 'fingerprint', None) is not None and contains(key(_engine, args))
+    )
+    return wrapper
@@ -0,0 +1,215 @@
+# export.py
+"""Pre-render the home dashboard into static HTML for a file server or CDN.
+
+    python export.py [--out dist] [--dataset default] [--per-presentation]
+
+Writes index.html for the default state (all presentations) and, with
+--per-presentation, presentations/<code>.html for every single presentation.
+Pages only embed figure data; plotly.js, the story player and the stylesheet
+are written once to assets/ under content-hashed names, so a CDN can cache
+them indefinitely while pages are republished.
+"""
+import argparse
+import hashlib
+import html
+import json
+import os
+import time
+
+import pandas as pd
+import plotly
+import plotly.io as pio
+
+import store
+from loader import DEFAULT_DATASET, build_snapshot
+from sections import (
+    build_imd_heatmaps, build_age_histogram, build_performance_story, build_education_pies,
+    build_gender_sunburst, build_assessment_gender_box, build_attempt_sankey, build_outcome_donut,
+    build_cross_filter, build_engagement_box, build_weekly_engagement, build_withdrawal_checkpoints,
+    build_course_benchmarks, build_course_scores, build_engagement_timeline
+)
+
+VIZZU_STORY_URL = "https://cdn.jsdelivr.net/npm/vizzu-story@0.8/dist/vizzu-story.min.js"
+
+STYLESHEET = """
+body { font-family: "Source Sans Pro", sans-serif; margin: 0 auto; max-width: 1200px; padding: 0 24px 48px; color: #212529; }
+nav { padding: 16px 0; border-bottom: 1px solid #dee2e6; }
+nav a { margin-right: 12px; color: #4e79a7; }
+nav a.current { font-weight: 700; }
+.metrics { display: grid; grid-template-columns: repeat(4, 1fr); gap: 20px; margin: 20px 0; }
+.metric-card { padding: 20px; border-radius: 12px; box-shadow: 0 4px 12px rgba(0,0,0,0.08); border-left: 4px solid #4e79a7; }
+.metric-title { font-size: 14px; color: #6c757d; font-weight: 600; }
+.metric-value { font-size: 28px; font-weight: 700; margin-top: 10px; }
+.columns { display: grid; grid-template-columns: 1fr 1fr; gap: 20px; }
+vizzu-player { width: 100%; height: 400px; }
+footer { margin-top: 48px; color: #6c757d; font-size: 13px; }
+"""
+
+# Fills every <vizzu-player data-story="id"> from its embedded JSON script
+STORY_SCRIPT = f"""import "{VIZZU_STORY_URL}";
+
+for (const player of document.querySelectorAll("vizzu-player[data-story]")) {{
+  await player.initializing;
+  player.slides = JSON.parse(document.getElementById(player.dataset.story).textContent);
+}}
+"""
+
+
+def write_file(path, content):
+    """Write atomically so a server never hands out a half-written file"""
+    store.write_text(path, content)
+
+
+def write_asset(out_dir, name, content):
+    """Shared asset under a content-hashed name; returns its path relative to out_dir"""
+    stem, ext = name.split(".", 1)
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()[:12]
+    relative = f"assets/{stem}-{digest}.{ext}"
+    if not os.path.exists(os.path.join(out_dir, relative)):
+        write_file(os.path.join(out_dir, relative), content)
+    return relative
+
+
+def figure_html(fig, **options):
+    """Figure markup relying on the shared plotly.js"""
+    return pio.to_html(fig, full_html=False, include_plotlyjs=False, config={"responsive": True}, **options)
+
+
+def render_sections(engine, data_version, presentations):
+    """Section markup of the home dashboard in its default widget state"""
+    parts = []
+
+    def section(title, *blocks):
+        parts.append(f"<h3>{html.escape(title)}</h3>")
+        parts.extend(blocks)
+
+    overview = engine.overview(presentations)
+    passing = overview['result_dist'].reindex(['Pass', 'Distinction']).fillna(0).sum()
+    metrics = [
+        ("Total Students", f"{overview['total_students']:,}"),
+        ("Total Courses", overview['total_courses']),
+        ("Pass Rate", f"{passing * 100:.1f}%"),
+        ("Disability Rate", f"{overview['disability_rate'] * 100:.1f}%"),
+    ]
+    parts.append("<h1>Overview</h1><div class=\"metrics\">" + "".join(
+        f"<div class=\"metric-card\"><div class=\"metric-title\">{title}</div>"
+        f"<div class=\"metric-value\">{value}</div></div>"
+        for title, value in metrics
+    ) + "</div>")
+
+    # Pre-enrollment characteristics
+    parts.append("<h2>📋 Pre-Enrollment Characteristics</h2>")
+    fig_pass, fig_score = build_imd_heatmaps(engine, data_version, presentations)
+    section("1.1. Pass Rate by IMD (x) vs Gender-Age Groups (y)", figure_html(fig_pass))
+    section("1.2. Average Score by IMD (x) vs Gender-Age Groups (y)", figure_html(fig_score))
+    section("1.3. Age Distribution by Performance", figure_html(build_age_histogram(engine, data_version, presentations)))
+    story = json.dumps(build_performance_story(engine, data_version, presentations)).replace("</", "<\\/")
+    section(
+        "1.4. Performance Distribution Breakdown",
+        '<vizzu-player data-story="performance-story" controller></vizzu-player>',
+        f'<script type="application/json" id="performance-story">{story}</script>'
+    )
+    section("1.5. Prior Education vs Performance", figure_html(build_education_pies(engine, data_version, presentations)))
+    section("1.6. Gender Performance Breakdown", figure_html(build_gender_sunburst(engine, data_version, presentations)))
+    section("1.7. Gender Performance in Assessments", figure_html(build_assessment_gender_box(engine, data_version, presentations)))
+    section("1.8 Outcome Pathways by Attempt History", figure_html(build_attempt_sankey(engine, data_version, presentations)))
+    fig, _, filtered_count = build_outcome_donut(engine, data_version, presentations, ())
+    section(
+        "1.9 Outcome Distribution Among Different Demographic Classes",
+        figure_html(fig),
+        f"<p>Showing results for {filtered_count} students</p>",
+        figure_html(build_cross_filter(engine, data_version, presentations, ()))
+    )
+
+    # Post-enrollment factors
+    parts.append("<h2>2. Post-Enrollment Factors</h2>")
+    section("2.1 Engagement by Final Result", figure_html(build_engagement_box(engine, data_version, presentations)))
+    section("2.2 Weekly Engagement Trends", figure_html(build_weekly_engagement(engine, data_version, presentations)))
+    fig_withdrawal, _, _ = build_withdrawal_checkpoints(engine, data_version, presentations)
+    section("2.3 Withdrawal Probability by Course Progress", figure_html(fig_withdrawal))
+    _, fig_pass, fig_scatter = build_course_benchmarks(engine, data_version, presentations)
+    section(
+        "2.4 Course Benchmarking",
+        f"<div class=\"columns\"><div>{figure_html(fig_pass)}</div><div>{figure_html(fig_scatter)}</div></div>"
+    )
+    section("2.5 Course Score Distributions", figure_html(build_course_scores(engine, data_version, presentations)))
+    fig_timeline = build_engagement_timeline(engine, data_version, presentations, "All modules")
+    section("2.6 Engagement & Withdrawal Timeline", figure_html(fig_timeline, auto_play=False))
+    return "\n".join(parts)
+
+
+CURRENT_LINK = ' class="current"'
+
+
+def render_page(title, body, assets, depth, nav):
+    """Complete page linking the shared assets (`depth` directories below the root)"""
+    prefix = "../" * depth
+    links = "".join(
+        f'<a href="{prefix}{href}"{CURRENT_LINK if current else ""}>{html.escape(label)}</a>'
+        for label, href, current in nav
+    )
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+  <meta charset="utf-8">
+  <title>{html.escape(title)}</title>
+  <link rel="stylesheet" href="{prefix}{assets['css']}">
+  <script src="{prefix}{assets['plotly']}"></script>
+  <script type="module" src="{prefix}{assets['story']}"></script>
+</head>
+<body>
+<nav>{links}</nav>
+{body}
+<footer>Pre-rendered {time.strftime("%Y-%m-%d %H:%M UTC", time.gmtime())}; the live dashboard offers filtering and drill-down.</footer>
+</body>
+</html>
+"""
+
+
+def export(out_dir, dataset=DEFAULT_DATASET, per_presentation=False):
+    """Render the dashboard pages of a dataset into out_dir; returns the written page paths"""
+    snapshot = build_snapshot(dataset)
+    engine, data_version = snapshot['engine'], snapshot['version']
+    all_presentations = tuple(sorted(engine.enrollment_counts(None, ['code_presentation'])['code_presentation'].tolist()))
+
+    assets = {
+        'plotly': write_asset(out_dir, "plotly.min.js", plotly.offline.get_plotlyjs()),
+        'css': write_asset(out_dir, "dashboard.css", STYLESHEET),
+        'story': write_asset(out_dir, "story.js", STORY_SCRIPT),
+    }
+
+    # (title, path, presentations) of every page
+    pages = [("All presentations", "index.html", all_presentations)]
+    if per_presentation:
+        pages += [(code, f"presentations/{code}.html", (code,)) for code in all_presentations]
+
+    written = []
+    for title, path, presentations in pages:
+        nav = [(label, href, href == path) for label, href, _ in pages]
+        body = render_sections(engine, data_version, presentations)
+        write_file(
+            os.path.join(out_dir, path),
+            render_page(f"Student Analytics Dashboard - {title}", body, assets, path.count("/"), nav)
+        )
+        written.append(path)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", default="dist", help="output directory (default: dist)")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET)
+    parser.add_argument("--per-presentation", action="store_true", help="also render one page per presentation")
+    args = parser.parse_args()
+    # As in app.py: the section builders rely on copy-on-write instead of defensive copies
+    pd.set_option("mode.copy_on_write", True)
+
+    start = time.perf_counter()
+    for path in export(args.out, args.dataset, args.per_presentation):
+        size = os.path.getsize(os.path.join(args.out, path))
+        print(f"{path}: {size / 1024:.0f} KB")
+    print(f"Exported to {args.out} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,49 @@
 from io import BytesIO
-import zipfile
 import pandas as pd
-import plotly.express as px
 import os
-import requests
+import glob
+import hashlib
+import json
+import logging
+import threading
+import time
+import itertools
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
+import admission
+import metrics
+from analytics import create_engine
+from analytics.lookup import EnrollmentIndex, EngagementMatrix
+from analytics.precompute import PRE_ENROLLMENT_QUERIES, precompute
+from schema import SCHEMAS, read_table, concat, narrowest_integer, format_report
+import store
+
+logger = logging.getLogger(__name__)
 
 # Configuration
 DATASET_URL = "https://www.kaggle.com/api/v1/datasets/download/mohammadehsani/student-performance-at-open-university"
 DATA_DIR = "./data"
+# Further OULAD-format exports, one subdirectory per dataset
+DATASETS_DIR = os.environ.get("DATASETS_DIR", "./datasets")
+DEFAULT_DATASET = "default"
+# Memory budget for the datasets kept loaded at once (least recently used go first)
+DATASET_MEMORY_MB = float(os.environ.get("DATASET_MEMORY_MB", "2048"))
+# Out-of-core mode keeps VLE interactions and scores on disk as a partitioned store
+OUT_OF_CORE = os.environ.get("OUT_OF_CORE", "0") == "1"
+STORE_DIR = os.environ.get("STORE_DIR", f"{DATA_DIR}/store")
+# Files derived from a dataset (e.g. the engagement matrix), named after the data they came from
+FEATURE_DIR = os.environ.get("FEATURE_DIR", f"{DATA_DIR}/features")
+# Seconds between checks of a dataset directory for new or appended data
+REFRESH_INTERVAL = float(os.environ.get("REFRESH_INTERVAL", "30"))
+HASH_BYTES = 64 * 1024
+# Tables that grow by appended rows or extra files (e.g. studentVle_2015B.csv)
+APPEND_TABLES = {
+    "student_vle": "studentVle",
+    "student_assessment": "studentAssessment",
+}
+SMALL_FILES = ["courses.csv", "assessments.csv", "studentInfo.csv", "studentRegistration.csv"]
+SNAPSHOT_IDS = itertools.count(1)
 REQUIRED_FILES = [
     "courses.csv",
     "assessments.csv",
@@ -19,6 +54,10 @@ REQUIRED_FILES = [
 
 def download_dataset():
     """Download and extract dataset if missing"""
+    # Only needed on a first start without data, so not imported up front
+    import zipfile
+    import requests
+
     os.makedirs(DATA_DIR, exist_ok=True)
     
     try:
@@ -41,50 +80,21 @@ def check_data_files():
         #     download_dataset()
         # st.stop()
 
-@st.cache_resource
-def load_data():
-    check_data_files()
-    # Define ordered categories
-    result_order = ['Withdrawn', 'Fail', 'Pass', 'Distinction']
-    age_band_order = ['0-35', '35-55', '55<=']
-    imd_band_order = [
-        '0-10%', '10-20%', '20-30%', '30-40%', 
-        '40-50%', '50-60%', '60-70%', '70-80%', 
-        '80-90%', '90-100%'
-    ]
-    
-    # Load data with initial types
-    data = {
-        "courses": pd.read_csv(f"{DATA_DIR}/courses.csv"),
-        "assessments": pd.read_csv(
-            f"{DATA_DIR}/assessments.csv",
-            dtype={
-                'id_assessment': 'int32',
-                'code_module': 'category',
-                'code_presentation': 'category',
-                'assessment_type': 'category', 
-                'date': 'Int32'
-            }
-        ),
-        "student_info": pd.read_csv(
-            f"{DATA_DIR}/studentInfo.csv",
-            dtype={
-                'id_student': 'int32',
-                'gender': 'category',
-                'region': 'category',
-                'highest_education': 'category',
-                # 'disability': 'boolean'
-            }
-        ),
-        "student_vle": pd.read_csv(
-            f"{DATA_DIR}/studentVle.csv",
-            dtype={'id_student': 'int32', 'sum_click': 'int16'}
-        ),
-        "student_assessment": pd.read_csv(
-            f"{DATA_DIR}/studentAssessment.csv",
-            dtype={'id_student': 'int32', 'score': 'float32'}
-        )
-    }
+def read_small_tables(data_dir, report=None):
+    """Read and prepare the course, assessment and enrollment tables"""
+    # Load data with the declared types (see schema.py), all files at once
+    names = ["courses", "assessments", "student_info", "student_registration"]
+    reports = {name: [] for name in names}
+    with ThreadPoolExecutor(max_workers=len(names)) as pool:
+        futures = {
+            name: pool.submit(read_table, f"{data_dir}/{SCHEMAS[name]['file']}", name, reports[name])
+            for name in names
+        }
+        data = {name: future.result() for name, future in futures.items()}
+    if report is not None:
+        for name in names:
+            report.extend(reports[name])
+    student_registration = data.pop("student_registration")
 
     # --- Assessment Date Imputation ---
     if 'date' in data["assessments"].columns:
@@ -99,29 +109,9 @@ def load_data():
         data["assessments"].loc[missing_dates, 'date'] = data["assessments"][missing_dates]['assessment_type'].map(mean_dates)
 
         
-        # Convert to int32 after imputation
-        data["assessments"]['date'] = data["assessments"]['date'].astype('int32')
-
-    # --- Student Info Categorical Conversions ---
-    data["student_info"]['final_result'] = pd.Categorical(
-        data["student_info"]['final_result'],
-        categories=result_order,
-        ordered=True
-    )
-    
-    data["student_info"]['age_band'] = pd.Categorical(
-        data["student_info"]['age_band'],
-        categories=age_band_order,
-        ordered=True
-    )
-    
-    data["student_info"]['imd_band'] = pd.Categorical(
-        data["student_info"]['imd_band'],
-        categories=imd_band_order,
-        ordered=True
-    )
+        # Convert to the narrowest plain integer after imputation
+        data["assessments"]['date'] = narrowest_integer(data["assessments"]['date'].astype('int64'))
 
-    student_registration = pd.read_csv(f"{DATA_DIR}/studentRegistration.csv", dtype={'date_registration': 'Int32', 'date_unregistration': 'Int32'})
     data['student_info'] = data['student_info'].merge(
         student_registration[['code_module', 'code_presentation', 'id_student', 
                             'date_registration', 'date_unregistration']],
@@ -129,24 +119,298 @@ def load_data():
         how='left'
     )
     
-    
-    # Convert disability Y/N to boolean
-    if 'disability' in data["student_info"].columns:
-        data["student_info"]['disability'] = data["student_info"]['disability'].map({'Y': True, 'N': False})
-    
     return data
-if 'data' not in globals():
-    data = load_data()
-(
-    courses,          # DataFrame with course/module info
-    assessments,      # DataFrame with exam/assignment details
-    student_info,     # DataFrame with student demographics and results
-    student_vle,      # DataFrame with virtual learning environment interactions
-    student_assessment # DataFrame with student scores for assessments
-) = (
-    data["courses"],
-    data["assessments"],
-    data["student_info"],
-    data["student_vle"],
-    data["student_assessment"]
-)
\ No newline at end of file
+
+# =====================
+# Change detection and incremental refresh
+# =====================
+
+def _digest(f, start, end):
+    f.seek(start)
+    return hashlib.blake2b(f.read(end - start)).hexdigest()
+
+def file_signature(path, offset=None):
+    """Size, mtime and hashes of the first `offset` bytes ingested from a file (default: all)"""
+    stat = os.stat(path)
+    offset = stat.st_size if offset is None else offset
+    with open(path, 'rb') as f:
+        head = _digest(f, 0, min(HASH_BYTES, offset))
+        tail = _digest(f, max(offset - HASH_BYTES, 0), offset)
+        f.seek(max(offset - 1, 0))
+        complete = offset == 0 or f.read(1) == b'\n'
+    return {
+        'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'offset': offset,
+        'head': head, 'tail': tail, 'complete': complete
+    }
+
+def file_change(path, signature):
+    """'new', 'same', 'appended' or 'changed' relative to what was ingested"""
+    if signature is None:
+        return 'new'
+    if not os.path.exists(path):
+        return 'changed'
+    stat = os.stat(path)
+    if (stat.st_size, stat.st_mtime_ns) == (signature['size'], signature['mtime']):
+        return 'same'
+    if stat.st_size >= signature['offset'] and signature['complete']:
+        # Ingested bytes untouched: anything past them was appended
+        current = file_signature(path, signature['offset'])
+        if (current['head'], current['tail']) == (signature['head'], signature['tail']):
+            return 'appended' if stat.st_size > signature['offset'] else 'same'
+    return 'changed'
+
+def read_appended_rows(path, offset, name):
+    """Complete CSV rows written after byte `offset`, and the offset they end at"""
+    with open(path, 'rb') as f:
+        header = f.readline()
+        f.seek(offset)
+        chunk = f.read()
+    end = chunk.rfind(b'\n') + 1
+    return read_table(BytesIO(header + chunk[:end]), name), offset + end
+
+def table_files(data_dir, stem):
+    """CSV files of one growing table: the main file plus extra batches"""
+    return sorted(glob.glob(f"{data_dir}/{stem}*.csv"))
+
+def ingest_table(data_dir, name, table, known, report=None):
+    """Table with new files and appended rows added, the new file signatures and
+    the added rows (None when a rewritten or removed file forced a full reload)
+    """
+    stem = APPEND_TABLES[name]
+    paths = table_files(data_dir, stem)
+    store_dir = dataset_store_dir(data_dir)
+    changes = {path: file_change(path, known.get(path)) for path in set(paths) | set(known)}
+
+    if table is None or 'changed' in changes.values():
+        signatures = {path: file_signature(path) for path in paths}
+        if OUT_OF_CORE:
+            store.build_table(data_dir, store_dir, name, paths)
+            return store.open_table(store_dir, name), signatures, None
+        reports = [[] for _ in paths]
+        with ThreadPoolExecutor(max_workers=len(paths)) as pool:
+            tables = list(pool.map(read_table, paths, [name] * len(paths), reports))
+        if report is not None:
+            report.extend(row for rows in reports for row in rows)
+        return concat(tables), signatures, None
+
+    signatures, new_rows = {}, []
+    for path in paths:
+        if changes[path] == 'new':
+            new_rows.append(read_table(path, name))
+            signatures[path] = file_signature(path)
+        elif changes[path] == 'appended':
+            rows, offset = read_appended_rows(path, known[path]['offset'], name)
+            new_rows.append(rows)
+            signatures[path] = file_signature(path, offset)
+        else:
+            signatures[path] = known[path]
+    if not new_rows:
+        return table, signatures, []
+    if OUT_OF_CORE:
+        for rows in new_rows:
+            store.append_rows(data_dir, store_dir, name, rows)
+        return store.open_table(store_dir, name), signatures, new_rows
+    return concat([table] + new_rows), signatures, new_rows
+
+def build_snapshot(dataset, previous=None):
+    """Next snapshot of a dataset, reading only what changed since `previous` (None: everything)"""
+    started = time.perf_counter()
+    data_dir = list_datasets()[dataset]
+    store_dir = dataset_store_dir(data_dir)
+    if previous is None:
+        if data_dir == DATA_DIR:
+            check_data_files()
+        data, files, totals = {}, {'small': {}}, {}
+        if OUT_OF_CORE:
+            # Stored tables stay valid across restarts; only changes since are ingested
+            files.update(store.load_manifest(store_dir))
+            for name in APPEND_TABLES:
+                if name in files:
+                    data[name] = store.open_table(store_dir, name)
+    else:
+        data, files, totals = dict(previous['data']), dict(previous['files']), dict(previous['totals'])
+
+    changed = previous is None
+    small_paths = [f"{data_dir}/{name}" for name in SMALL_FILES]
+    reload_small = changed or any(file_change(path, files['small'].get(path)) != 'same' for path in small_paths)
+
+    # The small tables and every large one are read concurrently, each
+    # collecting its own memory report rows of the tables read in full
+    reports = {name: [] for name in ['small', *APPEND_TABLES]}
+    with ThreadPoolExecutor(max_workers=1 + len(APPEND_TABLES)) as pool:
+        small = pool.submit(read_small_tables, data_dir, reports['small']) if reload_small else None
+        ingested = {
+            name: pool.submit(ingest_table, data_dir, name, data.get(name), files.get(name, {}), reports[name])
+            for name in APPEND_TABLES
+        }
+        if small is not None:
+            data.update(small.result())
+            files['small'] = {path: file_signature(path) for path in small_paths}
+            changed = True
+        added = {}
+        for name, future in ingested.items():
+            table, signatures, added[name] = future.result()
+            changed = changed or table is not data.get(name)
+            data[name], files[name] = table, signatures
+    report = [row for rows in reports.values() for row in rows]
+
+    if OUT_OF_CORE:
+        store.save_manifest(store_dir, {name: files[name] for name in APPEND_TABLES})
+    if report:
+        logger.info("Dataset '%s' memory by table:\n%s", dataset, format_report(report))
+    if not changed:
+        return dict(previous, files=files)
+    # With the small tables unchanged, the bitmap index and the daily click summary carry over (the
+    # latter patched with the appended rows); query results and section figures are computed afresh
+    engine = create_engine(
+        data, 'scan' if OUT_OF_CORE else None,
+        previous=None if previous is None or reload_small else previous['engine'],
+        appended=added,
+    )
+    # Keys the engine's entries in the on-disk cache shared with other instances
+    engine.fingerprint = content_fingerprint(files)
+    # Warm the heavy aggregates of the default view (all presentations, first section group) in parallel
+    precompute(engine, tuple(engine.demographics.values('code_presentation')), PRE_ENROLLMENT_QUERIES)
+
+    # Table totals follow the appended rows instead of being recounted
+    for name, new_rows in added.items():
+        if new_rows is None or name not in totals:
+            totals[name] = store.row_count(data[name])
+        else:
+            totals[name] += sum(len(rows) for rows in new_rows)
+    if added['student_vle'] is None or 'clicks' not in totals:
+        totals['clicks'] = engine.total_clicks()
+    else:
+        totals['clicks'] += sum(int(rows['sum_click'].sum()) for rows in added['student_vle'])
+
+    load_seconds = time.perf_counter() - started
+    metrics.observe('data_load_seconds', load_seconds, dataset=dataset, kind='full' if previous is None else 'refresh')
+    if previous is None:
+        logger.info("Dataset '%s' loaded in %.2fs", dataset, load_seconds)
+    return {
+        'version': (dataset, next(SNAPSHOT_IDS)),
+        'load_seconds': load_seconds,
+        'data': data,
+        'engine': engine,
+        'files': files,
+        'totals': totals,
+        'nbytes': sum(
+            int(table.memory_usage(deep=True).sum()) for table in data.values() if isinstance(table, pd.DataFrame)
+        ),
+    }
+
+@st.cache_resource
+def dataset_cache():
+    """Process-wide LRU of loaded datasets: name -> {snapshot, checked, lock}"""
+    return {'entries': OrderedDict(), 'lock': threading.Lock()}
+
+def refresh_snapshot(dataset, entry):
+    """Ingest changes off the request path, then swap the new snapshot in"""
+    try:
+        entry['snapshot'] = build_snapshot(dataset, entry['snapshot'])
+    finally:
+        entry['checked'] = time.monotonic()
+        entry['lock'].release()
+
+def evict_datasets(cache, keep):
+    """Drop least recently used datasets until the rest fit DATASET_MEMORY_MB"""
+    entries = cache['entries']
+    budget = DATASET_MEMORY_MB * 1024 ** 2
+    while sum((entry['snapshot'] or {}).get('nbytes', 0) for entry in entries.values()) > budget:
+        oldest = next(iter(entries))
+        if oldest == keep:
+            break
+        # Runs still holding the snapshot keep it alive until they finish
+        del entries[oldest]
+
+def current_snapshot(dataset=DEFAULT_DATASET):
+    """Latest snapshot {version, data, engine, totals} of a dataset; a run keeps the one it started with"""
+    cache = dataset_cache()
+    with cache['lock']:
+        entry = cache['entries'].setdefault(
+            dataset, {'snapshot': None, 'checked': time.monotonic(), 'lock': threading.Lock()}
+        )
+    metrics.record_cache('datasets', entry['snapshot'] is not None)
+    if entry['snapshot'] is None:
+        # Loaded once; other datasets stay available meanwhile
+        with entry['lock']:
+            if entry['snapshot'] is None:
+                entry['snapshot'] = build_snapshot(dataset)
+                entry['checked'] = time.monotonic()
+    with cache['lock']:
+        cache['entries'][dataset] = entry
+        cache['entries'].move_to_end(dataset)
+        evict_datasets(cache, dataset)
+        metrics.set_gauges('loaded_table_bytes', 'dataset', {
+            name: other['snapshot']['nbytes'] for name, other in cache['entries'].items() if other['snapshot']
+        })
+    if time.monotonic() - entry['checked'] >= REFRESH_INTERVAL and entry['lock'].acquire(blocking=False):
+        threading.Thread(target=refresh_snapshot, args=(dataset, entry), daemon=True).start()
+    return entry['snapshot']
+
+def list_datasets():
+    """Dataset name -> directory: the default DATA_DIR plus every subdirectory of DATASETS_DIR"""
+    datasets = {DEFAULT_DATASET: DATA_DIR}
+    if os.path.isdir(DATASETS_DIR):
+        for name in sorted(os.listdir(DATASETS_DIR)):
+            if os.path.exists(f"{DATASETS_DIR}/{name}/studentInfo.csv"):
+                datasets[name] = f"{DATASETS_DIR}/{name}"
+    return datasets
+
+def dataset_store_dir(data_dir):
+    """Out-of-core store of a dataset (STORE_DIR for the default one)"""
+    return STORE_DIR if data_dir == DATA_DIR else f"{data_dir}/store"
+
+def dataset_feature_dir(data_dir):
+    """Derived feature files of a dataset (FEATURE_DIR for the default one)"""
+    return FEATURE_DIR if data_dir == DATA_DIR else f"{data_dir}/features"
+
+def files_digest(snapshot, names):
+    """Short digest of the ingested file signatures of some tables ('small' for the small ones)"""
+    signatures = json.dumps({name: snapshot['files'][name] for name in names}, sort_keys=True)
+    return hashlib.blake2b(signatures.encode(), digest_size=8).hexdigest()
+
+def content_fingerprint(files):
+    """Digest of the ingested files' names, sizes and hashes (not mtimes): equal for the same data on any machine"""
+    contents = {
+        name: {
+            os.path.basename(path): {key: value for key, value in signature.items() if key != 'mtime'}
+            for path, signature in signatures.items()
+        }
+        for name, signatures in files.items()
+    }
+    return hashlib.blake2b(json.dumps(contents, sort_keys=True).encode(), digest_size=8).hexdigest()
+
+def feature_path(dataset, snapshot, stem, names):
+    """Path of a derived file of a dataset, named after the ingested files of the tables it came from"""
+    return os.path.join(dataset_feature_dir(list_datasets()[dataset]), f"{stem}-{files_digest(snapshot, names)}")
+
+@admission.gated
+@st.cache_resource(max_entries=2, show_spinner="Indexing student records...")
+def enrollment_index(_data, data_version):
+    """Offset index of the VLE and score rows per enrollment, built once per snapshot"""
+    with admission.gate.admit(wait=False):
+        return EnrollmentIndex(_data)
+
+@admission.gated
+@st.cache_resource(max_entries=2, show_spinner="Building weekly engagement profiles...")
+def engagement_matrix(_index, data_version, path):
+    """Memory-mapped enrollment x week click matrix, built once per VLE data and reused across restarts"""
+    with admission.gate.admit(wait=False):
+        return EngagementMatrix(_index, path)
+
+def select_dataset():
+    """Dataset picked in the sidebar, kept in the ?dataset= URL parameter"""
+    names = list(list_datasets())
+    if len(names) == 1:
+        return names[0]
+    if st.session_state.get("dataset") not in names:
+        requested = st.query_params.get("dataset", DEFAULT_DATASET)
+        st.session_state["dataset"] = requested if requested in names else DEFAULT_DATASET
+    dataset = st.sidebar.selectbox("Dataset", names, key="dataset")
+    st.query_params["dataset"] = dataset
+    return dataset
+
+def load_data(dataset=DEFAULT_DATASET):
+    """Tables of a dataset's current snapshot"""
+    return current_snapshot(dataset)['data']
@@ -0,0 +1,171 @@
+# metrics.py
+"""Process metrics in the Prometheus text format, served on a local port.
+
+    METRICS_PORT=9464 python -m streamlit run app.py
+    curl localhost:9464/metrics
+
+Page runs and home dashboard sections are timed into latency histograms,
+caches count their hits and misses, and dataset loads their durations. Active
+sessions and the resident memory are read when the endpoint is scraped.
+Metrics are per process: every replica serves its own.
+"""
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Port of the metrics endpoint (0: not served)
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+METRICS_ADDRESS = os.environ.get("METRICS_ADDRESS", "127.0.0.1")
+PREFIX = "dashboard_"
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+DESCRIPTIONS = {
+    'page_run_seconds': ('histogram', "Duration of a page script run"),
+    'section_seconds': ('histogram', "Time to compute and render a home dashboard section"),
+    'data_load_seconds': ('histogram', "Duration of a dataset load (full) or of ingesting its changes (refresh)"),
+    'cache_requests_total': ('counter', "Cache lookups by cache and result (hit or miss)"),
+    'loaded_table_bytes': ('gauge', "Memory of the loaded tables per dataset"),
+    'admission_runs': ('gauge', "Section computations running and page runs queued for a slot"),
+    'admission_wait_seconds': ('histogram', "Time a page run waited in line for a computation slot"),
+    'active_sessions': ('gauge', "Browser sessions connected to this process"),
+    'resident_memory_bytes': ('gauge', "Resident set size of this process"),
+}
+
+_lock = threading.Lock()
+# (name, labels) -> [count per bucket..., count, sum]
+_histograms = {}
+_counters = defaultdict(float)
+_gauges = {}
+_server = None
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def observe(name, seconds, **labels):
+    """Add a duration to a latency histogram"""
+    with _lock:
+        values = _histograms.setdefault((name, _labels(labels)), [0] * (len(LATENCY_BUCKETS) + 2))
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                values[i] += 1
+        values[-2] += 1
+        values[-1] += seconds
+
+
+@contextmanager
+def timed(name, **labels):
+    """Observe the duration of the block, also when it exits by an exception (e.g. st.stop)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+def record_cache(cache, hit):
+    with _lock:
+        _counters[('cache_requests_total', _labels({'cache': cache, 'result': 'hit' if hit else 'miss'}))] += 1
+
+
+def set_gauges(name, label, values):
+    """Replace every series of a gauge with one per `label` value: {label value: value}"""
+    with _lock:
+        for key in [key for key in _gauges if key[0] == name]:
+            del _gauges[key]
+        for item, value in values.items():
+            _gauges[(name, ((label, item),))] = value
+
+
+def active_sessions():
+    """Sessions connected to the Streamlit server (None outside one, or when it cannot tell)"""
+    from streamlit import runtime
+    if not runtime.exists():
+        return None
+    # The session manager has no public accessor on the runtime: without it the gauge is skipped
+    session_mgr = getattr(runtime.get_instance(), '_session_mgr', None)
+    count = getattr(session_mgr, 'num_active_sessions', None)
+    return count() if callable(count) else None
+
+
+def resident_memory():
+    """Current RSS in bytes (the peak where /proc is not available)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes, except on macOS
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _series(name, labels, value):
+    label_text = ",".join(f'{key}="{item}"' for key, item in labels)
+    number = str(int(value)) if float(value).is_integer() else repr(float(value))
+    return f"{PREFIX}{name}{{{label_text}}} {number}" if label_text else f"{PREFIX}{name} {number}"
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    sessions = active_sessions()
+    with _lock:
+        gauges = dict(_gauges)
+        gauges[('resident_memory_bytes', ())] = resident_memory()
+        if sessions is not None:
+            gauges[('active_sessions', ())] = sessions
+        samples = defaultdict(list)
+        for (name, labels), values in sorted(_histograms.items()):
+            for bound, count in zip(LATENCY_BUCKETS + ['+Inf'], values[:len(LATENCY_BUCKETS)] + [values[-2]]):
+                samples[name].append(_series(f"{name}_bucket", labels + (('le', bound),), count))
+            samples[name].append(_series(f"{name}_count", labels, values[-2]))
+            samples[name].append(_series(f"{name}_sum", labels, values[-1]))
+        for (name, labels), value in sorted(_counters.items()) + sorted(gauges.items()):
+            samples[name].append(_series(name, labels, value))
+    lines = []
+    for name, (kind, description) in DESCRIPTIONS.items():
+        if samples[name]:
+            lines += [f"# HELP {PREFIX}{name} {description}", f"# TYPE {PREFIX}{name} {kind}"] + samples[name]
+    return "\n".join(lines) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes would flood the app's log
+        pass
+
+
+def serve(port=METRICS_PORT, address=METRICS_ADDRESS):
+    """Start the /metrics endpoint in a background thread (once per process; port 0 disables it)"""
+    global _server
+    with _lock:
+        if _server is not None or not port:
+            return
+        try:
+            _server = ThreadingHTTPServer((address, port), _Handler)
+        except OSError as e:
+            # e.g. another worker process already serves the port
+            logger.warning("Metrics endpoint not started on %s:%s: %s", address, port, e)
+            _server = False
+            return
+    threading.Thread(target=_server.serve_forever, daemon=True).start()
+    logger.info("Metrics served on http://%s:%s/metrics", address, port)
@@ -1,7 +1,21 @@
 # pages/dataset.py
+import os
+import re
+import shutil
+import tempfile
+import weakref
 import streamlit as st
 import pandas as pd
-from loader import courses, assessments, student_info, student_vle, student_assessment
+import pyarrow.dataset as ds
+import store
+from loader import current_snapshot, select_dataset
+
+# One snapshot per run: data refreshed meanwhile shows up on the next rerun
+snapshot = current_snapshot(select_dataset())
+engine, data_version = snapshot['engine'], snapshot['version']
+courses, assessments, student_info, student_vle, student_assessment = (
+    snapshot['data'][name] for name in ["courses", "assessments", "student_info", "student_vle", "student_assessment"]
+)
 
 
 # Page Header
@@ -30,14 +44,15 @@ For simplicity, this table has also been pre-merged with the original dataset's
 st.header("📈 Dataset Health Metrics")
 
 # Core metrics calculation
+gender_share = engine.distribution(None, 'gender', normalize=True)
 health_metrics = {
     "Tables": 5,
     "Total Students": f"{len(student_info):,}",
-    "Assessment Records": f"{len(student_assessment):,}",
-    "VLE Interactions": f"{student_vle['sum_click'].sum():,}",
+    "Assessment Records": f"{snapshot['totals']['student_assessment']:,}",
+    "VLE Interactions": f"{snapshot['totals']['clicks']:,}",
     "Gender Balance": {
-        "Male": f"{student_info['gender'].value_counts(normalize=True).mul(100).round(1)['M']}%",
-        "Female": f"{student_info['gender'].value_counts(normalize=True).mul(100).round(1)['F']}%"
+        "Male": f"{gender_share.mul(100).round(1)['M']}%",
+        "Female": f"{gender_share.mul(100).round(1)['F']}%"
     }
 }
 
@@ -54,11 +69,141 @@ m4.metric("Assessment Records", health_metrics['Assessment Records'])
 st.header("🔎 Interactive Data Explorer")
 
 
+@st.cache_resource(max_entries=4)
+def sorted_positions(_dataset, data_version, name, filters, sort_keys):
+    """Cached row order of a table for the chosen sort (only the matching rows of a filtered stored table)"""
+    return store.sort_permutation(_dataset, list(sort_keys), filters if isinstance(_dataset, ds.Dataset) else ())
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def filter_options(_df, data_version, name, column):
+    """Pick list values of a column, or its (min, max) range when it has none"""
+    values = store.distinct_values(_df, column)
+    return ('values', values) if values is not None else ('range', store.value_range(_df, column))
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def filtered_count(_dataset, data_version, name, filters):
+    """Rows of a stored table matching the filters, counted with pushdown"""
+    return store.row_count(_dataset, store.filter_expression(_dataset, filters))
+
+
+def filter_controls(df, name):
+    """Per-column filters as (column, op, value) tuples; untouched controls add none"""
+    filters = []
+    filter_cols = st.multiselect(
+        f"Filter {name} by:",
+        store.columns(df),
+        key=f"filtercols_{name}"
+    )
+    for col in filter_cols:
+        if col.startswith('id_'):
+            # Id lookup: one or more ids, comma or space separated
+            text = st.text_input(f"'{col}' is one of (ids):", key=f"filter_{name}_{col}")
+            ids = tuple(int(token) for token in text.replace(',', ' ').split() if token.lstrip('-').isdigit())
+            if ids:
+                filters.append((col, 'isin', ids))
+            continue
+        kind, options = filter_options(df, data_version, name, col)
+        if kind == 'values':
+            chosen = st.multiselect(f"'{col}' is one of:", options, key=f"filter_{name}_{col}")
+            if chosen:
+                filters.append((col, 'isin', tuple(chosen)))
+        elif options[0] < options[1]:
+            low, high = st.slider(f"'{col}' between:", options[0], options[1], options, key=f"filter_{name}_{col}")
+            if (low, high) != tuple(options):
+                filters.append((col, 'between', (low, high)))
+    return tuple(filters)
+
+
+def sorted_view(df, name, filters, sort_cols, sort_bool):
+    """Positions in `df` of the matching rows in the chosen order (cached permutation)"""
+    sort_keys = tuple((col, 'ascending' if asc else 'descending') for col, asc in zip(sort_cols, sort_bool))
+    return sorted_positions(df, data_version, name, filters, sort_keys)
+
+
+def page_rows(df, name, filters, sort_cols, sort_bool, start_idx, end_idx):
+    """Rows of one page; stored tables are read page by page, never in full"""
+    if not sort_cols:
+        if not isinstance(df, ds.Dataset):
+            return df.iloc[start_idx:end_idx]
+        return store.read_rows(df, start_idx, end_idx, store.filter_expression(df, filters) if filters else None)
+    positions = sorted_view(df, name, filters, sort_cols, sort_bool)
+    return store.take_rows(df, positions[start_idx:end_idx])
+
+
+# Format -> (file extension, MIME type)
+EXPORT_FORMATS = {"CSV": ("csv", "text/csv"), "Parquet": ("parquet", "application/vnd.apache.parquet")}
+
+
+class ExportDirectory:
+    """Private temporary directory of one session, removed when the session ends"""
+
+    def __init__(self):
+        self.path = tempfile.mkdtemp(prefix="export-")
+        weakref.finalize(self, shutil.rmtree, self.path, True)
+
+
+def export_directory():
+    """This session's export directory"""
+    if "export_directory" not in st.session_state:
+        st.session_state["export_directory"] = ExportDirectory()
+    return st.session_state["export_directory"].path
+
+
+def discard_export(key):
+    """Forget an export and remove its file"""
+    export = st.session_state.pop(key, None)
+    if export is not None and os.path.exists(export[0]):
+        os.remove(export[0])
+
+
+def export_view(df, name, filters, sort_cols, sort_bool, total_rows):
+    """Export the filtered and sorted view, streamed through the sort permutation into a private download"""
+    key = f"export_{name}"
+    col1, col2 = st.columns([3, 1])
+    format_label = col1.radio("Export format:", list(EXPORT_FORMATS), horizontal=True, key=f"exportformat_{name}")
+    if col2.button("Export view", key=f"exportbutton_{name}", use_container_width=True):
+        discard_export(key)
+        extension, _ = EXPORT_FORMATS[format_label]
+        filename = f"{re.sub(r'[^a-z0-9]+', '_', name.lower())}.{extension}"
+        positions = sorted_view(df, name, filters, sort_cols, sort_bool) if sort_cols else None
+        expression = store.filter_expression(df, filters) if filters and isinstance(df, ds.Dataset) else None
+        bar = st.progress(0.0, text="Exporting...")
+        # Written batch by batch into this session's directory; only the path is kept between reruns
+        path = os.path.join(export_directory(), filename)
+        rows = store.export_rows(
+            df, path, extension, positions, None if positions is not None else expression,
+            progress=lambda done: bar.progress(min(done / max(total_rows, 1), 1.0), text=f"Exported {done:,} of {total_rows:,} rows")
+        )
+        bar.empty()
+        st.session_state[key] = (path, format_label, rows)
+
+    if key in st.session_state:
+        path, format_label, rows = st.session_state[key]
+        # The button reads the file while it is on the page; downloading removes both
+        with open(path, 'rb') as f:
+            st.download_button(
+                f"⬇️ Download {format_label} ({rows:,} rows, {os.path.getsize(path) / 1024 ** 2:.1f} MB)",
+                f,
+                file_name=os.path.basename(path),
+                mime=EXPORT_FORMATS[format_label][1],
+                key=f"download_{name}",
+                on_click=discard_export,
+                args=(key,)
+            )
+
+
 def show_dataset(df, name):
+    # Column filters (vectorized masks in memory, pushed down into the store)
+    filters = filter_controls(df, name)
+    if filters and not isinstance(df, ds.Dataset):
+        df = df[store.filter_mask(df, filters)]
+
     # Multi-column sorting
     sort_cols = st.multiselect(
         f"Sort {name} by (priority order):",
-        df.columns,
+        store.columns(df),
         key=f"sortcols_{name}"
     )
     
@@ -81,15 +226,16 @@ def show_dataset(df, name):
         key=f"pagesize_{name}"
     )
     
-    # Apply sorting if columns selected
-    if sort_cols:
-        sort_bool = [sort_directions[col] == "Ascending" for col in sort_cols]
-        sorted_df = df.sort_values(by=sort_cols, ascending=sort_bool)
-    else:
-        sorted_df = df.copy()
+    sort_bool = [sort_directions[col] == "Ascending" for col in sort_cols]
     
-    # Pagination
-    total_pages = len(sorted_df) // page_size + 1
+    # Pagination over the matching rows
+    if filters and isinstance(df, ds.Dataset):
+        total_rows = filtered_count(df, data_version, name, filters)
+    else:
+        total_rows = store.row_count(df)
+    if filters:
+        st.markdown(f"**{total_rows:,}** matching rows")
+    total_pages = total_rows // page_size + 1
     page_num = st.number_input(
         "Page number:",
         min_value=1,
@@ -127,13 +273,16 @@ def show_dataset(df, name):
     )
     
     st.dataframe(
-        sorted_df.iloc[start_idx:end_idx],
+        page_rows(df, name, filters, sort_cols, sort_bool, start_idx, end_idx),
         height=min(600, (page_size + 1) * 35),
         use_container_width=True,
         hide_index=True
     )
     
-    st.caption(f"Showing rows {start_idx + 1} to {min(end_idx, len(df))} of {len(df):,}")
+    st.caption(f"Showing rows {start_idx + 1} to {min(end_idx, total_rows)} of {total_rows:,}")
+
+    # Export of everything matching, in the chosen order
+    export_view(df, name, filters, sort_cols, sort_bool, total_rows)
 
 # Dataset selection
 with st.expander("View Dataset"):
@@ -0,0 +1,116 @@
+# pages/risk.py
+import time
+import numpy as np
+import pandas as pd
+import streamlit as st
+import plotly.graph_objects as go
+import admission
+from analytics.risk import RiskScorer
+from loader import current_snapshot, select_dataset, enrollment_index, engagement_matrix, feature_path
+
+LIST_SIZES = [50, 100, 250, 500]
+RISK_THRESHOLD = 0.5
+
+# One snapshot per run: data refreshed meanwhile shows up on the next rerun
+dataset = select_dataset()
+snapshot = current_snapshot(dataset)
+data_version = snapshot['version']
+courses = snapshot['data']['courses']
+
+
+@admission.gated
+@st.cache_resource(max_entries=2, show_spinner="Preparing risk features...")
+def risk_scorer(_index, _matrix, _assessments, data_version, path):
+    """Per-enrollment feature arrays and the fitted models of a snapshot"""
+    with admission.gate.admit(wait=False):
+        return RiskScorer(_index, _matrix, _assessments, path)
+
+
+# Page Header
+st.title("⚠️ At-Risk Students")
+st.markdown("""
+Early-warning list of the students still enrolled on a given course day, ranked by their estimated risk of
+failing or withdrawing. Risk comes from VLE engagement, assessment submissions and scores so far, prior
+attempts and demographics, through a logistic regression fitted on the same course day.
+""")
+
+index = enrollment_index(snapshot['data'], data_version)
+matrix = engagement_matrix(index, data_version, feature_path(dataset, snapshot, "engagement", ['small', 'student_vle']) + ".npy")
+scorer = risk_scorer(
+    index, matrix, snapshot['data']['assessments'], data_version,
+    feature_path(dataset, snapshot, "risk", ['small', 'student_vle', 'student_assessment'])
+)
+
+# =====================
+# 1. Cutoff and filters
+# =====================
+col1, col2, col3 = st.columns([3, 1, 1])
+day = col1.slider(
+    "Course day", 0, int(courses['module_presentation_length'].max()), 60, key="risk_day",
+    help="Only what was known by the end of this day is used"
+)
+module = col2.selectbox("Module", ["All modules"] + sorted(courses['code_module'].astype(str).unique()), key="risk_module")
+list_size = col3.selectbox("Students listed", LIST_SIZES, index=1, key="risk_list_size")
+
+# Fitting a day's model needs an admission slot: without a free one, the run's place in line shows here
+started = time.perf_counter()
+scored = admission.gated(scorer.score)(day)
+score_ms = (time.perf_counter() - started) * 1000
+model = admission.gated(scorer.model)(day)
+if module != "All modules":
+    scored = scored[scored['code_module'].astype(str) == module]
+
+# =====================
+# 2. Summary
+# =====================
+m1, m2, m3, m4 = st.columns(4)
+m1.metric("Enrolled on Day", f"{len(scored):,}")
+m2.metric("Flagged At Risk", f"{int((scored['risk'] >= RISK_THRESHOLD).sum()):,}")
+m3.metric("Model AUC (held out)", "—" if np.isnan(model['auc']) else f"{float(model['auc']):.2f}")
+m4.metric("Scored In", f"{score_ms:.0f} ms")
+
+counts, edges = np.histogram(scored['risk'], bins=20, range=(0, 1))
+fig_risk = go.Figure(go.Bar(
+    x=(edges[:-1] + edges[1:]) / 2 * 100,
+    y=counts,
+    marker_color=['#F44336' if edge >= RISK_THRESHOLD else '#4CAF50' for edge in edges[:-1]],
+    hovertemplate="Risk %{x:.0f}%<br>%{y} students<extra></extra>"
+))
+fig_risk.update_layout(height=300, xaxis_title="Risk of Failing or Withdrawing (%)", yaxis_title="Students",
+                       margin=dict(t=20), bargap=0.05)
+st.plotly_chart(fig_risk, use_container_width=True)
+
+# =====================
+# 3. Early-warning list
+# =====================
+st.header("Early-Warning List")
+listed = scored.head(list_size).assign(
+    risk=lambda frame: frame['risk'] * 100,
+    clicks=lambda frame: np.expm1(frame['log_clicks']).round().astype(int),
+    recent_clicks=lambda frame: np.expm1(frame['log_recent_clicks']).round().astype(int),
+)
+st.dataframe(
+    listed[['id_student', 'code_module', 'code_presentation', 'risk', 'clicks', 'recent_clicks',
+            'idle_weeks', 'submitted', 'missed', 'mean_score']],
+    hide_index=True,
+    use_container_width=True,
+    column_config={
+        "id_student": st.column_config.NumberColumn("Student", format="%d"),
+        "risk": st.column_config.ProgressColumn("Risk", format="%.0f%%", min_value=0, max_value=100),
+        "clicks": "Clicks",
+        "recent_clicks": "Clicks (last 2 weeks)",
+        "idle_weeks": "Weeks Idle",
+        "submitted": "Submitted",
+        "missed": "Missed",
+        "mean_score": st.column_config.NumberColumn("Avg Score", format="%.1f"),
+    }
+)
+st.caption("Open the Student Lookup page for a student's full history.")
+
+with st.expander("Model weights", expanded=False):
+    weights = pd.DataFrame({
+        'feature': scorer.feature_names,
+        'weight': model['weights'][1:],
+    }).sort_values('weight', key=abs, ascending=False)
+    st.caption("Per standard deviation of each feature; positive weights raise the risk.")
+    st.dataframe(weights, hide_index=True, use_container_width=True)
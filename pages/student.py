@@ -0,0 +1,176 @@
+# pages/student.py
+import time
+import pandas as pd
+import streamlit as st
+import plotly.graph_objects as go
+from loader import current_snapshot, select_dataset, enrollment_index, engagement_matrix, feature_path
+from sections import RESULT_COLORS, RESULT_ORDER
+
+NEIGHBOUR_COUNTS = [5, 10, 25, 50]
+
+# One snapshot per run: data refreshed meanwhile shows up on the next rerun
+dataset = select_dataset()
+snapshot = current_snapshot(dataset)
+engine, data_version = snapshot['engine'], snapshot['version']
+student_info, assessments = snapshot['data']['student_info'], snapshot['data']['assessments']
+
+
+def day_label(day):
+    """Course day relative to the presentation start, or a dash when missing"""
+    return "—" if pd.isna(day) else f"Day {int(day)}"
+
+
+# Page Header
+st.title("🎓 Student Lookup")
+st.markdown("One enrollment's outcome, registration, VLE activity and assessment scores.")
+
+index = enrollment_index(snapshot['data'], data_version)
+
+# =====================
+# 1. Student selection
+# =====================
+id_student = st.number_input(
+    "Student id",
+    min_value=0,
+    step=1,
+    value=int(student_info['id_student'].iloc[0]),
+    key="lookup_student"
+)
+enrollments = index.enrollments(int(id_student))
+if enrollments.empty:
+    st.warning(f"No enrollments found for student {id_student}.")
+    st.stop()
+
+position = st.selectbox(
+    "Module presentation",
+    options=range(len(enrollments)),
+    format_func=lambda i: f"{enrollments['code_module'].iloc[i]} {enrollments['code_presentation'].iloc[i]}",
+    key="lookup_enrollment"
+)
+enrollment = enrollments.iloc[position]
+# student_info position of the enrollment, the key of the offset index
+number = student_info.index.get_loc(enrollments.index[position])
+
+started = time.perf_counter()
+clicks = index.rows('student_vle', number)
+scores = index.rows('student_assessment', number)
+lookup_ms = (time.perf_counter() - started) * 1000
+
+# =====================
+# 2. Outcome and registration
+# =====================
+st.header("Outcome")
+c1, c2, c3, c4 = st.columns(4)
+c1.metric("Final Result", enrollment['final_result'])
+c2.metric("Registered", day_label(enrollment['date_registration']))
+c3.metric("Unregistered", day_label(enrollment['date_unregistration']))
+c4.metric("Previous Attempts", int(enrollment['num_of_prev_attempts']))
+st.caption(
+    f"{enrollment['gender']} · {enrollment['age_band']} · {enrollment['region']} · "
+    f"{enrollment['highest_education']} · IMD {enrollment['imd_band']} · "
+    f"{int(enrollment['studied_credits'])} credits"
+    + (" · Has Disability" if enrollment['disability'] else "")
+)
+
+# =====================
+# 3. Click timeline
+# =====================
+st.header("VLE Activity")
+if clicks.empty:
+    st.info("No VLE interactions recorded for this enrollment.")
+else:
+    daily = clicks.groupby('date')['sum_click'].sum().sort_index()
+    fig_clicks = go.Figure([
+        go.Bar(x=daily.index, y=daily.values, name="Clicks per day",
+               marker_color=RESULT_COLORS.get(enrollment['final_result'], 'grey')),
+        go.Scatter(x=daily.index, y=daily.cumsum().values, name="Cumulative clicks", yaxis='y2',
+                   line=dict(color='#4e79a7'))
+    ])
+    for day, label in [(enrollment['date_registration'], "Registered"), (enrollment['date_unregistration'], "Unregistered")]:
+        if not pd.isna(day):
+            fig_clicks.add_vline(x=int(day), line_dash='dash', line_color='grey', annotation_text=label)
+    fig_clicks.update_layout(
+        height=450,
+        xaxis_title="Course Day",
+        yaxis_title="Clicks",
+        yaxis2=dict(title="Cumulative Clicks", overlaying='y', side='right', showgrid=False),
+        legend=dict(orientation='h', y=1.1)
+    )
+    st.plotly_chart(fig_clicks, use_container_width=True)
+
+# =====================
+# 4. Assessment scores
+# =====================
+st.header("Assessment Scores")
+if scores.empty:
+    st.info("No assessment submissions recorded for this enrollment.")
+else:
+    scores = scores[['id_assessment', 'date_submitted', 'is_banked', 'score']].merge(
+        assessments[['id_assessment', 'assessment_type', 'date', 'weight']], on='id_assessment', how='left'
+    ).sort_values('date_submitted')
+    fig_scores = go.Figure(go.Scatter(
+        x=scores['date_submitted'],
+        y=scores['score'],
+        mode='lines+markers',
+        text=scores['assessment_type'].astype(str),
+        hovertemplate="%{text}<br>Submitted: day %{x}<br>Score: %{y}<extra></extra>",
+        line=dict(color='#4e79a7')
+    ))
+    fig_scores.update_layout(height=400, xaxis_title="Submission Day", yaxis_title="Score (%)", yaxis_range=[0, 105])
+    st.plotly_chart(fig_scores, use_container_width=True)
+    st.dataframe(
+        scores.rename(columns={'date': 'due_date'}),
+        hide_index=True,
+        use_container_width=True
+    )
+
+st.caption(f"{len(clicks):,} VLE and {len(scores):,} score records fetched in {lookup_ms:.1f} ms through the enrollment index.")
+
+# =====================
+# 5. Students like this one
+# =====================
+st.header("Students Like This One")
+st.markdown("Enrollments with the most similar weekly VLE click profile (cosine similarity of log clicks per week), and how they ended up.")
+
+matrix = engagement_matrix(index, data_version, feature_path(dataset, snapshot, "engagement", ['small', 'student_vle']) + ".npy")
+col1, col2 = st.columns([1, 1])
+k = col1.select_slider("Number of similar students", NEIGHBOUR_COUNTS, value=10, key="lookup_neighbours")
+same_module = col2.checkbox(f"Only {enrollment['code_module']} students", value=True, key="lookup_same_module")
+
+started = time.perf_counter()
+candidates = engine.demographics.rows({'code_module': [str(enrollment['code_module'])]}) if same_module else None
+neighbours, similarity = matrix.neighbours(number, k, candidates)
+search_ms = (time.perf_counter() - started) * 1000
+
+if not len(neighbours):
+    st.info("This enrollment has no VLE activity to compare.")
+else:
+    similar = student_info.iloc[neighbours][
+        ['id_student', 'code_module', 'code_presentation', 'final_result']
+    ].assign(similarity=similarity.round(3))
+    outcomes = similar['final_result'].astype(str).value_counts()
+
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        fig_outcomes = go.Figure(go.Pie(
+            labels=[result for result in RESULT_ORDER if result in outcomes],
+            values=[outcomes[result] for result in RESULT_ORDER if result in outcomes],
+            marker_colors=[RESULT_COLORS[result] for result in RESULT_ORDER if result in outcomes],
+            hole=0.5,
+            sort=False
+        ))
+        fig_outcomes.update_layout(height=350, margin=dict(t=30, b=0, l=0, r=0), title="Their outcomes")
+        st.plotly_chart(fig_outcomes, use_container_width=True)
+    with col2:
+        weeks = matrix.weeks
+        fig_profiles = go.Figure([
+            go.Scatter(x=weeks, y=matrix.weekly_clicks([number])[0], name="This student", line=dict(color='#4e79a7', width=3)),
+            go.Scatter(x=weeks, y=matrix.weekly_clicks(neighbours).mean(axis=0), name=f"{len(neighbours)} similar students (mean)",
+                       line=dict(color='grey', dash='dash'))
+        ])
+        fig_profiles.update_layout(height=350, xaxis_title="Course Week", yaxis_title="Clicks", title="Weekly clicks",
+                                   legend=dict(orientation='h', y=-0.25))
+        st.plotly_chart(fig_profiles, use_container_width=True)
+
+    st.dataframe(similar, hide_index=True, use_container_width=True)
+    st.caption(f"Searched {len(matrix.matrix) if candidates is None else len(candidates):,} enrollments in {search_ms:.1f} ms.")
@@ -0,0 +1,253 @@
+# schema.py
+"""Declarative schema of the OULAD tables.
+
+Columns are declared by kind rather than by a fixed dtype, and every table is
+read with the most compact types its values allow:
+
+    'integer'           narrowest signed width holding the values (int8 .. int64)
+    'nullable integer'  the same as a nullable Int8 .. Int64
+    'float'             float32
+    'category'          categorical of the observed values
+    [values]            ordered categorical of these values (others become missing)
+    'flag'              Y/N as bool
+
+Tables are validated on load and the memory saved against pandas' default
+types (int64/float64/object) is reported.
+
+    python schema.py [data_dir]
+"""
+import os
+import sys
+
+import pandas as pd
+
+RESULT_ORDER = ['Withdrawn', 'Fail', 'Pass', 'Distinction']
+AGE_BAND_ORDER = ['0-35', '35-55', '55<=']
+IMD_BAND_ORDER = [
+    '0-10%', '10-20%', '20-30%', '30-40%',
+    '40-50%', '50-60%', '60-70%', '70-80%',
+    '80-90%', '90-100%'
+]
+# Kinds that may hold missing values; other columns list them under 'nullable'
+NULLABLE_KINDS = ['nullable integer', 'float']
+# Bytes per cell of pandas' default numeric types and object pointers
+DEFAULT_ITEMSIZE = 8
+
+SCHEMAS = {
+    "courses": {
+        "file": "courses.csv",
+        "columns": {
+            'code_module': 'category',
+            'code_presentation': 'category',
+            'module_presentation_length': 'integer',
+        },
+    },
+    "assessments": {
+        "file": "assessments.csv",
+        "columns": {
+            'code_module': 'category',
+            'code_presentation': 'category',
+            'id_assessment': 'integer',
+            'assessment_type': 'category',
+            'date': 'nullable integer',
+            'weight': 'float',
+        },
+    },
+    "student_info": {
+        "file": "studentInfo.csv",
+        "columns": {
+            'code_module': 'category',
+            'code_presentation': 'category',
+            'id_student': 'integer',
+            'gender': 'category',
+            'region': 'category',
+            'highest_education': 'category',
+            'imd_band': IMD_BAND_ORDER,
+            'age_band': AGE_BAND_ORDER,
+            'num_of_prev_attempts': 'integer',
+            'studied_credits': 'integer',
+            'disability': 'flag',
+            'final_result': RESULT_ORDER,
+        },
+        "nullable": ['imd_band'],
+    },
+    "student_registration": {
+        "file": "studentRegistration.csv",
+        "columns": {
+            'code_module': 'category',
+            'code_presentation': 'category',
+            'id_student': 'integer',
+            'date_registration': 'nullable integer',
+            'date_unregistration': 'nullable integer',
+        },
+    },
+    "vle": {
+        "file": "vle.csv",
+        "columns": {
+            'id_site': 'integer',
+            'code_module': 'category',
+            'code_presentation': 'category',
+            'activity_type': 'category',
+            'week_from': 'nullable integer',
+            'week_to': 'nullable integer',
+        },
+    },
+    "student_vle": {
+        "file": "studentVle.csv",
+        "columns": {
+            'code_module': 'category',
+            'code_presentation': 'category',
+            'id_student': 'integer',
+            'id_site': 'integer',
+            'date': 'integer',
+            'sum_click': 'integer',
+        },
+    },
+    "student_assessment": {
+        "file": "studentAssessment.csv",
+        "columns": {
+            'id_assessment': 'integer',
+            'id_student': 'integer',
+            'date_submitted': 'integer',
+            'is_banked': 'integer',
+            'score': 'float',
+        },
+    },
+}
+
+
+def _read_dtypes(columns):
+    """read_csv dtypes: strings straight into categoricals, floats at 32 bits"""
+    dtypes = {}
+    for column, kind in columns.items():
+        if kind == 'integer':
+            dtypes[column] = 'int64'
+        elif kind == 'float':
+            dtypes[column] = 'float32'
+        elif kind == 'nullable integer':
+            dtypes[column] = 'Int64'
+        elif kind in ('category', 'flag') or isinstance(kind, list):
+            dtypes[column] = 'category'
+    return dtypes
+
+
+def narrowest_integer(series):
+    """Integer column in the narrowest width holding its values"""
+    return pd.to_numeric(series, downcast='integer')
+
+
+def conform(frame, name, source=None):
+    """Table with its declared types; raises ValueError when it does not fit the schema.
+
+    Returns the frame and the problems that did not stop the load.
+    """
+    spec = SCHEMAS[name]
+    source = source or spec['file']
+    missing = [column for column in spec['columns'] if column not in frame.columns]
+    if missing:
+        raise ValueError(f"{source}: missing column(s) {', '.join(missing)}")
+
+    warnings, converted = [], {}
+    for column, kind in spec['columns'].items():
+        series = frame[column]
+        nullable = kind in NULLABLE_KINDS or column in spec.get('nullable', [])
+        if not nullable and series.isna().any():
+            raise ValueError(f"{source}: {int(series.isna().sum())} missing value(s) in {column}")
+
+        if kind in ('integer', 'nullable integer'):
+            if not pd.api.types.is_integer_dtype(series):
+                raise ValueError(f"{source}: {column} holds non-integer values")
+            converted[column] = narrowest_integer(series)
+        elif kind == 'flag':
+            unknown = set(series.cat.categories) - {'Y', 'N'}
+            if unknown:
+                raise ValueError(f"{source}: {column} expects Y/N, found {', '.join(map(str, sorted(unknown)))}")
+            converted[column] = series == 'Y'
+        elif isinstance(kind, list):
+            ordered = series.cat.set_categories(kind, ordered=True)
+            unknown = int(ordered.isna().sum() - series.isna().sum())
+            if unknown:
+                warnings.append(f"{column}: {unknown} value(s) outside {kind[0]} .. {kind[-1]} read as missing")
+            converted[column] = ordered
+    return frame.assign(**converted), warnings
+
+
+def read_table(path, name, report=None):
+    """Read one OULAD CSV (path or buffer) with its declared schema.
+
+    With a `report` list, a memory report row for the table is appended to it.
+    """
+    columns = SCHEMAS[name]['columns']
+    # pyarrow parses blocks on all cores; the resulting dtypes match the default parser's
+    raw = pd.read_csv(path, dtype=_read_dtypes(columns), engine='pyarrow')
+    frame, warnings = conform(raw, name, path if isinstance(path, str) else None)
+    if report is not None:
+        report.append({
+            'table': name,
+            'rows': len(frame),
+            'before': default_nbytes(raw, name),
+            'after': int(frame.memory_usage(deep=True, index=False).sum()),
+            'warnings': warnings,
+        })
+    return frame
+
+
+def concat(frames):
+    """pd.concat that keeps unordered categoricals categorical (categories are unioned)"""
+    first = frames[0]
+    aligned = list(frames)
+    for column in first.columns:
+        dtype = first[column].dtype
+        if not isinstance(dtype, pd.CategoricalDtype) or dtype.ordered:
+            continue
+        # New categories go last so the codes of the first (largest) frame stay valid
+        categories = dtype.categories
+        for frame in frames[1:]:
+            categories = categories.append(frame[column].cat.categories.difference(categories))
+        aligned = [
+            frame if frame[column].cat.categories.equals(categories)
+            else frame.assign(**{column: frame[column].cat.set_categories(categories)})
+            for frame in aligned
+        ]
+    return pd.concat(aligned, ignore_index=True)
+
+
+def default_nbytes(frame, name):
+    """Memory a freshly read table would take with pandas' default types"""
+    total = 0
+    for column in SCHEMAS[name]['columns']:
+        series = frame[column]
+        total += DEFAULT_ITEMSIZE * len(series)
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # One string object per row (missing values are float NaN objects)
+            counts = series.value_counts(dropna=False)
+            total += sum(sys.getsizeof(value) * int(count) for value, count in counts.items())
+    return total
+
+
+def format_report(report):
+    """Before/after memory table for the rows collected by read_table"""
+    lines = [f"{'table':<20} {'rows':>10} {'default MB':>11} {'typed MB':>9} {'ratio':>6}"]
+    for row in report:
+        lines.append(
+            f"{row['table']:<20} {row['rows']:>10,} {row['before'] / 1024 ** 2:>11.2f} "
+            f"{row['after'] / 1024 ** 2:>9.2f} {row['before'] / max(row['after'], 1):>5.1f}x"
+        )
+        lines.extend(f"    warning: {warning}" for warning in row['warnings'])
+    before, after = sum(row['before'] for row in report), sum(row['after'] for row in report)
+    lines.append(f"{'total':<20} {'':>10} {before / 1024 ** 2:>11.2f} {after / 1024 ** 2:>9.2f} {before / max(after, 1):>5.1f}x")
+    return "\n".join(lines)
+
+
+def main():
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else "./data"
+    report = []
+    for name, spec in SCHEMAS.items():
+        path = f"{data_dir}/{spec['file']}"
+        if os.path.exists(path):
+            read_table(path, name, report)
+    print(format_report(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1006 @@
+# sections.py
+"""Section builders of the home dashboard: aggregation through the analytics
+engine plus figure construction, shared by the page and the static export.
+
+Builders are cached per data snapshot (`data_version`) and presentation
+filter; the engine argument is not hashed. The exact builders' outputs are
+also kept in the on-disk cache (disk_cache.py), so a restarted or new
+instance serves them without recomputing.
+
+plotly is imported by the functions that draw, not here, so importing this
+module (e.g. for its constants) does not load it.
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import pandas as pd
+import streamlit as st
+
+from analytics.sample import EnrollmentSample, Z_95, standard_error
+import admission
+import metrics
+from disk_cache import cached_section
+
+logger = logging.getLogger(__name__)
+
+SECTION_CACHE_ENTRIES = 32
+# Serialized figure size above which a chart is flagged, in bytes (0 turns the meter off)
+CHART_PAYLOAD_BUDGET = int(os.environ.get("CHART_PAYLOAD_BUDGET", 64 * 1024))
+RESULT_ORDER = ['Withdrawn', 'Fail', 'Pass', 'Distinction']
+RESULT_COLORS = {
+    'Withdrawn': '#FFC107',
+    'Fail': '#F44336',
+    'Pass': '#4CAF50',
+    'Distinction': '#2196F3'
+}
+
+
+def payload_size(part):
+    """Bytes a builder output is sent to the browser as; None for outputs that are not sent as they are.
+
+    Figures are measured as st.plotly_chart serializes them, chart markup as
+    it is, and story specs (or dicts of markup) as JSON.
+    """
+    if hasattr(part, 'to_plotly_json'):
+        import plotly.io as pio
+        return len(pio.to_json(part, validate=False).encode())
+    if isinstance(part, str):
+        return len(part.encode())
+    if isinstance(part, dict):
+        try:
+            return len(json.dumps(part).encode())
+        except TypeError:
+            # Summaries holding frames or series
+            return None
+    return None
+
+
+# Payload sizes of the builder outputs handed to this thread's page run: id -> (output, bytes)
+_payloads = threading.local()
+
+
+def with_payloads(builder):
+    """The builder, returning its output with the payload sizes of its parts.
+
+    Cached as one entry, so an output's payload is measured once rather than on
+    every run that renders it.
+    """
+    @functools.wraps(builder)
+    def measured(*args):
+        value = builder(*args)
+        if not CHART_PAYLOAD_BUDGET:
+            return value, ()
+        return value, [payload_size(part) for part in (value if isinstance(value, tuple) else (value,))]
+    return measured
+
+
+def unpack_payloads(result):
+    """Output of a with_payloads builder; its sizes are kept for output_payload"""
+    value, sizes = result
+    known = _payloads.__dict__.setdefault('sizes', {})
+    for part, size in zip(value if isinstance(value, tuple) else (value,), sizes):
+        if size is not None:
+            known[id(part)] = (part, size)
+    return value
+
+
+def output_payload(part):
+    """Bytes of a figure, story or chart markup sent to the browser: measured when the builder ran, or now"""
+    known = _payloads.__dict__.setdefault('sizes', {}).pop(id(part), None)
+    if known is not None and known[0] is part:
+        return known[1]
+    return payload_size(part)
+
+
+@st.cache_resource(show_spinner=False)
+def flagged_payloads():
+    """(section, bytes) of the over-budget charts already logged in this process"""
+    return set()
+
+
+def log_payloads(payloads):
+    """Log the charts of a page run over CHART_PAYLOAD_BUDGET, once per section and size"""
+    # The run is done with its outputs
+    _payloads.__dict__.pop('sizes', None)
+    over = {
+        (section, size) for section, size in payloads.items()
+        if size > CHART_PAYLOAD_BUDGET and (section, size) not in flagged_payloads()
+    }
+    if not over:
+        return
+    flagged_payloads().update(over)
+    charts = ", ".join(f"{section} ({size / 1024:.1f} KB)" for section, size in sorted(over))
+    logger.warning(
+        "Charts over the %.0f KB payload budget: %s; page total %.1f KB over %d charts",
+        CHART_PAYLOAD_BUDGET / 1024, charts, sum(payloads.values()) / 1024, len(payloads)
+    )
+
+
+# Section builder runs on this thread (nested builders included), to tell cache hits from misses
+_builder_runs = threading.local()
+
+
+def section_cache(builder):
+    """st.cache_data over a builder whose output is also kept on disk; hits and misses are metered.
+
+    Misses compute under admission control (admission.py), so only a few run at once.
+    """
+    measured = with_payloads(builder)
+
+    @functools.wraps(builder)
+    def run(*args):
+        _builder_runs.count = getattr(_builder_runs, 'count', 0) + 1
+        # Computing takes an admission slot; without a free one, wait for it outside the cached call
+        with admission.gate.admit(wait=False):
+            return measured(*args)
+
+    cached = admission.gated(st.cache_data(max_entries=SECTION_CACHE_ENTRIES, show_spinner=False)(cached_section(run)))
+
+    @functools.wraps(cached)
+    def metered(*args):
+        runs = getattr(_builder_runs, 'count', 0)
+        result = cached(*args)
+        metrics.record_cache(builder.__name__, getattr(_builder_runs, 'count', 0) == runs)
+        return unpack_payloads(result)
+    return metered
+
+
+def estimate_cache(builder):
+    """st.cache_data over a sample estimate builder, its payloads measured once per entry"""
+    cached = st.cache_data(max_entries=SECTION_CACHE_ENTRIES, show_spinner=False)(with_payloads(builder))
+
+    @functools.wraps(builder)
+    def unpacked(*args):
+        return unpack_payloads(cached(*args))
+    return unpacked
+
+
+def box_figure(stats, x, color, color_map=None, category_order=None, height=None):
+    """Box plot drawn from precomputed quartiles instead of raw rows"""
+    import plotly.express as px
+    import plotly.graph_objects as go
+    fig = go.Figure()
+    groups = category_order if color == x and category_order else stats[color].drop_duplicates().tolist()
+    for i, name in enumerate(groups):
+        group = stats[stats[color] == name]
+        if group.empty:
+            continue
+        fig.add_trace(go.Box(
+            x=group[x],
+            q1=group['q1'],
+            median=group['median'],
+            q3=group['q3'],
+            lowerfence=group['lowerfence'],
+            upperfence=group['upperfence'],
+            name=str(name),
+            marker_color=(color_map or {}).get(name, px.colors.qualitative.Plotly[i % len(px.colors.qualitative.Plotly)])
+        ))
+    fig.update_layout(boxmode='group' if color != x else 'overlay', height=height, legend_title=color)
+    if category_order:
+        fig.update_xaxes(categoryorder='array', categoryarray=category_order)
+    return fig
+
+def card_chart(fig, **layout):
+    """Markup of a small header card chart, transparent and without a legend"""
+    fig.update_layout(showlegend=False, paper_bgcolor='rgba(0,0,0,0)', **layout)
+    return fig.to_html(full_html=False, include_plotlyjs='cdn')
+
+
+@section_cache
+def build_header_cards(_engine, data_version, presentations):
+    import plotly.graph_objects as go
+    overview = _engine.overview(presentations)
+    gender_dist = overview['gender_dist']
+    age_dist = overview['age_dist']
+    presentation_dist = overview['presentation_dist']
+    result_dist = overview['result_dist']
+
+    charts = {}
+    charts['students'] = card_chart(
+        go.Figure(data=[go.Pie(
+            labels=gender_dist.index,
+            values=gender_dist.values,
+            hole=0.7,
+            marker_colors=['#4e79a7', '#f28e2b'],
+            textinfo='none'
+        )]),
+        margin=dict(t=0, b=0, l=0, r=0), width=180, height=180
+    )
+    fig = go.Figure(data=[go.Bar(
+        y=presentation_dist.index,
+        x=presentation_dist.values,
+        orientation='h',
+        marker_color='#59a14f'
+    )])
+    fig.update_yaxes(title=None)
+    charts['courses'] = card_chart(
+        fig, margin=dict(t=20, b=20, l=20, r=20), height=150, xaxis_visible=False, plot_bgcolor='rgba(0,0,0,0)'
+    )
+    charts['enrolled'] = card_chart(
+        go.Figure(data=[go.Scatter(
+            x=presentation_dist.index,
+            y=presentation_dist.values,
+            mode='lines+markers',
+            line_shape='spline',
+            marker_color='#e15759'
+        )]),
+        margin=dict(t=0, b=0, l=0, r=0), height=150, xaxis_visible=False, yaxis_visible=False
+    )
+    charts['age_pie'] = card_chart(
+        go.Figure(data=[go.Pie(
+            labels=age_dist.index,
+            values=age_dist.values,
+            hole=0.5,
+            marker_colors=['#76b7b2', '#59a14f', '#edc948'],
+            textinfo='none'
+        )]),
+        margin=dict(t=0, b=0, l=0, r=0), height=150
+    )
+    charts['age_bar'] = card_chart(
+        go.Figure(data=[go.Bar(
+            x=age_dist.index,
+            y=age_dist.values,
+            marker_color='#76b7b2'
+        )]),
+        margin=dict(t=0, b=0, l=0, r=0), height=150, yaxis_visible=False
+    )
+    charts['disability'] = card_chart(
+        go.Figure(data=[go.Bar(
+            x=[''],
+            y=[overview['disability_rate'] * 100],
+            marker_color='#ff9da7'
+        )]),
+        margin=dict(t=0, b=0, l=0, r=0), height=120, yaxis_range=[0, 100], xaxis_visible=False, yaxis_visible=False
+    )
+    # Colors in the order of result_dist's index
+    color_map = {
+        'Pass': '#59a14f',
+        'Fail': '#e15759',
+        'Withdrawn': '#edc948',
+        'Distinction': '#4e79a7'
+    }
+    charts['results'] = card_chart(
+        go.Figure(data=[go.Pie(
+            labels=result_dist.index,
+            values=result_dist.values,
+            hole=0.6,
+            marker_colors=[color_map[result] for result in result_dist.index],
+            textinfo='none'
+        )]),
+        margin=dict(t=0, b=0, l=0, r=0), height=150
+    )
+    return overview, charts
+
+
+@section_cache
+def build_imd_heatmaps(_engine, data_version, presentations):
+    import plotly.graph_objects as go
+    # Pass rates and average scores by IMD and Gender-Age
+    pass_rates = _engine.result('imd_pass_rates', presentations)
+    avg_scores = _engine.result('imd_avg_scores', presentations)
+
+    # Define color scales
+    pass_rate_colorscale = [[0, '#F44336'], [0.5, '#FFC107'], [1, '#4CAF50']]  # Red-Yellow-Green
+    score_colorscale = [[0, '#F44336'], [0.5, '#FFC107'], [1, '#4CAF50']]  # Red-Yellow-Green
+
+    # First Heatmap: Pass Rates
+    fig_pass = go.Figure(data=go.Heatmap(
+        z=pass_rates.values,
+        x=pass_rates.columns,  # IMD bands on x-axis
+        y=pass_rates.index,    # Gender-Age groups on y-axis
+        colorscale=pass_rate_colorscale,
+        zmin=0,
+        zmax=1,
+        colorbar=dict(title='Pass Rate', tickformat='.0%'),
+        hovertemplate='<b>%{y}</b><br>IMD: %{x}<br>Pass Rate: %{z:.1%}<extra></extra>'
+    ))
+    fig_pass.update_layout(
+        xaxis_title='IMD Band',
+        yaxis_title='Gender - Age Group',
+        height=600,
+        margin=dict(l=100)  # Extra space for y-axis labels
+    )
+
+    # Second Heatmap: Average Scores
+    fig_score = go.Figure(data=go.Heatmap(
+        z=avg_scores.values,
+        x=avg_scores.columns,  # IMD bands on x-axis
+        y=avg_scores.index,    # Gender-Age groups on y-axis
+        colorscale=score_colorscale,
+
+
+        colorbar=dict(title='Average Score'),
+        hovertemplate='<b>%{y}</b><br>IMD: %{x}<br>Avg Score: %{z:.1f}<extra></extra>'
+    ))
+    fig_score.update_layout(
+        xaxis_title='IMD Band',
+        yaxis_title='Gender - Age Group',
+        height=600,
+        margin=dict(l=100)  # Extra space for y-axis labels
+    )
+    return fig_pass, fig_score
+
+
+@section_cache
+def build_age_histogram(_engine, data_version, presentations):
+    import plotly.graph_objects as go
+    counts, (ages, results) = _engine.contingency(presentations, ['age_band', 'final_result'])
+    fig_age = go.Figure([
+        go.Bar(
+            x=ages,
+            y=counts[:, results.index(result)],
+            name=result,
+            marker_color=RESULT_COLORS[result],
+            hovertemplate=f"final_result={result}<br>Age Group=%{{x}}<br>Number of Students=%{{y}}<extra></extra>"
+        )
+        for result in RESULT_ORDER if result in results and counts[:, results.index(result)].any()
+    ])
+    fig_age.update_layout(
+        barmode='group',
+        height=500,
+        xaxis_title="Age Group",
+        yaxis_title="Number of Students",
+        legend_title="Final Result"
+    )
+    return fig_age
+
+
+@section_cache
+def build_performance_story(_engine, data_version, presentations):
+    # ipyvizzu is slow to import and only this section needs it
+    from ipyvizzu import Data, Config, Style
+    from ipyvizzustory import Story, Slide, Step
+
+    # Prepare the data
+    result_counts = _engine.result_breakdown(presentations)
+
+    # Create ipyvizzu data object
+    data = Data()
+    data.add_series("Result", result_counts['final_result'].tolist())
+    data.add_series("Gender", result_counts['gender'].tolist())
+    data.add_series("Age", result_counts['age_band'].tolist())
+    data.add_series("Count", result_counts['count'].tolist())
+
+    # Create story
+    story = Story(data=data)
+
+    # Slide 1: Base view - Result counts
+    story.add_slide(
+        Slide(
+            Step(
+                Config({
+                    "x": "Result",
+                    "y": "Count",
+                    "title": "1. Overall Performance Distribution"
+                }),
+                # custom_style
+            )
+        )
+    )
+
+    # Slide 2: Split by gender
+    story.add_slide(
+        Slide(
+            Step(
+                Config({
+                    "x": ["Result", "Gender"],
+                    "y": "Count",
+                    "color": "Gender",
+                    "title": "2. Split by Gender (M/F)"
+                }),
+                # custom_style
+            )
+        )
+    )
+
+    # # Slide 3: Split by gender and age
+    story.add_slide(
+        Slide(
+            Step(
+                Config({
+                    "x": ["Result", "Age"],
+                    "y":  "Count",
+                    "color": "Age",
+                    "title": "3. Split by Gender & Age Groups"
+                }),
+                # custom_style
+            )
+        )
+    )
+    # Plain slide data for the player component (the same for every rerun)
+    return json.loads(json.dumps(story))
+
+
+@section_cache
+def build_education_pies(_engine, data_version, presentations):
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+    counts, (levels, results) = _engine.contingency(presentations, ['highest_education', 'final_result'])
+    # One pie per final result that has enrollments, two per row
+    facets = [
+        result for result in ['Pass', 'Distinction', 'Fail', 'Withdrawn']
+        if result in results and counts[:, results.index(result)].any()
+    ]
+    rows = max(1, (len(facets) + 1) // 2)
+    fig_edu = make_subplots(
+        rows=rows, cols=2,
+        specs=[[{'type': 'domain'}] * 2] * rows,
+        subplot_titles=facets,
+        horizontal_spacing=0.02,
+        vertical_spacing=0.07
+    )
+    for i, result in enumerate(facets):
+        fig_edu.add_trace(go.Pie(
+            labels=levels,
+            values=counts[:, results.index(result)],
+            hovertemplate=f"final_result={result}<br>highest_education=%{{label}}<extra></extra>"
+        ), row=i // 2 + 1, col=i % 2 + 1)
+    fig_edu.update_traces(
+        textposition='inside',
+        textinfo='percent+label',
+        textfont_size=14
+    )
+    fig_edu.update_layout(
+        height=900,  # Increased height for better spacing
+        margin=dict(t=100, b=100, l=50, r=50),  # Added margins for spacing
+        uniformtext_minsize=12,
+        uniformtext_mode='hide'
+    )
+    return fig_edu
+
+
+@section_cache
+def build_gender_sunburst(_engine, data_version, presentations):
+    import plotly.graph_objects as go
+    counts, (genders, results) = _engine.contingency(presentations, ['gender', 'final_result'])
+    # Inner ring: gender; outer ring: final result within each gender
+    totals = counts.sum(axis=1)
+    roots = [gender for g, gender in enumerate(genders) if totals[g]]
+    leaves = [(g, r) for g in range(len(genders)) for r in range(len(results)) if counts[g, r]]
+    fig_gender = go.Figure(go.Sunburst(
+        ids=roots + [f"{genders[g]}/{results[r]}" for g, r in leaves],
+        labels=roots + [results[r] for g, r in leaves],
+        parents=[''] * len(roots) + [genders[g] for g, r in leaves],
+        values=totals[totals > 0].tolist() + [int(counts[g, r]) for g, r in leaves],
+        branchvalues='total',
+        # Gender rings mix results, so they stay dark as they did with px
+        marker_colors=['#000005'] * len(roots) + [RESULT_COLORS.get(results[r], 'grey') for g, r in leaves],
+        hovertemplate="labels=%{label}<br>count=%{value}<br>parent=%{parent}<br>id=%{id}<extra></extra>"
+    ))
+    fig_gender.update_layout(height=600, margin=dict(t=0, b=0))
+    return fig_gender
+
+
+@section_cache
+def build_assessment_gender_box(_engine, data_version, presentations):
+    score_stats = _engine.score_stats(presentations, ['assessment_type', 'gender'])
+
+    fig_scores = box_figure(
+        score_stats,
+        x='assessment_type',
+        color='gender',
+        color_map={'M': '#4285F4', 'F': '#EA4335'},
+        height=500,
+        category_order=['TMA', 'CMA', 'Exam']
+    )
+    fig_scores.update_layout(
+        xaxis_title="Assessment Type",
+        yaxis_title="Score (%)",
+        legend_title="Gender"
+    )
+    return fig_scores
+
+
+@section_cache
+def build_attempt_sankey(_engine, data_version, presentations):
+    import plotly.express as px
+    import plotly.graph_objects as go
+    # Group data into meaningful attempt groups
+    grouped, labels = _engine.result('attempt_pathways', presentations)
+
+    # Create nodes
+    all_nodes = grouped['attempt_group'].cat.categories.tolist() + ['Withdrawn', 'Fail', 'Pass', 'Distinction']
+
+    # Map indices
+    grouped['source_idx'] = grouped['attempt_group'].cat.codes
+    grouped['target_idx'] = grouped['final_result'].map({
+        'Withdrawn': len(labels),
+        'Fail': len(labels)+1,
+        'Pass': len(labels)+2,
+        'Distinction': len(labels)+3
+    })
+
+    # Create Sankey diagram
+    fig = go.Figure(go.Sankey(
+        node=dict(
+            pad=20,
+            thickness=25,
+            line=dict(color="black", width=0.7),
+            label=all_nodes,
+            color=px.colors.sequential.Oranges[:len(labels)] + ['#FFC107', '#F44336', '#4CAF50', '#2196F3']
+        ),
+        link=dict(
+            source=grouped['source_idx'],
+            target=grouped['target_idx'],
+            value=grouped['count'],
+            hovertemplate='%{source.label} → %{target.label}<br>Students: %{value:,}<extra></extra>'
+        )
+    ))
+
+    # Style layout
+    fig.update_layout(
+        title_text="<b>Student Outcomes by Previous Attempts</b>",
+        title_x=0.05,
+        font_size=12,
+        height=600,
+        margin=dict(t=80, b=20),
+        hoverlabel=dict(
+            bgcolor="white",
+            font_size=12
+        )
+    )
+
+    # Add explanatory annotation
+    fig.add_annotation(
+        x=0.5,
+        y=-0.15,
+        xref="paper",
+        yref="paper",
+        text="Width represents student count; Colors show attempt history",
+        showarrow=False,
+        font=dict(color="#666")
+    )
+    return fig
+
+
+# Define consistent color mapping and fixed order
+CATEGORY_ORDER = ['Pass', 'Fail', 'Withdrawn', 'Distinction']
+COLOR_MAP = {
+    'Pass': '#59a14f',
+    'Fail': '#e15759',
+    'Withdrawn': '#edc948',
+    'Distinction': '#4e79a7'
+}
+
+
+# Cross-filter dimensions of section 1.9 and their labels
+CROSS_FILTER_DIMENSIONS = {
+    'code_module': 'Module',
+    'gender': 'Gender',
+    'disability': 'Disability Status',
+    'age_band': 'Age Band',
+    'imd_band': 'IMD Band',
+    'region': 'Region',
+    'highest_education': 'Highest Education',
+}
+
+
+def demographic_label(dimension, value):
+    """Display label of an indexed demographic value"""
+    if dimension == 'disability':
+        return "Has Disability" if value else "No Disability"
+    return "Unknown" if value == 'nan' else str(value)
+
+
+@section_cache
+def build_outcome_donut(_engine, data_version, presentations, filters):
+    import plotly.graph_objects as go
+    # Filter the data (filters: ((dimension, values), ...) resolved on the bitmap index)
+    outcome_counts = _engine.outcome_distribution(presentations, dict(filters))
+
+    # Calculate outcome distribution with fixed order
+    outcome_dist = outcome_counts.reindex(CATEGORY_ORDER, fill_value=0)  # Maintain order
+    outcome_pct = (outcome_dist / outcome_dist.sum()) * 100  # Convert to percentages
+    ordered_colors = [COLOR_MAP[result] for result in outcome_pct.index]  # Get colors in order
+
+    # Create donut chart
+    fig = go.Figure(
+        data=[go.Pie(
+            labels=outcome_pct.index,
+            values=outcome_pct.values,
+            hole=0.6,
+            marker_colors=ordered_colors,
+            textinfo='label+percent',
+            textposition='inside',
+            insidetextorientation='radial',
+            sort=False  # Disable automatic sorting
+        )]
+    )
+
+    fig.update_layout(
+        showlegend=False,
+        margin=dict(t=0, b=0, l=0, r=0),
+        height=500,
+        paper_bgcolor='rgba(0,0,0,0)'
+    )
+
+    fig.update_traces(
+        hoverinfo='label+percent',
+        textfont_size=14,
+        marker_line=dict(width=1, color='white')
+    )
+    return fig, outcome_pct, int(outcome_counts.sum())
+
+
+@section_cache
+def build_cross_filter(_engine, data_version, presentations, filters):
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+    # Students per demographic class; each dimension is counted under the other filters only
+    _, counts = _engine.demographic_counts(presentations, dict(filters), list(CROSS_FILTER_DIMENSIONS))
+    selected = dict(filters)
+
+    fig = make_subplots(
+        rows=4, cols=2,
+        subplot_titles=list(CROSS_FILTER_DIMENSIONS.values()),
+        horizontal_spacing=0.25,
+        vertical_spacing=0.08
+    )
+    for i, (dimension, dimension_counts) in enumerate(counts.items()):
+        chosen = selected.get(dimension)
+        fig.add_trace(
+            go.Bar(
+                x=dimension_counts.values,
+                y=[demographic_label(dimension, value) for value in dimension_counts.index],
+                orientation='h',
+                marker_color=['#4e79a7' if not chosen or value in chosen else '#c9d3e0' for value in dimension_counts.index],
+                hovertemplate='%{y}: %{x} students<extra></extra>',
+                showlegend=False
+            ),
+            row=i // 2 + 1, col=i % 2 + 1
+        )
+    fig.update_yaxes(autorange='reversed')
+    fig.update_layout(height=900, margin=dict(t=40, b=20))
+    return fig
+
+
+# ---- Progressive estimates (sections 2.1-2.3) ----
+# On a cold cache these sections first render from a stratified enrollment
+# sample (analytics/sample.py) with 95% confidence bands, then the exact result.
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def enrollment_sample(_data, data_version):
+    """Stratified enrollment sample of a data snapshot"""
+    return EnrollmentSample(_data)
+
+
+@st.cache_resource(show_spinner=False)
+def exact_sections():
+    """(section, data_version, presentations) of the exact results computed in this process"""
+    return set()
+
+
+def add_band(fig, x, y, error, color):
+    """Shaded y ± 1.96·error band behind a series"""
+    import plotly.graph_objects as go
+    fill = 'rgba({}, {}, {}, 0.15)'.format(*(int(color.lstrip('#')[i:i + 2], 16) for i in (0, 2, 4)))
+    fig.add_trace(go.Scatter(x=x, y=y + Z_95 * error, mode='lines', line=dict(width=0), showlegend=False, hoverinfo='skip'))
+    fig.add_trace(go.Scatter(
+        x=x, y=y - Z_95 * error, mode='lines', line=dict(width=0), fill='tonexty', fillcolor=fill,
+        showlegend=False, hoverinfo='skip'
+    ))
+
+
+def mark_estimate(fig, sample):
+    """Title an estimated figure as approximate"""
+    fig.update_layout(title=dict(
+        text=f"≈ Estimate from a {sample.size:,}-enrollment stratified sample (95% bands)",
+        font=dict(size=13, color='#6c757d')
+    ))
+    return fig
+
+
+def engagement_box_figure(engagement_stats, median_error=None):
+    import plotly.graph_objects as go
+    fig = box_figure(
+        engagement_stats,
+        x='final_result',
+        color='final_result',
+        color_map={
+            'Withdrawn': '#FFC107',
+            'Fail': '#F44336',
+            'Pass': '#4CAF50',
+            'Distinction': '#2196F3'
+        },
+        category_order=['Withdrawn', 'Fail', 'Pass', 'Distinction']
+    )
+    fig.update_layout(showlegend=False, xaxis_title='Outcome', yaxis_title='Total VLE Clicks')
+    if median_error is not None:
+        fig.add_trace(go.Scatter(
+            x=engagement_stats['final_result'],
+            y=engagement_stats['median'],
+            error_y=dict(type='data', array=Z_95 * median_error.reindex(engagement_stats['final_result']).fillna(0).to_numpy()),
+            mode='markers',
+            marker=dict(color='black', symbol='line-ew-open', size=16),
+            name='Median (95% band)'
+        ))
+    return fig
+
+
+@section_cache
+def build_engagement_box(_engine, data_version, presentations):
+    return engagement_box_figure(_engine.result('engagement_stats', presentations))
+
+
+@estimate_cache
+def estimate_engagement_box(_sample, data_version, presentations):
+    stats, group_stats = _sample.estimate('engagement_stats', presentations)
+    fig = engagement_box_figure(stats, standard_error(group_stats, 'final_result', 'median'))
+    return mark_estimate(fig, _sample)
+
+
+def weekly_engagement_figure(weekly_avg, peak_week, last_week, errors=None):
+    import plotly.express as px
+    # Create line chart
+    fig_weekly = px.line(
+        weekly_avg,
+        x='week',
+        y='sum_click',
+        color='final_result',
+        color_discrete_map={
+            'Withdrawn': '#FFC107',
+            'Fail': '#F44336',
+            'Pass': '#4CAF50',
+            'Distinction': '#2196F3'  # Using your standard blue instead of dark green
+        },
+        labels={
+            'sum_click': 'Average Weekly Clicks',
+            'week': 'Week of Course',
+            'final_result': 'Outcome'
+        },
+        height=500
+    )
+
+    # Enhanced styling
+    fig_weekly.update_layout(
+        xaxis_title="Week of Course",
+        yaxis_title="Average VLE Interactions",
+        hovermode="x unified",
+        legend_title_text="Final Result",
+        xaxis=dict(
+            tickmode='linear',
+            dtick=1,
+            range=[1, last_week]
+        ),
+        plot_bgcolor='rgba(0,0,0,0.05)'
+    )
+
+    # Add critical period annotation (highest divergence point)
+    fig_weekly.add_vline(
+        x=peak_week,
+        line_dash="dot",
+        line_color="grey",
+        annotation_text=f"Week {peak_week}: Peak divergence",
+        annotation_position="top right"
+    )
+
+    if errors is not None:
+        bands = weekly_avg.join(errors.rename('error'), on=['week', 'final_result']).fillna({'error': 0})
+        for result, band in bands.groupby('final_result', observed=True):
+            add_band(fig_weekly, band['week'], band['sum_click'], band['error'], RESULT_COLORS.get(result, 'grey'))
+    return fig_weekly
+
+
+@section_cache
+def build_weekly_engagement(_engine, data_version, presentations):
+    # Calculate weekly activity
+    return weekly_engagement_figure(*_engine.result('weekly_engagement', presentations))
+
+
+@estimate_cache
+def estimate_weekly_engagement(_sample, data_version, presentations):
+    weekly_avg, peak_week, last_week = _sample.engine.weekly_engagement(presentations)
+    group_avgs = [engine.weekly_clicks(presentations) for engine in _sample.groups]
+    errors = standard_error(group_avgs, ['week', 'final_result'], 'sum_click')
+    return mark_estimate(weekly_engagement_figure(weekly_avg, peak_week, last_week, errors), _sample)
+
+
+def withdrawal_figure(withdrawal_rates, errors=None):
+    import plotly.graph_objects as go
+    # Create area chart
+    fig_withdrawal = go.Figure()
+    if errors is not None:
+        add_band(
+            fig_withdrawal, withdrawal_rates['checkpoint'], withdrawal_rates['withdrawal_prob'] * 100,
+            errors.reindex(withdrawal_rates['checkpoint']).fillna(0).to_numpy() * 100, '#F44336'
+        )
+
+    fig_withdrawal.add_trace(go.Scatter(
+        x=withdrawal_rates['checkpoint'],
+        y=withdrawal_rates['withdrawal_prob']*100,
+        fill='tozeroy',
+        mode='lines+markers',
+        line=dict(color='#F44336', width=3),
+        fillcolor='rgba(244, 67, 54, 0.2)',
+        hovertemplate=(
+            '<b>%{x}</b><br>'
+            'Withdrawal Rate: %{y:.1f}%<br>'
+            'Students at Risk: %{customdata:,}<extra></extra>'
+        ),
+        customdata=withdrawal_rates['students_at_risk'],
+        name='Withdrawal Rate'
+    ))
+
+    # Add peak annotation
+    max_rate = withdrawal_rates['withdrawal_prob'].max() * 100
+    max_checkpoint = withdrawal_rates.loc[withdrawal_rates['withdrawal_prob'].idxmax(), 'checkpoint']
+    fig_withdrawal.add_annotation(
+        x=max_checkpoint,
+        y=max_rate + 3,
+        text=f"Critical Period: {max_rate:.1f}%",
+        showarrow=True,
+        arrowhead=2,
+        ax=0,
+        ay=-40,
+        font=dict(size=12)
+    )
+
+    # Add overall average
+    avg_rate = withdrawal_rates['withdrawal_prob'].mean() * 100
+    fig_withdrawal.add_hline(
+        y=avg_rate,
+        line_dash="dot",
+        line_color="gray",
+        annotation_text=f"Average: {avg_rate:.1f}%",
+        annotation_position="bottom right"
+    )
+
+    # Style layout
+    fig_withdrawal.update_layout(
+        xaxis_title="Course Completion (%)",
+        yaxis_title="Withdrawal Probability (%)",
+        hovermode="x unified",
+        height=500,
+        margin=dict(t=40),
+        showlegend=False
+    )
+    return fig_withdrawal, max_checkpoint, max_rate
+
+
+@section_cache
+def build_withdrawal_checkpoints(_engine, data_version, presentations):
+    # Calculate withdrawal rates at each course checkpoint (0-10%, 10-20%, etc.)
+    return withdrawal_figure(_engine.result('withdrawal_checkpoints', presentations))
+
+
+@estimate_cache
+def estimate_withdrawal_checkpoints(_sample, data_version, presentations):
+    rates, group_rates = _sample.estimate('withdrawal_checkpoints', presentations)
+    rates = rates.assign(students_at_risk=(rates['students_at_risk'] * _sample.scale).round().astype(int))
+    errors = standard_error(group_rates, 'checkpoint', 'withdrawal_prob')
+    fig_withdrawal, max_checkpoint, max_rate = withdrawal_figure(rates, errors)
+    return mark_estimate(fig_withdrawal, _sample), max_checkpoint, max_rate
+
+
+@section_cache
+def build_course_benchmarks(_engine, data_version, presentations):
+    import plotly.express as px
+    # Calculate real course metrics
+    course_metrics = _engine.result('course_benchmarks', presentations)
+
+    fig_pass = px.bar(
+        course_metrics,
+        x='Course',
+        y='Pass_Rate',
+        color='Course',
+        title='Pass Rates by Course',
+        labels={'Pass_Rate': 'Pass Rate (%)'},
+        height=400
+    )
+
+    fig_scatter = px.scatter(
+        course_metrics,
+        x='Enrollment',
+        y='Avg_Score',
+        size='Pass_Rate',
+        color='Course',
+        hover_name='Course',
+        title='Enrollment vs Performance',
+        labels={
+            'Avg_Score': 'Average Score (%)',
+            'Enrollment': 'Number of Students',
+            'Pass_Rate': 'Pass Rate (%)'
+        },
+        height=400
+    )
+    return course_metrics, fig_pass, fig_scatter
+
+
+@section_cache
+def build_course_scores(_engine, data_version, presentations):
+    # Aggregate and plot
+    score_stats = _engine.score_stats(presentations, ['code_module'])
+    fig_course = box_figure(
+        score_stats,
+        x='code_module',
+        color='code_module',
+        category_order=score_stats['code_module'].tolist(),
+        height=500
+    )
+
+    # Add horizontal mean line
+    mean_score = (score_stats['mean'] * score_stats['count']).sum() / score_stats['count'].sum()
+    fig_course.add_hline(
+        y=mean_score,
+        line_dash="dot",
+        line_color="gray",
+        annotation_text=f"Mean: {mean_score:.1f}%",
+        annotation_position="bottom right"
+    )
+
+    # Style layout
+    fig_course.update_layout(
+        showlegend=False,
+        xaxis_title="Course Code",
+        yaxis_title="Assessment Score (%)",
+        hovermode="x unified"
+    )
+    return fig_course
+
+
+@section_cache
+def build_timeline_cube(_engine, data_version, presentations):
+    # Week x outcome x module cube: every animation frame is a slice of it
+    return _engine.engagement_timeline(presentations)
+
+
+@section_cache
+def build_engagement_timeline(_engine, data_version, presentations, module):
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+    cube = build_timeline_cube(_engine, data_version, presentations)
+    if module != "All modules":
+        cube = cube[cube['code_module'] == module]
+    frames = cube.groupby(['week', 'final_result'])[['cumulative_clicks', 'enrolled']].sum()
+    frames = frames.reindex(
+        pd.MultiIndex.from_product([frames.index.get_level_values('week').unique(), RESULT_ORDER]),
+        fill_value=0
+    )
+    weeks = frames.index.get_level_values(0).unique().tolist()
+    colors = [RESULT_COLORS[result] for result in RESULT_ORDER]
+
+    def week_traces(week):
+        values = frames.loc[week]
+        return [
+            go.Bar(x=RESULT_ORDER, y=values['cumulative_clicks'], marker_color=colors,
+                   hovertemplate='%{x}: %{y:,} clicks<extra></extra>'),
+            go.Bar(x=RESULT_ORDER, y=values['enrolled'], marker_color=colors,
+                   hovertemplate='%{x}: %{y:,} students<extra></extra>'),
+        ]
+
+    fig = make_subplots(rows=1, cols=2, subplot_titles=("Cumulative VLE Clicks", "Students Still Enrolled"))
+    for col, trace in enumerate(week_traces(weeks[0]), start=1):
+        fig.add_trace(trace, row=1, col=col)
+    fig.frames = [go.Frame(data=week_traces(week), traces=[0, 1], name=str(week)) for week in weeks]
+
+    # Fixed axes so bars grow/shrink instead of rescaling every frame
+    fig.update_yaxes(range=[0, frames['cumulative_clicks'].max() * 1.05 or 1], row=1, col=1)
+    fig.update_yaxes(range=[0, frames['enrolled'].max() * 1.05 or 1], row=1, col=2)
+    play_args = dict(frame=dict(duration=300, redraw=False), transition=dict(duration=200), fromcurrent=True)
+    fig.update_layout(
+        height=500,
+        showlegend=False,
+        margin=dict(t=60),
+        updatemenus=[dict(
+            type="buttons",
+            direction="left",
+            x=0, y=-0.12,
+            buttons=[
+                dict(label="▶ Play", method="animate", args=[None, play_args]),
+                dict(label="⏸ Pause", method="animate",
+                     args=[[None], dict(frame=dict(duration=0, redraw=False), mode="immediate")]),
+            ]
+        )],
+        sliders=[dict(
+            x=0.15, y=-0.05, len=0.85,
+            currentvalue=dict(prefix="Week "),
+            steps=[
+                dict(label=str(week), method="animate",
+                     args=[[str(week)], dict(frame=dict(duration=0, redraw=False), mode="immediate")])
+                for week in weeks
+            ]
+        )]
+    )
+    return fig
@@ -0,0 +1,129 @@
+# startup.py
+"""Cold start report: where the time to a page's first render goes.
+
+    python startup.py [--page home|dataset|student|risk]
+
+Starts a fresh interpreter, as a new container would, imports Streamlit and
+renders the page once headless through app.py. The time is split into
+interpreter start, framework import, module imports during the run (per
+package, from `python -X importtime`), dataset loading and the rest of the run
+(aggregation and figures). A second, warm run of the page reports its peak
+Python allocation (tracemalloc): what one user's rerun costs in memory once
+the data and results are cached.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+PAGE_MARKER = "startup: page run"
+# Packages listed individually in the import breakdown
+TOP_PACKAGES = 8
+
+CHILD = """
+import json, logging, sys, time, tracemalloc
+started = time.time()
+sys.path.insert(0, {root!r})
+# Spawned precompute workers inherit -X options: without this, their imports would count as the page's
+sys._xoptions.pop('importtime', None)
+# The loader logs each dataset's load time
+logging.basicConfig(level=logging.INFO, stream=sys.stdout, format="%(message)s")
+import streamlit
+from streamlit.testing.v1 import AppTest
+framework = time.time() - started
+sys.stderr.write({marker!r} + "\\n")
+def render():
+    at = AppTest.from_file({app!r}, default_timeout=600)
+    at.switch_page({page!r})
+    return at.run()
+at = render()
+page = time.time() - started - framework
+# Data and results are cached by now: a second session's run is a warm rerun
+tracemalloc.start()
+render()
+rerun_peak = tracemalloc.get_traced_memory()[1]
+tracemalloc.stop()
+print(json.dumps({{
+    'started': started,
+    'framework': framework,
+    'page': page,
+    'rerun_peak': rerun_peak,
+    'exceptions': [e.value for e in at.exception],
+}}))
+"""
+
+
+def page_imports(stderr):
+    """Seconds per top-level package imported during the page run"""
+    packages = {}
+    lines = stderr.splitlines()
+    start = lines.index(PAGE_MARKER) + 1 if PAGE_MARKER in lines else len(lines)
+    for line in lines[start:]:
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| (\S.*)$", line)
+        if match:
+            # Only outermost imports (nested ones are part of their cumulative time)
+            package = match.group(2).split('.')[0]
+            packages[package] = packages.get(package, 0) + int(match.group(1)) / 1e6
+    return dict(sorted(packages.items(), key=lambda item: -item[1]))
+
+
+def measure(page):
+    """Timings of one cold start rendering `page`"""
+    launched = time.time()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-W", "ignore", "-c",
+         CHILD.format(root=ROOT, app=os.path.join(ROOT, "app.py"), page=f"pages/{page}.py", marker=PAGE_MARKER)],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    lines = result.stdout.strip().splitlines()
+    timings = json.loads(lines[-1])
+    loads = [float(seconds) for seconds in re.findall(r"loaded in ([\d.]+)s", result.stdout)]
+    imports = page_imports(result.stderr)
+    return {
+        'interpreter': timings['started'] - launched,
+        'framework': timings['framework'],
+        'imports': imports,
+        'data_load': sum(loads),
+        'page': timings['page'],
+        'rerun_peak': timings['rerun_peak'],
+        'exceptions': timings['exceptions'],
+    }
+
+
+def format_timings(page, timings):
+    imports = sum(timings['imports'].values())
+    rest = timings['page'] - imports - timings['data_load']
+    total = timings['interpreter'] + timings['framework'] + timings['page']
+    lines = [
+        f"Cold start of pages/{page}.py",
+        f"{'interpreter start':<24} {timings['interpreter']:>7.2f}s",
+        f"{'streamlit import':<24} {timings['framework']:>7.2f}s",
+        f"{'imports during run':<24} {imports:>7.2f}s",
+    ]
+    for package, seconds in list(timings['imports'].items())[:TOP_PACKAGES]:
+        lines.append(f"    {package:<20} {seconds:>7.2f}s")
+    lines += [
+        f"{'data load':<24} {timings['data_load']:>7.2f}s",
+        f"{'aggregation, figures':<24} {rest:>7.2f}s",
+        f"{'first page total':<24} {total:>7.2f}s",
+        f"{'rerun peak allocation':<24} {timings['rerun_peak'] / 2**20:>7.1f} MB",
+    ]
+    lines.extend(f"    exception: {value}" for value in timings['exceptions'])
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--page", default="home", choices=["home", "dataset", "student", "risk"])
+    args = parser.parse_args()
+    print(format_timings(args.page, measure(args.page)))
+
+
+if __name__ == "__main__":
+    main()
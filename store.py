@@ -0,0 +1,418 @@
+# store.py
+"""Partitioned Parquet store backing the out-of-core mode.
+
+The large tables (VLE interactions and assessment scores) are converted from
+CSV into a hive-partitioned layout (code_presentation/code_module), grown by
+appending new files, and only ever read as filtered, projected scans.
+"""
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+PARTITIONING = ds.partitioning(
+    pa.schema([('code_presentation', pa.string()), ('code_module', pa.string())]),
+    flavor='hive'
+)
+ROWS_PER_GROUP = 128 * 1024
+BATCH_SIZE = 256 * 1024
+# Rows per batch when exporting a view (bounds export memory)
+EXPORT_ROWS = 512 * 1024
+MANIFEST = "_ingested.json"
+# Column carrying storage positions through a filtered sort
+POSITION = "__position"
+
+# Table name -> (source CSV, column types)
+STORE_TABLES = {
+    "student_vle": ("studentVle.csv", {
+        'code_module': pa.string(),
+        'code_presentation': pa.string(),
+        'id_student': pa.int32(),
+        'id_site': pa.int32(),
+        'date': pa.int16(),
+        'sum_click': pa.int16(),
+    }),
+    "student_assessment": ("studentAssessment.csv", {
+        'id_assessment': pa.int32(),
+        'id_student': pa.int32(),
+        'date_submitted': pa.int16(),
+        'is_banked': pa.int8(),
+        'score': pa.float32(),
+    }),
+}
+
+
+def _with_course(batches, assessments):
+    """Tag score rows with their assessment's module/presentation for partitioning"""
+    for batch in batches:
+        table = pa.Table.from_batches([batch]).join(assessments, keys='id_assessment', join_type='left outer')
+        yield from table.to_batches()
+
+
+def _write(data_dir, target, schema, batches, basename_template=None):
+    """Write batches into a partitioned table directory"""
+    if 'code_presentation' not in schema.names:
+        assessments = pv.read_csv(
+            f"{data_dir}/assessments.csv",
+            convert_options=pv.ConvertOptions(
+                include_columns=['id_assessment', 'code_module', 'code_presentation'],
+                column_types={'id_assessment': pa.int32()}
+            )
+        )
+        schema = pa.schema(list(schema) + [assessments.schema.field('code_module'), assessments.schema.field('code_presentation')])
+        batches = _with_course(batches, assessments)
+    ds.write_dataset(
+        pa.RecordBatchReader.from_batches(schema, batches),
+        target,
+        format='parquet',
+        partitioning=PARTITIONING,
+        basename_template=basename_template,
+        max_rows_per_group=ROWS_PER_GROUP,
+        existing_data_behavior='overwrite_or_ignore'
+    )
+
+
+def replace_file(path, write):
+    """Create `path` through `write(temporary path)`, moving it into place once complete.
+
+    The temporary name is unique, so concurrent writers of the same file never
+    write into each other's output: the last complete one wins.
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def write_text(path, text):
+    """Replace a small text file (a pointer or manifest) atomically"""
+    def write(tmp):
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+    replace_file(path, write)
+
+
+def _generation(store_dir, name):
+    """Directory of the current generation of a stored table"""
+    with open(f"{store_dir}/{name}/CURRENT") as f:
+        return f"{store_dir}/{name}/{f.read().strip()}"
+
+
+def build_table(data_dir, store_dir, name, paths=None):
+    """Convert one large table's CSV files into a new generation of the store.
+
+    The CURRENT pointer is swapped atomically; the previous generation is kept
+    so scans that already opened it can finish.
+    """
+    filename, column_types = STORE_TABLES[name]
+    paths = paths or [f"{data_dir}/{filename}"]
+    table_dir = f"{store_dir}/{name}"
+    generation = uuid.uuid4().hex
+    previous = os.path.basename(_generation(store_dir, name)) if os.path.exists(f"{table_dir}/CURRENT") else None
+
+    readers = [
+        pv.open_csv(
+            path,
+            read_options=pv.ReadOptions(block_size=16 << 20),
+            convert_options=pv.ConvertOptions(column_types=column_types)
+        )
+        for path in paths
+    ]
+    batches = (batch for reader in readers for batch in reader)
+    _write(data_dir, f"{table_dir}/{generation}", readers[0].schema, batches)
+
+    write_text(f"{table_dir}/CURRENT", generation)
+    for entry in os.listdir(table_dir):
+        if entry not in (generation, previous, "CURRENT") and not entry.endswith(".tmp"):
+            shutil.rmtree(f"{table_dir}/{entry}", ignore_errors=True)
+
+
+def build_store(data_dir, store_dir):
+    """Convert the large CSV tables into the partitioned store"""
+    for name in STORE_TABLES:
+        build_table(data_dir, store_dir, name)
+
+
+def append_rows(data_dir, store_dir, name, frame):
+    """Add newly ingested rows to a stored table as new files (existing ones untouched)"""
+    _, column_types = STORE_TABLES[name]
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    table = table.cast(pa.schema([
+        pa.field(column, column_types.get(column, table.schema.field(column).type))
+        for column in table.column_names
+    ]))
+    _write(data_dir, _generation(store_dir, name), table.schema, table.to_batches(), f"part-{uuid.uuid4().hex}-{{i}}.parquet")
+
+
+def load_manifest(store_dir):
+    """Source file signatures the stored tables were built from"""
+    path = f"{store_dir}/{MANIFEST}"
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(store_dir, manifest):
+    write_text(f"{store_dir}/{MANIFEST}", json.dumps(manifest))
+
+
+def open_table(store_dir, name):
+    """Lazy dataset over one stored table (nothing is read until scanned)"""
+    return ds.dataset(_generation(store_dir, name), format='parquet', partitioning=PARTITIONING)
+
+
+def as_dataset(table):
+    """Stored dataset as is; in-memory DataFrames are wrapped for scanning"""
+    if isinstance(table, ds.Dataset):
+        return table
+    return ds.dataset(pa.Table.from_pandas(table, preserve_index=False))
+
+
+def scan(table, columns, filter=None):
+    """Yield DataFrame batches of the projected columns matching `filter`"""
+    for batch in as_dataset(table).to_batches(columns=columns, filter=filter, batch_size=BATCH_SIZE):
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+
+def row_count(table, filter=None):
+    """Number of rows, answered from Parquet metadata when unfiltered"""
+    if isinstance(table, ds.Dataset):
+        return table.count_rows(filter=filter)
+    return len(table)
+
+
+def columns(table):
+    if isinstance(table, ds.Dataset):
+        return table.schema.names
+    return table.columns.tolist()
+
+
+@lru_cache(maxsize=8)
+def _row_groups(dataset):
+    """(fragment, first row, row count) for every row group, from metadata only"""
+    groups, offset = [], 0
+    for fragment in dataset.get_fragments():
+        for group in fragment.split_by_row_group():
+            rows = group.row_groups[0].num_rows
+            groups.append((group, offset, rows))
+            offset += rows
+    return groups
+
+
+def read_rows(dataset, start, stop, filter=None):
+    """Rows [start, stop) in storage order, reading only the row groups involved.
+
+    With a `filter`, matching rows are streamed (pruned partitions and row
+    groups are skipped) until the page is complete.
+    """
+    if filter is not None:
+        pieces, offset = [], 0
+        for batch in dataset.to_batches(filter=filter, batch_size=BATCH_SIZE):
+            if offset + batch.num_rows > start:
+                pieces.append(batch.slice(max(start - offset, 0), stop - max(start, offset)))
+            offset += batch.num_rows
+            if offset >= stop:
+                break
+        return pa.Table.from_batches(pieces, schema=dataset.schema).to_pandas()
+    pieces = []
+    for group, offset, rows in _row_groups(dataset):
+        if offset >= stop:
+            break
+        if offset + rows > start:
+            table = group.to_table(schema=dataset.schema)
+            pieces.append(table.slice(max(start - offset, 0), stop - max(start, offset)))
+    if not pieces:
+        return dataset.schema.empty_table().to_pandas()
+    return pa.concat_tables(pieces).to_pandas()
+
+
+def sort_permutation(table, sort_keys, filters=()):
+    """Row order for `sort_keys` [(column, 'ascending'|'descending')], reading only the key columns.
+
+    With `filters` (stored tables only), the order holds just the matching rows,
+    as positions in the whole table. Key and filter columns are then read one
+    row group at a time, skipping groups whose statistics rule the filters out.
+    """
+    key_columns = [column for column, _ in sort_keys]
+    if not isinstance(table, ds.Dataset):
+        # pandas keeps the category order of ordered categoricals
+        keys = table[key_columns].reset_index(drop=True)
+        ascending = [direction == 'ascending' for _, direction in sort_keys]
+        return keys.sort_values(by=keys.columns.tolist(), ascending=ascending, kind='stable').index.to_numpy()
+    if not filters:
+        return pc.sort_indices(table.to_table(columns=key_columns), sort_keys=sort_keys)
+
+    expression = filter_expression(table, filters)
+    columns = list(dict.fromkeys(key_columns + [column for column, _, _ in filters]))
+    pieces = []
+    for group, offset, rows in _row_groups(table):
+        if not group.subset(expression, schema=table.schema).row_groups:
+            continue
+        piece = group.to_table(columns=columns, schema=table.schema)
+        piece = piece.append_column(POSITION, pa.array(np.arange(offset, offset + rows)))
+        pieces.append(piece.filter(expression).select(key_columns + [POSITION]))
+    if not pieces:
+        return np.empty(0, dtype=np.int64)
+    matching = pa.concat_tables(pieces)
+    order = pc.sort_indices(matching.select(key_columns), sort_keys=sort_keys)
+    return matching[POSITION].take(order).to_numpy()
+
+
+def _take(dataset, indices):
+    """Arrow rows at the given positions, reading each row group involved once"""
+    if not isinstance(dataset, ds.FileSystemDataset):
+        return dataset.take(indices)
+    indices = np.asarray(indices, dtype=np.int64)
+    groups = _row_groups(dataset)
+    owners = np.searchsorted([offset for _, offset, _ in groups], indices, side='right') - 1
+    order = np.argsort(owners, kind='stable')
+    bounds = np.searchsorted(owners[order], np.arange(len(groups) + 1))
+    pieces = []
+    for number, (group, offset, _) in enumerate(groups):
+        wanted = indices[order[bounds[number]:bounds[number + 1]]]
+        if len(wanted):
+            pieces.append(group.to_table(schema=dataset.schema).take(wanted - offset))
+    if not pieces:
+        return dataset.schema.empty_table()
+    # Pieces are in storage order; put the rows back into the requested order
+    return pa.concat_tables(pieces).take(np.argsort(order))
+
+
+def take_rows(table, indices):
+    """Rows at the given storage positions, in the given order"""
+    if not isinstance(table, ds.Dataset):
+        return table.iloc[np.asarray(indices)]
+    return _take(table, indices).to_pandas()
+
+
+def _export_batches(table, positions, filter):
+    """Arrow tables of EXPORT_ROWS rows: in `positions` order, else storage order"""
+    if positions is not None:
+        for start in range(0, len(positions), EXPORT_ROWS):
+            chunk = positions[start:start + EXPORT_ROWS]
+            if isinstance(table, ds.Dataset):
+                yield _take(table, chunk)
+            else:
+                yield pa.Table.from_pandas(table.iloc[np.asarray(chunk)], preserve_index=False)
+    elif isinstance(table, ds.Dataset):
+        for batch in table.to_batches(filter=filter, batch_size=EXPORT_ROWS):
+            yield pa.Table.from_batches([batch])
+    else:
+        for start in range(0, len(table), EXPORT_ROWS):
+            yield pa.Table.from_pandas(table.iloc[start:start + EXPORT_ROWS], preserve_index=False)
+
+
+def _plain_schema(schema):
+    """Schema with dictionary columns decoded (CSV has no categorical type)"""
+    return pa.schema([
+        field.with_type(field.type.value_type) if pa.types.is_dictionary(field.type) else field
+        for field in schema
+    ])
+
+
+def export_rows(table, path, format, positions=None, filter=None, progress=None):
+    """Stream a table view to a CSV or Parquet file, batch by batch.
+
+    `positions` (a sort permutation) gives the row order, otherwise rows keep
+    storage order, filtered by `filter` on stored tables. Only one batch is held
+    at a time; `progress(rows)` is called after each one. The file is written
+    under a temporary name and moved into place when complete.
+    """
+    rows = 0
+
+    def write(tmp):
+        nonlocal rows
+        writer = None
+        try:
+            for piece in _export_batches(table, positions, filter):
+                if writer is None:
+                    schema = _plain_schema(piece.schema) if format == 'csv' else piece.schema
+                    writer = pv.CSVWriter(tmp, schema) if format == 'csv' else pq.ParquetWriter(tmp, schema)
+                writer.write_table(piece.cast(schema))
+                rows += piece.num_rows
+                if progress:
+                    progress(rows)
+            if writer is None:
+                schema = as_dataset(table).schema
+                writer = pv.CSVWriter(tmp, _plain_schema(schema)) if format == 'csv' else pq.ParquetWriter(tmp, schema)
+        finally:
+            if writer is not None:
+                writer.close()
+
+    replace_file(path, write)
+    return rows
+
+
+# Row filters are (column, op, value) tuples: ('isin', values) or ('between', (low, high))
+
+def filter_expression(dataset, filters):
+    """Dataset expression for the filters; partition and row group statistics prune the scan"""
+    expression = None
+    for column, op, value in filters:
+        field = ds.field(column)
+        if op == 'isin':
+            condition = field.isin(pa.array(value, dataset.schema.field(column).type))
+        else:
+            condition = (field >= value[0]) & (field <= value[1])
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def filter_mask(frame, filters):
+    """Boolean mask of the DataFrame rows matching the filters"""
+    mask = pd.Series(True, index=frame.index)
+    for column, op, value in filters:
+        if op == 'isin':
+            mask &= frame[column].isin(value)
+        else:
+            mask &= frame[column].between(*value).fillna(False).astype(bool)
+    return mask
+
+
+def distinct_values(table, column):
+    """Sorted values of a string-like or boolean column (None for other columns)"""
+    if isinstance(table, ds.Dataset):
+        field_type = table.schema.field(column).type
+        if not (pa.types.is_string(field_type) or pa.types.is_dictionary(field_type) or pa.types.is_boolean(field_type)):
+            return None
+        values = pc.unique(table.to_table(columns=[column])[column].combine_chunks())
+        return sorted(value for value in values.to_pylist() if value is not None)
+    series = table[column]
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.categories.tolist()
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_object_dtype(series):
+        return sorted(series.dropna().unique().tolist())
+    return None
+
+
+def value_range(table, column):
+    """(min, max) of a numeric column, from Parquet statistics where available"""
+    if isinstance(table, ds.Dataset):
+        bounds = [
+            (group.row_groups[0].statistics or {}).get(column) for group, _, _ in _row_groups(table)
+        ]
+        if bounds and all(bound and bound.get('min') is not None for bound in bounds):
+            return min(bound['min'] for bound in bounds), max(bound['max'] for bound in bounds)
+        values = pc.min_max(table.to_table(columns=[column])[column])
+        return values['min'].as_py(), values['max'].as_py()
+    return tuple(table[column].agg(['min', 'max']).tolist())
+
@@ -0,0 +1,16 @@
+# story_player.py
+"""Custom component playing the 1.4 story.
+
+It lives in a module of its own because declare_component names the
+component after the calling module, and pages run by st.navigation are not
+importable modules.
+"""
+import os
+
+import streamlit.components.v1 as components
+
+# Story player that loads vizzu-story once and swaps slides in place on reruns
+vizzu_story = components.declare_component(
+    "vizzu_story",
+    path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "vizzu_story")
+)
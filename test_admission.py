@@ -0,0 +1,221 @@
+# test_admission.py
+"""Admission gate under threads: reentrancy, first-come first-served order, Busy and overload"""
+import threading
+import time
+
+import pytest
+
+import admission
+from admission import Busy, Gate
+
+# Longest wait for another thread to reach a state
+TIMEOUT = 5
+
+
+def wait_until(condition):
+    deadline = time.monotonic() + TIMEOUT
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+class Run:
+    """A thread taking a slot of `gate`, recording its turn in `admitted` and holding the slot until released"""
+
+    def __init__(self, gate, admitted=None, hold=True):
+        self.positions = []
+        self.holding, self.release = threading.Event(), threading.Event()
+        if not hold:
+            self.release.set()
+        self.thread = threading.Thread(target=self._run, args=(gate, admitted), daemon=True)
+        self.thread.start()
+
+    def _run(self, gate, admitted):
+        with gate.admit(on_wait=self.positions.append):
+            if admitted is not None:
+                admitted.append(self)
+            self.holding.set()
+            self.release.wait(TIMEOUT)
+
+    def done(self):
+        self.release.set()
+        self.thread.join(TIMEOUT)
+        assert not self.thread.is_alive()
+
+
+def holding(gate):
+    """A run that holds a slot of `gate`"""
+    run = Run(gate)
+    assert run.holding.wait(TIMEOUT)
+    return run
+
+
+def in_line(gate, **options):
+    """A run waiting in line behind those already queued"""
+    queued = gate.queued()
+    run = Run(gate, **options)
+    wait_until(lambda: gate.queued() == queued + 1)
+    return run
+
+
+def test_nested_admission_reuses_the_slot():
+    gate = Gate(1)
+    with gate.admit():
+        with gate.admit(wait=False):
+            with gate.admit():
+                assert gate.running == 1
+        assert gate.running == 1
+    assert gate.running == 0
+
+
+def test_slot_is_released_when_the_block_raises():
+    gate = Gate(1)
+    with pytest.raises(ValueError):
+        with gate.admit():
+            raise ValueError()
+    assert gate.running == 0
+    with gate.admit(wait=False):
+        pass
+
+
+def test_nested_admission_in_another_thread_still_queues():
+    gate = Gate(1)
+    with gate.admit():
+        other = in_line(gate)
+        assert gate.running == 1
+    assert other.holding.wait(TIMEOUT)
+    other.done()
+
+
+def test_busy_without_a_free_slot():
+    gate = Gate(1)
+    holder = holding(gate)
+    with pytest.raises(Busy):
+        with gate.admit(wait=False):
+            pass
+    assert gate.queued() == 0
+    holder.done()
+    with gate.admit(wait=False):
+        assert gate.running == 1
+
+
+def test_busy_while_others_wait_for_a_freed_slot():
+    gate = Gate(2)
+    holders = [holding(gate), holding(gate)]
+    waiting = in_line(gate)
+    # A slot frees up, but it belongs to the run already waiting for one
+    with gate.condition:
+        gate.running -= 1
+        with pytest.raises(Busy):
+            with gate.admit(wait=False):
+                pass
+        gate.running += 1
+    for run in holders + [waiting]:
+        run.done()
+
+
+def test_waiting_runs_are_admitted_in_arrival_order():
+    gate = Gate(1)
+    holder = holding(gate)
+    admitted = []
+    runs = [in_line(gate, admitted=admitted, hold=False) for _ in range(5)]
+    holder.done()
+    for run in runs:
+        run.done()
+    assert admitted == runs
+    assert gate.queued() == 0 and gate.running == 0
+
+
+def test_waiting_run_sees_its_position_move_up():
+    gate = Gate(1)
+    holder = holding(gate)
+    first, second = in_line(gate), in_line(gate)
+    wait_until(lambda: first.positions == [1] and second.positions == [2])
+    holder.done()
+    assert first.holding.wait(TIMEOUT)
+    wait_until(lambda: second.positions == [2, 1])
+    first.done()
+    second.done()
+
+
+def test_position_is_shown_without_holding_the_lock():
+    gate = Gate(1)
+    holder = holding(gate)
+    lock_free = []
+
+    def on_wait(position):
+        # Another thread can take the gate's lock meanwhile
+        def check():
+            if gate.condition.acquire(timeout=TIMEOUT):
+                gate.condition.release()
+                lock_free.append(position)
+        checker = threading.Thread(target=check)
+        checker.start()
+        checker.join(TIMEOUT)
+
+    def run():
+        with gate.admit(on_wait=on_wait):
+            pass
+
+    waiting = threading.Thread(target=run)
+    waiting.start()
+    wait_until(lambda: lock_free == [1])
+    holder.done()
+    waiting.join(TIMEOUT)
+    assert gate.running == 0 and gate.queued() == 0
+
+
+def test_slots_bound_the_runs_at_once():
+    gate = Gate(2)
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def run():
+        with gate.admit():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(TIMEOUT)
+    assert peak[0] == 2
+
+
+def test_no_limit_with_zero_slots():
+    gate = Gate(0)
+    holders = [holding(gate) for _ in range(3)]
+    with gate.admit(wait=False):
+        assert gate.running == 4
+    for holder in holders:
+        holder.done()
+
+
+def test_overloaded_from_the_queue_limit(monkeypatch):
+    monkeypatch.setattr(admission, 'ADMISSION_QUEUE_LIMIT', 2)
+    gate = Gate(1)
+    holder = holding(gate)
+    runs = [in_line(gate, hold=False)]
+    assert not gate.overloaded()
+    runs.append(in_line(gate, hold=False))
+    assert gate.overloaded()
+    holder.done()
+    for run in runs:
+        run.done()
+    assert not gate.overloaded()
+
+
+def test_never_overloaded_without_a_queue_limit(monkeypatch):
+    monkeypatch.setattr(admission, 'ADMISSION_QUEUE_LIMIT', 0)
+    gate = Gate(1)
+    holder = holding(gate)
+    runs = [in_line(gate, hold=False) for _ in range(3)]
+    assert not gate.overloaded()
+    holder.done()
+    for run in runs:
+        run.done()
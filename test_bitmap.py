@@ -0,0 +1,103 @@
+# test_bitmap.py
+"""Bitmap index results against plain pandas masks over the same rows"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics.bitmap import BitmapIndex, contingency
+
+# Not a multiple of 64, so the last packed word is partly padding
+ROWS = 1003
+
+
+@pytest.fixture(scope='module')
+def student_info():
+    rng = np.random.default_rng(7)
+    imd = rng.choice(['0-10%', '10-20%', '20-30%', None], ROWS)
+    return pd.DataFrame({
+        'code_presentation': pd.Categorical(rng.choice(['2013B', '2013J', '2014B'], ROWS)),
+        'code_module': pd.Categorical(rng.choice(['AAA', 'BBB', 'CCC', 'DDD'], ROWS)),
+        'gender': pd.Categorical(rng.choice(['F', 'M'], ROWS)),
+        'disability': rng.random(ROWS) < 0.1,
+        'imd_band': pd.Categorical(imd, categories=['0-10%', '10-20%', '20-30%'], ordered=True),
+        'final_result': pd.Categorical(rng.choice(['Withdrawn', 'Fail', 'Pass', 'Distinction'], ROWS)),
+    })
+
+
+@pytest.fixture(scope='module')
+def index(student_info):
+    return BitmapIndex(student_info)
+
+
+def as_values(student_info):
+    """Columns as the index sees them: categoricals as strings, missing values as 'nan'"""
+    return student_info.astype({
+        column: str for column in student_info.columns
+        if isinstance(student_info[column].dtype, pd.CategoricalDtype)
+    })
+
+
+def mask(student_info, filters, skip=None):
+    values = as_values(student_info)
+    keep = np.ones(len(values), dtype=bool)
+    for dimension, accepted in filters.items():
+        if accepted is not None and dimension != skip:
+            keep &= values[dimension].isin(accepted).to_numpy()
+    return keep
+
+
+FILTERS = [
+    {},
+    {'code_presentation': None},
+    {'gender': ['F']},
+    {'code_module': ['AAA', 'CCC'], 'gender': ['M'], 'disability': [True]},
+    {'imd_band': ['nan', '0-10%'], 'code_presentation': ['2013J', '2014B']},
+    # Selections matching nothing
+    {'code_module': []},
+    {'code_module': ['ZZZ']},
+    {'gender': ['F'], 'final_result': ['Pass'], 'code_module': ['BBB'], 'imd_band': ['20-30%'], 'disability': [True, False]},
+]
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_count_and_rows_match_masks(index, student_info, filters):
+    expected = mask(student_info, filters)
+    assert index.count(filters) == expected.sum()
+    assert index.rows(filters).tolist() == np.flatnonzero(expected).tolist()
+
+
+def test_empty_selection(index):
+    assert index.count({'code_module': []}) == 0
+    assert len(index.rows({'code_module': ['ZZZ']})) == 0
+    counts, _ = index.crosstab({'code_module': []}, ['gender', 'final_result'])
+    assert counts.sum() == 0
+
+
+def test_missing_values_are_indexed_as_nan(index, student_info):
+    assert 'nan' in index.values('imd_band')
+    assert index.count({'imd_band': ['nan']}) == student_info['imd_band'].isna().sum()
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_crosstab_matches_groupby(index, student_info, filters):
+    dimensions = ['gender', 'imd_band', 'final_result']
+    counts, values = index.crosstab(filters, dimensions)
+    expected = as_values(student_info)[mask(student_info, filters)].groupby(dimensions).size()
+    for cell, count in np.ndenumerate(counts):
+        key = tuple(axis[i] for axis, i in zip(values, cell))
+        assert count == expected.get(key, 0)
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_cross_filter_skips_own_dimension(index, student_info, filters):
+    dimensions = ['code_module', 'gender']
+    for dimension, counts in index.cross_filter(filters, dimensions).items():
+        matching = as_values(student_info)[mask(student_info, filters, skip=dimension)]
+        expected = matching[dimension].value_counts()
+        for value, count in counts.items():
+            assert count == expected.get(value, 0)
+
+
+def test_contingency_counts_every_cell():
+    codes = [np.array([0, 1, 1, 2]), np.array([1, 0, 0, 1])]
+    assert contingency(codes, (3, 2)).tolist() == [[0, 1], [2, 0], [0, 1]]
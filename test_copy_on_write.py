@@ -0,0 +1,55 @@
+# test_copy_on_write.py
+"""Cached query results handed out under copy-on-write: shared until written, and no copy per rerun"""
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics.engine import _private_copy
+
+ROWS = 200_000
+
+
+@pytest.fixture
+def cached():
+    """A result as held in the engine's result cache, with a frame and a series"""
+    frame = pd.DataFrame({'week': np.arange(ROWS), 'sum_click': np.ones(ROWS)})
+    return frame, frame['sum_click'].copy()
+
+
+def peak_allocation(call):
+    tracemalloc.start()
+    try:
+        call()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_handed_out_result_shares_the_cached_data(cached):
+    with pd.option_context("mode.copy_on_write", True):
+        frame, series = _private_copy(cached)
+        assert frame is not cached[0] and series is not cached[1]
+        assert np.shares_memory(frame['sum_click'].to_numpy(), cached[0]['sum_click'].to_numpy())
+        assert np.shares_memory(series.to_numpy(), cached[1].to_numpy())
+
+
+def test_writes_do_not_reach_the_cached_result(cached):
+    with pd.option_context("mode.copy_on_write", True):
+        frame, series = _private_copy(cached)
+        frame.loc[0, 'sum_click'] = 5
+        frame['rate'] = frame['sum_click'] / 2
+        series.iloc[0] = 5
+    assert cached[0]['sum_click'].iloc[0] == 1 and 'rate' not in cached[0]
+    assert cached[1].iloc[0] == 1
+
+
+def test_hand_out_allocates_no_copy(cached):
+    data = cached[0].memory_usage(index=False).sum() + cached[1].nbytes
+    with pd.option_context("mode.copy_on_write", False):
+        copied = peak_allocation(lambda: _private_copy(cached))
+    with pd.option_context("mode.copy_on_write", True):
+        shared = peak_allocation(lambda: _private_copy(cached))
+    assert copied >= data
+    assert shared < data / 100
@@ -0,0 +1,149 @@
+# test_disk_cache.py
+"""On-disk cache: key isolation, atomic writes and least-recently-used eviction"""
+import os
+import pickle
+import threading
+
+import pytest
+
+import disk_cache
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(disk_cache, 'DISK_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(disk_cache, 'DISK_CACHE_MB', 1)
+    return tmp_path
+
+
+def entries(cache_dir):
+    return sorted(os.listdir(cache_dir))
+
+
+class FakeEngine:
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+
+
+@pytest.fixture
+def counted(cache_dir):
+    """Cached builder counting its runs"""
+    runs = []
+
+    def build(_engine, data_version, presentations):
+        runs.append(presentations)
+        return {'presentations': presentations, 'fingerprint': _engine.fingerprint}
+
+    return disk_cache.cached_section(build), runs
+
+
+def test_round_trip(cache_dir):
+    key = disk_cache.entry_key('data', 'query', (('2013J',),))
+    assert disk_cache.load(key) is disk_cache.MISSING
+    disk_cache.save(key, [1, 2, 3])
+    assert disk_cache.load(key) == [1, 2, 3]
+
+
+def test_arguments_are_normalized():
+    assert disk_cache.entry_key('data', 'query', ({'b': [1], 'a': 2},)) == \
+        disk_cache.entry_key('data', 'query', ({'a': 2, 'b': (1,)},))
+
+
+def test_code_versions_do_not_share_entries(cache_dir, monkeypatch, counted):
+    build, runs = counted
+    engine = FakeEngine('data')
+    monkeypatch.setattr(disk_cache, 'code_version', lambda: 'v1')
+    assert build(engine, 1, ('2013J',))['fingerprint'] == 'data'
+    monkeypatch.setattr(disk_cache, 'code_version', lambda: 'v2')
+    build(engine, 1, ('2013J',))
+    assert len(runs) == 2 and len(entries(cache_dir)) == 2
+    # Each version still reads its own entry
+    for version in ('v1', 'v2'):
+        monkeypatch.setattr(disk_cache, 'code_version', lambda: version)
+        build(engine, 1, ('2013J',))
+    assert len(runs) == 2
+
+
+def test_fingerprints_do_not_share_entries(cache_dir, counted):
+    build, runs = counted
+    assert build(FakeEngine('old'), 1, ('2013J',))['fingerprint'] == 'old'
+    assert build(FakeEngine('new'), 1, ('2013J',))['fingerprint'] == 'new'
+    assert build(FakeEngine('old'), 2, ('2013J',))['fingerprint'] == 'old'
+    assert len(runs) == 2
+    assert build.stored(FakeEngine('new'), ('2013J',))
+    assert not build.stored(FakeEngine('other'), ('2013J',))
+
+
+def test_engines_without_fingerprint_are_not_stored(cache_dir, counted):
+    build, runs = counted
+    build(FakeEngine(None), 1, ('2013J',))
+    build(FakeEngine(None), 1, ('2013J',))
+    assert len(runs) == 2 and entries(cache_dir) == []
+
+
+def test_save_replaces_the_entry_in_place(cache_dir):
+    key = disk_cache.entry_key('data', 'query', ())
+    disk_cache.save(key, 'first')
+    disk_cache.save(key, 'second')
+    assert disk_cache.load(key) == 'second'
+    assert entries(cache_dir) == [f"{key}.pkl"]
+
+
+def test_failed_write_keeps_the_previous_entry(cache_dir):
+    key = disk_cache.entry_key('data', 'query', ())
+    disk_cache.save(key, 'complete')
+    with pytest.raises((pickle.PicklingError, AttributeError)):
+        # Lambdas cannot be pickled: the write fails halfway
+        disk_cache.save(key, lambda: None)
+    assert disk_cache.load(key) == 'complete'
+    assert entries(cache_dir) == [f"{key}.pkl"]
+
+
+def test_concurrent_writers_leave_one_complete_entry(cache_dir):
+    key = disk_cache.entry_key('data', 'query', ())
+    values = [list(range(i, i + 10_000)) for i in range(8)]
+    threads = [threading.Thread(target=disk_cache.save, args=(key, value)) for value in values]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert disk_cache.load(key) in values
+    assert entries(cache_dir) == [f"{key}.pkl"]
+
+
+def test_unreadable_entry_is_dropped(cache_dir, caplog):
+    key = disk_cache.entry_key('data', 'query', ())
+    (cache_dir / f"{key}.pkl").write_bytes(b"not a pickle")
+    assert disk_cache.load(key) is disk_cache.MISSING
+    assert entries(cache_dir) == []
+    assert "Dropping unreadable entry" in caplog.text
+
+
+def test_eviction_removes_least_recently_used(cache_dir):
+    keys = [disk_cache.entry_key('data', 'query', (i,)) for i in range(3)]
+    for age, key in zip([300, 200, 100], keys):
+        disk_cache.save(key, bytes(100_000))
+        os.utime(cache_dir / f"{key}.pkl", (0, os.path.getmtime(cache_dir / f"{key}.pkl") - age))
+    # Reading the oldest entry makes it the most recently used
+    assert disk_cache.load(keys[0]) is not disk_cache.MISSING
+
+    disk_cache.evict(limit_mb=0.25)
+    assert entries(cache_dir) == sorted(f"{key}.pkl" for key in (keys[0], keys[2]))
+    assert disk_cache.load(keys[1]) is disk_cache.MISSING
+
+
+def test_eviction_removes_stale_temporary_files(cache_dir):
+    fresh, stale = cache_dir / "fresh.tmp", cache_dir / "stale.tmp"
+    fresh.write_bytes(b"")
+    stale.write_bytes(b"")
+    os.utime(stale, (0, os.path.getmtime(stale) - disk_cache.STALE_WRITE_SECONDS - 1))
+    disk_cache.evict()
+    assert entries(cache_dir) == ["fresh.tmp"]
+
+
+def test_disabled_cache_stores_nothing(cache_dir, monkeypatch):
+    monkeypatch.setattr(disk_cache, 'DISK_CACHE_MB', 0)
+    key = disk_cache.entry_key('data', 'query', ())
+    disk_cache.save(key, 'value')
+    assert disk_cache.load(key) is disk_cache.MISSING
+    assert entries(cache_dir) == []